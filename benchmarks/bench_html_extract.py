@@ -0,0 +1,103 @@
+"""登录页提取基准：完整 BeautifulSoup 解析 vs 增量目标提取（整段文本与边接收边解析）
+
+页面包含验证码时解析在登录表单处即可停止；不包含验证码时需要解析完整个页面，是增量提取的最坏情况。
+
+用法: python benchmarks/bench_html_extract.py [--sizes 30,300] [--repeat 20]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from html_extract import extract_from_text, extract_from_response
+from mock_site import build_login_page
+from plugins.form_site import SiteSpec
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plugins', 'sites', 'lixianla.json')
+
+def old_path(html: str):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    csrf_input = soup.find('input', {'name': ['_token', 'csrf_token', 'token']})
+    csrf = csrf_input.get('value') if csrf_input else ""
+    for tag, attrs in [('img', {'id': 'captcha-img'}), ('img', {'class': 'captcha-image'}), ('img', {'alt': '验证码'})]:
+        img = soup.find(tag, attrs)
+        if img:
+            return csrf, img.get('src')
+    return csrf, ""
+
+def new_path(html: str, spec: SiteSpec):
+    found = extract_from_text(html, spec.login_targets)
+    return found['csrf'], found['captcha']
+
+class _Content:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def iter_chunked(self, size: int):
+        for offset in range(0, len(self.data), size):
+            yield self.data[offset:offset + size]
+
+    async def read(self) -> bytes:
+        return b''
+
+    async def readany(self) -> bytes:
+        return b''
+
+class _Response:
+    """按块产出页面内容的响应，模拟 aiohttp 的 response.content"""
+    charset = 'utf-8'
+
+    def __init__(self, data: bytes):
+        self.content = _Content(data)
+        self.content_length = len(data)
+
+def stream_path(data: bytes, spec: SiteSpec):
+    found = asyncio.run(extract_from_response(_Response(data), spec.login_targets))
+    return found['csrf'], found['captcha']
+
+def measure(func, *args, repeat: int):
+    func(*args)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    elapsed = (time.perf_counter() - start) / repeat
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='30,100,300', help='页面大小列表（KB），逗号分隔')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(SPEC_PATH, 'r', encoding='utf-8') as f:
+        spec = SiteSpec(json.load(f))
+
+    print(f"{'页面':>8} {'验证码':>6} {'完整解析':>12} {'增量提取':>12} {'流式提取':>12} {'加速':>8} "
+          f"{'完整峰值':>12} {'增量峰值':>12} {'流式峰值':>12}")
+    for size_kb in (int(s) for s in args.sizes.split(',')):
+        for captcha in (True, False):
+            html = build_login_page(size_kb, captcha=captcha)
+            old_result, old_time, old_peak = measure(old_path, html, repeat=args.repeat)
+            new_result, new_time, new_peak = measure(new_path, html, spec, repeat=args.repeat)
+            stream_result, stream_time, stream_peak = measure(stream_path, html.encode('utf-8'), spec,
+                                                              repeat=args.repeat)
+            # 旧代码找不到验证码时返回空字符串，增量提取返回 None
+            assert old_result == (new_result[0], new_result[1] or "") == (stream_result[0], stream_result[1] or ""), \
+                (old_result, new_result, stream_result)
+            print(f"{size_kb:>6}KB {'有' if captcha else '无':>6} {old_time * 1000:>10.2f}ms "
+                  f"{new_time * 1000:>10.2f}ms {stream_time * 1000:>10.2f}ms {old_time / new_time:>7.1f}x "
+                  f"{old_peak / 1024:>10.0f}KB {new_peak / 1024:>10.0f}KB {stream_peak / 1024:>10.0f}KB")
+
+if __name__ == '__main__':
+    main()
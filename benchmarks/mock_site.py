@@ -0,0 +1,161 @@
+"""本地模拟签到网站，模仿 lixianla 等 Xiuno 论坛的登录与签到流程
+
+用法: python benchmarks/mock_site.py --port 8080 --latency 0.05 --error-rate 0.01
+"""
+import io
+import json
+import random
+import asyncio
+import argparse
+from aiohttp import web
+
+def build_login_page(size_kb: int, captcha: bool = True, token: str = 'a1b2c3d4e5f6') -> str:
+    """生成接近真实论坛登录页结构的页面：头部导航、登录表单、帖子列表、底部脚本"""
+    head = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>用户登录</title>'
+        + ''.join(f'<link rel="stylesheet" href="/view/css/{i}.css">' for i in range(10))
+        + '</head><body><nav class="navbar"><ul>'
+        + ''.join(f'<li class="nav-item"><a href="/forum-{i}.htm">版块 {i}</a></li>' for i in range(30))
+        + '</ul></nav>'
+    )
+    form = (
+        '<div class="card"><form action="/user-login.htm" method="post" id="form">'
+        f'<input type="hidden" name="_token" value="{token}">'
+        '<input type="text" class="form-control" name="email" placeholder="Email">'
+        '<input type="password" class="form-control" name="password">'
+        + ('<img id="captcha-img" src="/vcode.htm?t=1700000000" alt="验证码">' if captcha else '') +
+        '<input type="text" name="verify_code"><button type="submit">登录</button></form></div>'
+    )
+    thread = (
+        '<li class="media thread"><a href="/user-{i}.htm"><img class="avatar" src="/upload/avatar/{i}.png"></a>'
+        '<div class="media-body"><div class="subject"><a href="/thread-{i}.htm">帖子标题 {i} 一些描述文字</a></div>'
+        '<div class="d-flex small"><span class="username">user{i}</span><span class="date">2 小时前</span>'
+        '<span class="text-muted"><i class="icon-eye"></i> {i}</span></div></div></li>'
+    )
+    body = []
+    length = len(head) + len(form)
+    i = 0
+    while length < size_kb * 1024:
+        item = thread.format(i=i)
+        body.append(item)
+        length += len(item)
+        i += 1
+    tail = '<script src="/view/js/jquery.js"></script><script>var x = 1;</script></body></html>'
+    # 登录表单位于导航和侧边帖子列表之间（接近页面前部）
+    half = len(body) // 4
+    return head + ''.join(body[:half]) + form + ''.join(body[half:]) + tail
+
+
+def build_captcha_image(text: str = 'AB12') -> bytes:
+    """生成一张简单的验证码 PNG 图片"""
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (80, 30), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.text((10, 8), text, fill=(0, 0, 0))
+    for _ in range(30):
+        draw.point((random.randrange(80), random.randrange(30)), fill=(120, 120, 120))
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+class MockSite:
+    """模拟网站的行为参数"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 captcha_rate: float = 0.0, captcha_error_rate: float = 0.0, page_kb: int = 30):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.captcha_rate = captcha_rate
+        self.captcha_error_rate = captcha_error_rate
+        # 页面与图片预先生成，避免模拟服务本身成为瓶颈
+        self.page_with_captcha = build_login_page(page_kb, captcha=True)
+        self.page_without_captcha = build_login_page(page_kb, captcha=False)
+        self.captcha_image = build_captcha_image()
+        self.user_center = '<html><body><h1>用户中心</h1></body></html>'
+        self.stats = {'requests': 0, 'errors': 0, 'logins': 0, 'checkins': 0}
+
+    async def _delay(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        self.stats['requests'] += 1
+        await self._delay()
+        if self.error_rate and random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return web.Response(status=503, text='Service Unavailable')
+        return await handler(request)
+
+    async def login_page(self, request):
+        captcha = self.captcha_rate and random.random() < self.captcha_rate
+        return web.Response(text=self.page_with_captcha if captcha else self.page_without_captcha,
+                            content_type='text/html')
+
+    async def login(self, request):
+        form = await request.post()
+        if form.get('verify_code') and random.random() < self.captcha_error_rate:
+            return web.Response(text='<html><body>验证码错误</body></html>', content_type='text/html')
+        self.stats['logins'] += 1
+        response = web.Response(text=self.user_center, content_type='text/html')
+        response.set_cookie('bbs_token', str(form.get('email', '')), max_age=86400)
+        return response
+
+    async def captcha(self, request):
+        return web.Response(body=self.captcha_image, content_type='image/png')
+
+    async def my(self, request):
+        if 'bbs_token' not in request.cookies:
+            raise web.HTTPFound('/user-login.htm')
+        return web.Response(text=self.user_center, content_type='text/html')
+
+    async def checkin_page(self, request):
+        return web.Response(text='<html><body><form method="post"></form></body></html>', content_type='text/html')
+
+    async def checkin(self, request):
+        if 'bbs_token' not in request.cookies:
+            return web.json_response({'ret': 0, 'msg': '请先登录'})
+        self.stats['checkins'] += 1
+        return web.json_response({'ret': 1, 'msg': '签到成功'})
+
+    async def stats_handler(self, request):
+        return web.json_response(self.stats)
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.router.add_get('/user-login.htm', self.login_page)
+        app.router.add_post('/user-login.htm', self.login)
+        app.router.add_get('/vcode.htm', self.captcha)
+        app.router.add_get('/my.htm', self.my)
+        app.router.add_get('/user/checkin', self.checkin_page)
+        app.router.add_post('/user/checkin', self.checkin)
+        app.router.add_get('/_stats', self.stats_handler)
+        return app
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--latency', type=float, default=0.05, help='每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.02, help='额外的随机延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的概率')
+    parser.add_argument('--captcha-rate', type=float, default=0.0, help='登录页带验证码的概率')
+    parser.add_argument('--captcha-error-rate', type=float, default=0.0, help='提交验证码后返回“验证码错误”的概率')
+    parser.add_argument('--page-kb', type=int, default=30, help='登录页大小（KB）')
+
+def site_from_args(args) -> MockSite:
+    return MockSite(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                    captcha_rate=args.captcha_rate, captcha_error_rate=args.captcha_error_rate,
+                    page_kb=args.page_kb)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps({'listening': f'http://{args.host}:{args.port}'}), flush=True)
+    web.run_app(site_from_args(args).create_app(), host=args.host, port=args.port,
+                print=None, access_log=None)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""离线基准：在本地模拟网站上运行大量合成网站，统计吞吐量、单站延迟、内存峰值与事件循环延迟
+
+用法: python benchmarks/run_benchmark.py --sites 1,10,100,1000,5000 --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import resource
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Dict, Any, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_site import add_arguments
+
+class FakeOCRService:
+    """固定耗时的 OCR 替身，用于在没有 Tesseract 的机器上测量调度开销"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def recognize(self, image_bytes: bytes, lang: str = 'eng', config: str = '') -> str:
+        await asyncio.sleep(self.latency)
+        return 'AB12'
+
+    async def warm_up(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+async def monitor_loop_lag(samples: List[float], interval: float = 0.01) -> None:
+    """周期性休眠并记录实际唤醒的延后时间"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
+
+async def run_scenario(site_count: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    from checkin_manager import CheckinManager
+    from config_model import compile_config
+
+    latencies: List[float] = []
+
+    class BenchmarkManager(CheckinManager):
+        async def _execute_site(self, site_config):
+            start = time.perf_counter()
+            result = await super()._execute_site(site_config)
+            latencies.append(time.perf_counter() - start)
+            return result
+
+    config = {
+        'global': {
+            'timeout': options['timeout'],
+            'retry_times': options['retry_times'],
+            'retry': {'base_delay': 0.05, 'max_delay': 1.0},
+            'concurrency': {'max': options['concurrency'], 'per_host': options['concurrency']},
+            'pool': {'limit': options['concurrency'], 'limit_per_host': options['concurrency'],
+                     'dns_cache_path': None},
+            'state': {'enabled': False},
+            'history': {'enabled': False},
+        },
+        'sites': [
+            {
+                'name': f'bench-{i}',
+                'type': 'lixianla',
+                'config': {'base_url': options['base_url'], 'username': f'user{i}', 'password': 'x'}
+            }
+            for i in range(site_count)
+        ]
+    }
+
+    manager = BenchmarkManager(compile_config(config))
+    if options['ocr'] == 'fake':
+        manager.ocr_service = FakeOCRService(options['ocr_latency'])
+
+    lag_samples: List[float] = []
+    monitor = asyncio.ensure_future(monitor_loop_lag(lag_samples))
+    start = time.perf_counter()
+    try:
+        results = await manager.run_all_checkins()
+    finally:
+        elapsed = time.perf_counter() - start
+        monitor.cancel()
+        await manager.close()
+
+    return {
+        'sites': site_count,
+        'success': sum(1 for r in results if r.get('success')),
+        'elapsed': elapsed,
+        'throughput': site_count / elapsed if elapsed else 0.0,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'lag_p99_ms': percentile(lag_samples, 99) * 1000,
+        'lag_max_ms': max(lag_samples, default=0.0) * 1000,
+    }
+
+def run_scenario_in_process(site_count: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    """每个规模在独立进程中运行，使内存峰值互不影响"""
+    logging.basicConfig(level=logging.CRITICAL)
+    return asyncio.run(run_scenario(site_count, options))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_mock_server(args) -> subprocess.Popen:
+    """在独立进程中启动模拟网站，避免与被测进程争抢 CPU"""
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, 'mock_site.py'), '--port', str(args.port),
+        '--latency', str(args.latency), '--jitter', str(args.jitter),
+        '--error-rate', str(args.error_rate), '--captcha-rate', str(args.captcha_rate),
+        '--captcha-error-rate', str(args.captcha_error_rate), '--page-kb', str(args.page_kb),
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    process.stdout.readline()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', args.port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("模拟网站启动失败")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sites', default='1,10,100,1000', help='合成网站数量列表，逗号分隔（最多 5000）')
+    parser.add_argument('--concurrency', type=int, default=100, help='全局并发上限')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--retry-times', type=int, default=3)
+    parser.add_argument('--ocr', choices=['fake', 'real'], default='fake', help='验证码识别方式')
+    parser.add_argument('--ocr-latency', type=float, default=0.05, help='fake OCR 的耗时（秒）')
+    parser.add_argument('--port', type=int, default=0, help='模拟网站端口，默认随机')
+    parser.add_argument('--json', help='将结果写入 JSON 文件')
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.port = args.port or free_port()
+
+    options = {
+        'base_url': f'http://localhost:{args.port}',  # Cookie 容器不接受 IP 地址设置的 Cookie
+        'concurrency': args.concurrency,
+        'timeout': args.timeout,
+        'retry_times': args.retry_times,
+        'ocr': args.ocr,
+        'ocr_latency': args.ocr_latency,
+    }
+
+    server = start_mock_server(args)
+    reports = []
+    try:
+        print(f"{'网站数':>7} {'成功':>6} {'耗时(s)':>8} {'吞吐(站/s)':>11} {'p50(ms)':>9} {'p99(ms)':>9} "
+              f"{'RSS(MB)':>8} {'lag p99':>8} {'lag max':>8}")
+        for site_count in (min(5000, int(s)) for s in args.sites.split(',')):
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                report = executor.submit(run_scenario_in_process, site_count, options).result()
+            reports.append(report)
+            print(f"{report['sites']:>7} {report['success']:>6} {report['elapsed']:>8.2f} "
+                  f"{report['throughput']:>11.1f} {report['p50'] * 1000:>9.1f} {report['p99'] * 1000:>9.1f} "
+                  f"{report['peak_rss_mb']:>8.1f} {report['lag_p99_ms']:>8.1f} {report['lag_max_ms']:>8.1f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'options': vars(args), 'reports': reports}, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+"""录制与回放：将插件的每次 HTTP 交互和验证码识别结果保存为紧凑的二进制磁带文件，
+回放时从内存映射的文件中按顺序取出，不发起任何网络请求
+
+文件格式：MAGIC 之后是若干条目，每条为
+    struct '<BII'（类型, 元数据长度, 正文长度） + 元数据（紧凑 JSON） + 正文（zlib 压缩）
+"""
+import os
+import re
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import logging
+from collections import defaultdict, deque
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, Deque
+
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+from aiohttp.helpers import parse_mimetype
+
+MAGIC = b'CKCAS\x01\n'
+ENTRY_HEADER = struct.Struct('<BII')
+KIND_HTTP = 0
+KIND_OCR = 1
+# 录制时不写入磁带的敏感响应头：值替换为 REDACTED，Set-Cookie 保留 Cookie 名称便于排查
+REDACTED_HEADERS = frozenset({'set-cookie', 'cookie', 'authorization', 'proxy-authorization'})
+REDACTED = '<redacted>'
+
+class CassetteMissError(Exception):
+    """回放时磁带中没有与请求匹配的记录"""
+    pass
+
+class _BodyReader:
+    """模拟 aiohttp StreamReader 中插件用到的读取方法"""
+
+    def __init__(self, body: bytes):
+        self._body = body
+        self._offset = 0
+
+    def _take(self, n: int) -> bytes:
+        end = len(self._body) if n < 0 else min(len(self._body), self._offset + n)
+        chunk = self._body[self._offset:end]
+        self._offset = end
+        return chunk
+
+    async def read(self, n: int = -1) -> bytes:
+        return self._take(n)
+
+    async def readany(self) -> bytes:
+        return self._take(-1)
+
+    async def iter_chunked(self, n: int):
+        while True:
+            chunk = self._take(n)
+            if not chunk:
+                return
+            yield chunk
+
+class CassetteResponse:
+    """由录制数据构造的响应，提供插件与 html_extract 使用的 ClientResponse 接口"""
+
+    def __init__(self, method: str, url: str, status: int, reason: str,
+                 headers: List[Tuple[str, str]], body: bytes):
+        self.method = method
+        self.url = URL(url)
+        self.status = status
+        self.reason = reason
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body
+        self.content = _BodyReader(body)
+        content_type = self.headers.get('Content-Type')
+        self.charset = parse_mimetype(content_type).parameters.get('charset') if content_type else None
+
+    @property
+    def content_length(self) -> int:
+        return len(self._body)
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: Optional[str] = None, errors: str = 'strict') -> str:
+        return self._body.decode(encoding or self.charset or 'utf-8', errors)
+
+    async def json(self, *, encoding: Optional[str] = None, loads=json.loads, content_type: Optional[str] = None) -> Any:
+        return loads(await self.text(encoding))
+
+    def release(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+def cassette_path(directory: str, name: str, account: str) -> str:
+    """每个网站/账号一个磁带文件"""
+    digest = hashlib.sha1(f"{name}\0{account}".encode('utf-8')).hexdigest()[:12]
+    safe_name = re.sub(r'[^\w.-]+', '_', name)
+    return os.path.join(directory, f"{safe_name}-{digest}.cas")
+
+def redact_headers(headers: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """去掉 Cookie 与认证信息（回放时不使用这些响应头，会话存储也不参与录制和回放）"""
+    redacted = []
+    for name, value in headers:
+        lower = name.lower()
+        if lower in REDACTED_HEADERS:
+            cookie_name, sep, _ = value.partition('=')
+            value = f"{cookie_name}={REDACTED}" if lower == 'set-cookie' and sep else REDACTED
+        redacted.append((name, value))
+    return redacted
+
+class CassetteRecorder:
+    """录制模式：请求照常发出，读取完整的响应体后记录下来"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: List[Tuple[int, bytes, bytes]] = []
+
+    def _add(self, kind: int, meta: Dict[str, Any], body: bytes = b'') -> None:
+        encoded = json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.entries.append((kind, encoded, zlib.compress(body) if body else b''))
+
+    async def request(self, method: str, url: str,
+                      send: Callable[[], Awaitable[Any]]) -> CassetteResponse:
+        response = await send()
+        try:
+            body = await response.read()
+        finally:
+            response.release()
+        headers = list(response.headers.items())
+        self._add(KIND_HTTP, {'m': method.upper(), 'u': url, 's': response.status,
+                              'r': response.reason or '', 'h': redact_headers(headers), 'f': str(response.url)}, body)
+        return CassetteResponse(method, str(response.url), response.status, response.reason or '', headers, body)
+
+    async def recognize(self, recognize: Callable[[], Awaitable[str]]) -> str:
+        text = await recognize()
+        self._add(KIND_OCR, {'t': text})
+        return text
+
+    def close(self) -> None:
+        """写出磁带文件（先写临时文件再替换）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC)
+            for kind, meta, body in self.entries:
+                f.write(ENTRY_HEADER.pack(kind, len(meta), len(body)))
+                f.write(meta)
+                f.write(body)
+        os.replace(tmp_path, self.path)
+        logging.info("已录制 %s 条交互到 %s", len(self.entries), self.path)
+
+class Cassette:
+    """以内存映射方式打开的磁带，只解析条目的元数据，正文在回放时才解压"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"不是有效的磁带文件: {path}")
+        # (类型, 元数据, 正文偏移, 正文长度)
+        self.entries: List[Tuple[int, Dict[str, Any], int, int]] = []
+        offset = len(MAGIC)
+        while offset < len(self.mmap):
+            kind, meta_len, body_len = ENTRY_HEADER.unpack_from(self.mmap, offset)
+            offset += ENTRY_HEADER.size
+            meta = json.loads(self.mmap[offset:offset + meta_len])
+            offset += meta_len
+            self.entries.append((kind, meta, offset, body_len))
+            offset += body_len
+
+    def body(self, offset: int, length: int) -> bytes:
+        return zlib.decompress(self.mmap[offset:offset + length]) if length else b''
+
+    def player(self) -> 'CassettePlayer':
+        return CassettePlayer(self)
+
+    def close(self) -> None:
+        self.mmap.close()
+
+class CassettePlayer:
+    """回放模式：同一 (方法, URL) 的请求按录制顺序依次返回，不发起网络请求"""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self.http: Dict[Tuple[str, str], Deque[tuple]] = defaultdict(deque)
+        self.ocr: Deque[str] = deque()
+        for kind, meta, offset, length in cassette.entries:
+            if kind == KIND_HTTP:
+                self.http[(meta['m'], meta['u'])].append((meta, offset, length))
+            elif kind == KIND_OCR:
+                self.ocr.append(meta['t'])
+
+    async def request(self, method: str, url: str, send=None) -> CassetteResponse:
+        queue = self.http.get((method.upper(), url))
+        if not queue:
+            raise CassetteMissError(f"磁带 {self.cassette.path} 中没有 {method.upper()} {url} 的记录")
+        meta, offset, length = queue.popleft()
+        return CassetteResponse(meta['m'], meta.get('f', meta['u']), meta['s'], meta.get('r', ''),
+                                meta.get('h', []), self.cassette.body(offset, length))
+
+    async def recognize(self, recognize=None) -> str:
+        if not self.ocr:
+            raise CassetteMissError(f"磁带 {self.cassette.path} 中没有更多的验证码识别记录")
+        return self.ocr.popleft()
+
+    def close(self) -> None:
+        pass
+
+class CassetteOCR:
+    """经过磁带的 OCR：录制时记录识别结果，回放时直接返回记录的结果"""
+
+    def __init__(self, ocr_service, cassette):
+        self.ocr_service = ocr_service
+        self.cassette = cassette
+
+    async def recognize(self, image_bytes: bytes, lang: str = 'eng', config: str = '') -> str:
+        return await self.cassette.recognize(
+            lambda: self.ocr_service.recognize(image_bytes, lang=lang, config=config)
+        )
+
+class CassetteLibrary:
+    """按网站/账号提供录制器或回放器；回放时同一文件只映射一次，由重复运行的网站共享"""
+
+    def __init__(self, mode: str, directory: str):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"未知的磁带模式: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.cassettes: Dict[str, Cassette] = {}
+
+    def for_site(self, name: str, account: str):
+        path = cassette_path(self.directory, name, account)
+        if self.mode == 'record':
+            return CassetteRecorder(path)
+        if path not in self.cassettes:
+            try:
+                self.cassettes[path] = Cassette(path)
+            except FileNotFoundError:
+                raise CassetteMissError(f"{name} 没有录制的磁带: {path}")
+        return self.cassettes[path].player()
+
+    def close(self) -> None:
+        for cassette in self.cassettes.values():
+            cassette.close()
+        self.cassettes.clear()
@@ -1,55 +1,416 @@
-import os
-import json
+import sys
+import time
+import heapq
 import logging
 import asyncio
-import importlib
-from typing import Dict, List, Any
+from collections import defaultdict
+from urllib.parse import urlparse
+from typing import Dict, List, Any, Optional, AsyncIterator, Tuple, Sequence, Mapping, Callable
+
+import aiohttp
+from session_store import create_session_store
+from ocr_service import OCRService
+from plugin_registry import PluginRegistry
+from retry import CircuitBreakerRegistry
+from state_store import create_state_store
+from history import create_history_store
+from latency import LatencyHistory
+from cassette import CassetteLibrary
+from dns_cache import DiskDnsCache, CachingResolver, site_origins, warm_up
+from config_model import CheckinConfig, SiteRecord
+
+class _DispatchQueue:
+    """等待启动的网站：按 (主机, 类型) 分组，组内按优先级（高者优先）和配置顺序排队
+
+    每个类型一个堆，保存主机未满的分组的队首；全局堆保存未达到类型上限的类型的最佳队首。
+    启动或完成一个网站时只重新检查受影响的主机与类型，每次调度为 O(log n)，与分组数无关
+    """
+
+    def __init__(self, per_host: int, type_limit: Callable[[str], int]):
+        self.per_host = per_host
+        self.type_limit = type_limit
+        self.groups: Dict[Tuple[str, str], list] = {}
+        # 类型 -> [(-优先级, 序号, 主机)]，条目可能已过期，取出时校验
+        self.type_heaps: Dict[str, list] = defaultdict(list)
+        # [(-优先级, 序号, 类型)]，每个类型只有 ready_entry 中记录的条目有效
+        self.ready: list = []
+        self.ready_entry: Dict[str, tuple] = {}
+        # 主机 -> 因该主机已满而暂停的分组类型，主机有空闲时重新加入类型堆
+        self.host_parked: Dict[str, List[str]] = defaultdict(list)
+        self.host_running: Dict[str, int] = defaultdict(int)
+        self.type_running: Dict[str, int] = defaultdict(int)
+        self.size = 0
+
+    def add(self, host: str, site_type: str, index: int, site_config: SiteRecord) -> None:
+        queue = self.groups.get((host, site_type))
+        if queue is None:
+            queue = self.groups[(host, site_type)] = []
+        heapq.heappush(queue, (-site_config.priority, index, site_config))
+        self.size += 1
+
+    def start(self) -> None:
+        """全部网站加入后建立类型堆与全局堆"""
+        for (host, site_type), queue in self.groups.items():
+            self.type_heaps[site_type].append((*queue[0][:2], host))
+        for site_type, heap in self.type_heaps.items():
+            heapq.heapify(heap)
+            self._offer_type(site_type)
+
+    def _offer_type(self, site_type: str) -> None:
+        """类型未达上限时，以其最佳队首加入全局堆"""
+        heap = self.type_heaps.get(site_type)
+        if not heap or self.type_running[site_type] >= self.type_limit(site_type):
+            return
+        entry = (*heap[0][:2], site_type)
+        if self.ready_entry.get(site_type) != entry:
+            self.ready_entry[site_type] = entry
+            heapq.heappush(self.ready, entry)
+
+    def pop(self) -> Optional[Tuple[int, str, str, SiteRecord]]:
+        """取出可以立即启动的优先级最高的网站，返回 (配置序号, 主机, 类型, 网站配置)，没有时返回 None"""
+        while self.ready:
+            entry = heapq.heappop(self.ready)
+            site_type = entry[2]
+            if self.ready_entry.get(site_type) != entry:
+                continue
+            del self.ready_entry[site_type]
+            if self.type_running[site_type] >= self.type_limit(site_type):
+                continue  # 该类型有网站完成时重新加入
+            heap = self.type_heaps[site_type]
+            while heap:
+                _, index, host = heap[0]
+                queue = self.groups.get((host, site_type))
+                if not queue or queue[0][1] != index:
+                    heapq.heappop(heap)  # 分组队首已变化的过期条目
+                elif self.host_running[host] >= self.per_host:
+                    heapq.heappop(heap)
+                    self.host_parked[host].append(site_type)
+                else:
+                    break
+            if not heap:
+                continue
+            if heap[0][:2] != entry[:2]:
+                self._offer_type(site_type)  # 最佳队首已变化，按新的队首重新排队
+                continue
+            _, _, host = heapq.heappop(heap)
+            queue = self.groups[(host, site_type)]
+            _, index, site_config = heapq.heappop(queue)
+            if queue:
+                heapq.heappush(heap, (*queue[0][:2], host))
+            else:
+                del self.groups[(host, site_type)]
+            self.host_running[host] += 1
+            self.type_running[site_type] += 1
+            self.size -= 1
+            self._offer_type(site_type)
+            return index, host, site_type, site_config
+        return None
+
+    def finish(self, host: str, site_type: str) -> None:
+        """一个网站完成，释放其主机与类型的槽位"""
+        self.host_running[host] -= 1
+        self.type_running[site_type] -= 1
+        for parked in self.host_parked.pop(host, ()):
+            queue = self.groups.get((host, parked))
+            if queue:
+                heapq.heappush(self.type_heaps[parked], (*queue[0][:2], host))
+                self._offer_type(parked)
+        self._offer_type(site_type)
+
+    def drain(self) -> List[Tuple[int, SiteRecord]]:
+        """取出所有尚未启动的网站（按优先级与配置顺序）"""
+        remaining = sorted(item for queue in self.groups.values() for item in queue)
+        self.groups.clear()
+        self.type_heaps.clear()
+        self.ready.clear()
+        self.ready_entry.clear()
+        self.host_parked.clear()
+        self.size = 0
+        return [(index, site_config) for _, index, site_config in remaining]
 
 class CheckinManager:
-    def __init__(self, config: Dict[str, Any]):
-        self.global_config = config.get('global', {})
-        self.site_configs = config.get('sites', [])
+    def __init__(self, config: CheckinConfig, force: bool = False, registry: Optional[PluginRegistry] = None,
+                 cassettes: Optional[CassetteLibrary] = None):
+        self.global_config = config.global_config
+        self.site_configs = config.sites
+        self.force = force
+        self.registry = registry or PluginRegistry()
         self.plugins = {}
-        self.load_plugins()
+        self.connector: Optional[aiohttp.TCPConnector] = None
+        # DNS 解析结果保存在磁盘上供下次运行使用，启动时并发预解析所有主机
+        pool_config = self.global_config.get('pool', {})
+        self.dns_cache = DiskDnsCache(pool_config.get('dns_cache_path', '.state/dns_cache.json'),
+                                      pool_config.get('dns_disk_ttl', 3600))
+        self.resolver: Optional[CachingResolver] = None
+        self.session_store = create_session_store(self.global_config)
+        self.ocr_service = OCRService(self.global_config.get('ocr', {}))
+        self.breakers = CircuitBreakerRegistry(self.global_config)
+        self.state_store = create_state_store(self.global_config)
+        self.latency = LatencyHistory(self.global_config, self.state_store)
+        self.history = create_history_store(self.global_config)
+        # 待写入历史的结果攒够一批后在线程池中写入，不在事件循环中加锁写文件
+        self.history_batch = max(1, self.global_config.get('history', {}).get('batch_size', 50))
+        self.history_pending: List[Tuple[str, str, Dict[str, Any], float]] = []
+        self.history_flush: Optional[asyncio.Future] = None
+        # 整次运行与单个网站的时间期限（秒），None 表示不限制
+        deadline_config = self.global_config.get('deadline', {})
+        self.run_deadline = deadline_config.get('run')
+        self.site_deadline = deadline_config.get('site', 300)
+        # 插件类型并发上限在此一次性展开为普通字典，调度时只做字典查找；
+        # 0 表示不限制，其余与 max、per_host 一样至少为 1，保证每个类型都能启动网站
+        per_type = self.global_config.get('concurrency', {}).get('per_type', 0)
+        if isinstance(per_type, Mapping):
+            self.type_limits = {site_type: max(1, limit) if limit else sys.maxsize
+                                for site_type, limit in per_type.items()}
+            self.default_type_limit = sys.maxsize
+        else:
+            self.type_limits = {}
+            self.default_type_limit = max(1, per_type) if per_type else sys.maxsize
+        # 录制/回放模式下按网站/账号提供磁带
+        self.cassettes = cassettes
     
-    def load_plugins(self) -> None:
-        """加载所有可用的签到插件"""
-        plugin_dir = os.path.join(os.path.dirname(__file__), 'plugins')
-        logging.info(f"开始加载插件，插件目录: {plugin_dir}")
-        
-        for filename in os.listdir(plugin_dir):
-            if filename.endswith('.py') and not filename.startswith('__'):
-                plugin_name = filename[:-3]
-                logging.info(f"尝试加载插件: {plugin_name}")
-                
-                try:
-                    plugin_module = importlib.import_module(f'plugins.{plugin_name}')
-                    if hasattr(plugin_module, 'register_plugin'):
-                        plugin_class = plugin_module.register_plugin()
-                        self.plugins[plugin_name] = plugin_class
-                        logging.info(f"成功加载插件: {plugin_name}，注册类型: {plugin_name}")
-                    else:
-                        logging.warning(f"插件 {plugin_name} 缺少 register_plugin 函数")
-                except Exception as e:
-                    logging.error(f"加载插件 {plugin_name} 失败: {str(e)}")
-        
-        logging.info(f"已加载的插件: {list(self.plugins.keys())}")
+    def get_connector(self) -> aiohttp.TCPConnector:
+        """获取所有插件共享的连接池（需在事件循环中调用）"""
+        if self.connector is None or self.connector.closed:
+            pool_config = self.global_config.get('pool', {})
+            if self.resolver is None:
+                self.resolver = CachingResolver(self.dns_cache)
+            self.connector = aiohttp.TCPConnector(
+                resolver=self.resolver,
+                limit=pool_config.get('limit', 100),
+                limit_per_host=pool_config.get('limit_per_host', 10),
+                ttl_dns_cache=pool_config.get('dns_cache_ttl', 300),
+                keepalive_timeout=pool_config.get('keepalive_timeout', 30)
+            )
+            logging.info("已创建共享连接池: %s", pool_config or '默认配置')
+        return self.connector
+    
+    async def close(self) -> None:
+        """关闭共享连接池与 OCR 进程池"""
+        if self.connector is not None and not self.connector.closed:
+            await self.connector.close()
+        self.connector = None
+        if self.resolver is not None:
+            await self.resolver.close()
+            self.resolver = None
+        self.dns_cache.save()
+        # 等待 OCR 子进程退出可能需要一段时间，放到线程中执行以免阻塞事件循环
+        await asyncio.get_running_loop().run_in_executor(None, self.ocr_service.shutdown)
+        await self.flush_history()
+        if self.state_store is not None:
+            self.latency.save()
+            self.state_store.close()
+            self.state_store = None
+        if self.history is not None:
+            self.history.close()
+            self.history = None
+        if self.cassettes is not None:
+            self.cassettes.close()
+    
+    def get_plugin_class(self, site_type: str):
+        """首次使用某个类型时才导入对应插件"""
+        if site_type not in self.plugins:
+            self.plugins[site_type] = self.registry.load(site_type)
+        return self.plugins[site_type]
+    
+    def get_site_host(self, site_config: SiteRecord) -> str:
+        """获取网站的主机名（无需导入插件），用于按主机限制并发"""
+        base_url = site_config.base_url or self.registry.get_base_url(site_config.type)
+        return urlparse(base_url).hostname or site_config.type
+    
+    def _start_warm_up(self, site_configs: Sequence[SiteRecord]) -> Optional[asyncio.Future]:
+        """在插件导入之前开始并发解析（并可选地预连接）本次要运行的网站的主机"""
+        pool_config = self.global_config.get('pool', {})
+        if self.cassettes is not None or not site_configs or not pool_config.get('warm_up', True):
+            return None
+        origins = site_origins(site_config.base_url or self.registry.get_base_url(site_config.type)
+                               for site_config in site_configs)
+        connector = self.get_connector()
+        return asyncio.ensure_future(warm_up(
+            self.resolver, connector, origins,
+            preconnect=pool_config.get('preconnect', False),
+            timeout=self.global_config.get('timeout', 30)
+        ))
+    
+    def _type_limit(self, site_type: str) -> int:
+        """获取某个插件类型允许的最大并发数"""
+        return self.type_limits.get(site_type, self.default_type_limit)
+    
+    def create_plugin(self, site_config: SiteRecord, plugin_class):
+        """实例化插件并注入共享资源"""
+        return plugin_class(
+            self.global_config, site_config,
+            connector=self.get_connector(),
+            session_store=self.session_store,
+            ocr_service=self.ocr_service,
+            # 录制/回放时每次运行使用独立的熔断器，其他网站的失败不会改变本网站的请求序列
+            breakers=self.breakers if self.cassettes is None else CircuitBreakerRegistry(self.global_config),
+            latency=self.latency,
+            cassette=self.cassettes.for_site(*site_config.identity) if self.cassettes is not None else None
+        )
+    
+    def _site_timeout(self, site_config: SiteRecord, run_end: Optional[float]) -> Optional[float]:
+        """网站自身期限与整次运行剩余时间中较小的一个"""
+        timeout = site_config.deadline or self.site_deadline
+        if run_end is not None:
+            remaining = max(0.0, run_end - asyncio.get_running_loop().time())
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+    
+    async def _run_site(self, site_config: SiteRecord, run_end: Optional[float] = None) -> Dict[str, Any]:
+        """运行单个网站（超过期限时取消并记为超时），并在运行状态库中记录开始与结果"""
+        name, account = site_config.identity
+        previous = None
+        if self.state_store is not None:
+            previous = self.state_store.get(name, account)
+            self.state_store.mark_started(name, account)
+        start = time.monotonic()
+        timeout = self._site_timeout(site_config, run_end)
+        try:
+            # 超时会取消插件协程，插件在 finally 中关闭自己的会话
+            result = await asyncio.wait_for(self._execute_site(site_config), timeout)
+        except asyncio.TimeoutError:
+            logging.error("%s 超过 %.1f 秒未完成，已取消", name, timeout)
+            result = {"success": False, "message": f"签到超时（{timeout:.1f} 秒内未完成）", "site": name,
+                      "timed_out": True, "duration": round((time.monotonic() - start) * 1000, 2)}
+        return self._finish_site(site_config, previous, result, time.monotonic() - start)
+    
+    def _finish_site(self, site_config: SiteRecord, previous: Optional[Dict[str, Any]],
+                     result: Dict[str, Any], duration: float) -> Dict[str, Any]:
+        """在运行状态库与签到历史中记录结果，并标记与上次结果相比状态是否发生变化"""
+        # 超时、插件加载失败等未经插件产生的结果也带上账号，指标按网站 + 账号区分
+        result.setdefault('account', site_config.account)
+        if self.state_store is not None:
+            self.state_store.record_result(*site_config.identity, result, duration)
+        self._record_history(site_config, result)
+        # 供“仅状态变化时通知”使用
+        outcome = 'success' if result.get('success') else 'failed'
+        result['changed'] = previous is None or previous['outcome'] != outcome
+        return result
+    
+    async def _execute_site(self, site_config: SiteRecord) -> Dict[str, Any]:
+        """在获得执行槽位后才加载插件类、创建插件并运行"""
+        name = site_config.name
+        plugin_class = self.get_plugin_class(site_config.type)
+        if plugin_class is None:
+            return {"success": False, "message": "插件加载失败", "site": name}
+        try:
+            plugin = self.create_plugin(site_config, plugin_class)
+        except Exception as e:
+            logging.error("%s 插件初始化失败: %s", name, e)
+            return {"success": False, "message": f"插件初始化失败: {str(e)}", "site": name}
+        return await plugin.run()
+    
+    def _record_history(self, site_config: SiteRecord, result: Dict[str, Any]) -> None:
+        """将结果加入待写入历史的批次，攒够一批且没有正在进行的写入时在线程池中写入"""
+        if self.history is None:
+            return
+        self.history_pending.append((site_config.name, site_config.account, result, time.time()))
+        if len(self.history_pending) >= self.history_batch and (self.history_flush is None or self.history_flush.done()):
+            self.history_flush = self._write_history_batch()
+
+    def _write_history_batch(self) -> asyncio.Future:
+        entries, self.history_pending = self.history_pending, []
+        return asyncio.get_running_loop().run_in_executor(None, self._append_history, entries)
+
+    def _append_history(self, entries: List[Tuple[str, str, Dict[str, Any], float]]) -> None:
+        """在线程池中执行：写入失败不影响签到"""
+        try:
+            self.history.append_many(entries)
+        except OSError as e:
+            logging.warning("写入签到历史失败（%s 条）: %s", len(entries), e)
+
+    async def flush_history(self) -> None:
+        """等待正在进行的写入，并写入剩余的结果"""
+        if self.history_flush is not None:
+            await self.history_flush
+            self.history_flush = None
+        if self.history_pending and self.history is not None:
+            await self._write_history_batch()
+    
+    def update_sites(self, site_configs: Tuple[SiteRecord, ...]) -> None:
+        """替换网站列表（守护进程重新加载配置时使用，共享连接池与进程池保持不变）"""
+        self.site_configs = site_configs
+    
+    async def iter_checkins(self, site_configs: Optional[Sequence[SiteRecord]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """按完成顺序逐个产出签到结果，每个网站完成后即释放其插件与会话
+
+        site_configs 为空时运行全部配置的网站
+        """
+        async for _, result in self._iter_indexed(site_configs):
+            yield result
     
     async def run_all_checkins(self) -> List[Dict[str, Any]]:
-        """运行所有配置的网站签到任务"""
-        results = []
-        tasks = []
+        """运行所有配置的网站签到任务，按配置顺序返回全部结果"""
+        results: Dict[int, Dict[str, Any]] = {}
+        async for index, result in self._iter_indexed():
+            results[index] = result
+        return [results[index] for index in sorted(results)]
+    
+    async def _iter_indexed(self, site_configs: Optional[Sequence[SiteRecord]] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """调度所有网站（受全局、主机、插件类型并发限制），产出 (配置序号, 结果)"""
+        loop = asyncio.get_running_loop()
+        run_end = loop.time() + self.run_deadline if self.run_deadline else None
+        concurrency = self.global_config.get('concurrency', {})
+        max_concurrency = max(1, concurrency.get('max', 20))
+        queue = _DispatchQueue(max(1, concurrency.get('per_host', 5)), self._type_limit)
         
-        for site_config in self.site_configs:
-            site_type = site_config.get('type')
-            if site_type in self.plugins:
-                plugin_class = self.plugins[site_type]
-                plugin = plugin_class(self.global_config, site_config)
-                tasks.append(plugin.run())
-            else:
-                logging.warning(f"未知的网站类型: {site_type}")
+        to_run: List[SiteRecord] = []
+        for index, site_config in enumerate(self.site_configs if site_configs is None else site_configs):
+            name, account = site_config.identity
+            if not self.force and self.state_store is not None and self.state_store.is_done(name, account):
+                logging.info("%s 本周期已签到成功，跳过", name)
+                yield index, {"success": True, "message": "本周期已签到", "site": name, "account": account,
+                              "skipped": True, "changed": False}
+                continue
+            queue.add(self.get_site_host(site_config), site_config.type, index, site_config)
+            to_run.append(site_config)
+        queue.start()
+        warm_up_task = self._start_warm_up(to_run)
         
-        if tasks:
-            results = await asyncio.gather(*tasks)
+        running: Dict[asyncio.Task, tuple] = {}
+        
+        try:
+            while queue.size or running:
+                if run_end is not None and queue.size and loop.time() >= run_end:
+                    # 运行期限已到：尚未开始的网站不再启动，直接记为超时
+                    logging.warning("运行期限（%s 秒）已到，%s 个网站未开始", self.run_deadline, queue.size)
+                    for index, site_config in queue.drain():
+                        previous = self.state_store.get(*site_config.identity) if self.state_store is not None else None
+                        result = {"success": False, "message": "运行期限已到，未开始签到",
+                                  "site": site_config.name, "timed_out": True}
+                        yield index, self._finish_site(site_config, previous, result, 0.0)
+                    if not running:
+                        break
+                # 在有空闲槽位时，启动未达到主机/类型上限的分组中优先级最高的网站
+                while len(running) < max_concurrency:
+                    picked = queue.pop()
+                    if picked is None:
+                        break
+                    index, host, site_type, site_config = picked
+                    task = asyncio.ensure_future(self._run_site(site_config, run_end))
+                    running[task] = (index, host, site_type)
+                if not running:
+                    # 没有运行中的网站却无法启动排队的网站，等待永远不会结束
+                    raise RuntimeError(f"调度失败：{queue.size} 个网站排队，但没有可启动的网站（请检查并发上限配置）")
+                
+                # 有网站在排队时最多等到运行期限，以便及时结束排队的网站
+                wait_timeout = max(0.0, run_end - loop.time()) if run_end is not None and queue.size else None
+                done, _ = await asyncio.wait(running, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index, host, site_type = running.pop(task)
+                    queue.finish(host, site_type)
+                    yield index, task.result()
+        finally:
+            # 调用方提前停止迭代时取消仍在运行的网站，确保其会话被关闭
+            for task in running:
+                task.cancel()
+            if warm_up_task is not None and not warm_up_task.done():
+                warm_up_task.cancel()
+            pending = [*running, *([warm_up_task] if warm_up_task is not None else [])]
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            await self.flush_history()
         
-        return results
+        if self.registry.import_times:
+            logging.info("插件导入耗时(ms): %s", self.registry.report())
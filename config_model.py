@@ -0,0 +1,342 @@
+import os
+import sys
+import glob
+import json
+import logging
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Tuple, Mapping
+
+from cron import CronSchedule
+
+class ConfigError(ValueError):
+    """配置校验失败，errors 中列出所有问题"""
+
+    def __init__(self, errors: List[str]):
+        self.errors = errors
+        super().__init__("配置校验失败:\n  " + "\n  ".join(errors))
+
+NUMBER = (int, float)
+OPTIONAL_STR = (str, type(None))
+OPTIONAL_NUMBER = (int, float, type(None))
+
+# 全局配置的结构：键 -> 允许的类型，或嵌套的分组
+GLOBAL_SCHEMA: Dict[str, Any] = {
+    'timeout': NUMBER,
+    'retry_times': int,
+    'retry': {'base_delay': NUMBER, 'max_delay': NUMBER, 'breaker_threshold': int, 'breaker_reset': NUMBER},
+    'concurrency': {'max': int, 'per_host': int, 'per_type': (int, dict)},
+    'pool': {'limit': int, 'limit_per_host': int, 'dns_cache_ttl': NUMBER, 'keepalive_timeout': NUMBER,
+             'dns_cache_path': OPTIONAL_STR, 'dns_disk_ttl': NUMBER, 'warm_up': bool, 'preconnect': bool},
+    'session_store': {'enabled': bool, 'backend': str, 'path': str, 'secret': str, 'secret_env': str},
+    'state': {'enabled': bool, 'path': str, 'utc_offset': NUMBER},
+    'history': {'enabled': bool, 'path': str, 'batch_size': int},
+    'metrics': {'enabled': bool, 'prometheus_path': OPTIONAL_STR, 'json_path': OPTIONAL_STR},
+    'results': {'enabled': bool, 'jsonl_path': OPTIONAL_STR},
+    'daemon': {'schedule': str, 'jitter': NUMBER, 'run_on_start': bool, 'reload_interval': NUMBER,
+               'utc_offset': NUMBER},
+    'ocr': {'workers': int, 'threshold': int, 'timeout': NUMBER, 'debug_buffer': int, 'debug_dir': OPTIONAL_STR},
+    'deadline': {'run': OPTIONAL_NUMBER, 'site': OPTIONAL_NUMBER},
+    'latency': {'enabled': bool, 'history': int, 'min_samples': int, 'timeout_multiplier': NUMBER,
+                'min_timeout': NUMBER, 'hedge': bool, 'hedge_percentile': NUMBER},
+    'log_level': str,
+    'logging': {'level': str, 'format': str, 'file': OPTIONAL_STR, 'max_bytes': int, 'backup_count': int},
+}
+
+NOTIFICATION_SCHEMA: Dict[str, Any] = {
+    'only_on_change': bool,
+    'email_enabled': bool,
+    'telegram_enabled': bool,
+    'email': {'host': str, 'port': int, 'user': str, 'password': str, 'recipients': str},
+    'telegram': {'bot_token': str, 'chat_id': (str, int)},
+}
+
+SITE_KEYS = {'name', 'type', 'priority', 'schedule', 'jitter', 'deadline', 'config'}
+
+class _Record:
+    """不可变的 __slots__ 记录，创建后不能修改属性"""
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} 是只读的")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} 是只读的")
+
+    def _fields(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def replace(self, **changes) -> '_Record':
+        return type(self)(**{**self._fields(), **changes})
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __reduce__(self):
+        # MappingProxyType 不能直接序列化，传给子进程时还原为普通字典
+        return (_rebuild, (type(self), {name: thaw(value) for name, value in self._fields().items()}))
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+def _rebuild(cls, fields):
+    return cls(**{name: freeze(value) for name, value in fields.items()})
+
+def freeze(value: Any) -> Any:
+    """将字典/列表转换为只读的映射/元组"""
+    if isinstance(value, dict):
+        return MappingProxyType({sys.intern(k) if isinstance(k, str) else k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+def thaw(value: Any) -> Any:
+    """freeze 的逆操作，用于序列化"""
+    if isinstance(value, Mapping):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+class SiteRecord(_Record):
+    """编译后的单个网站配置"""
+    __slots__ = ('name', 'type', 'account', 'base_url', 'priority', 'schedule', 'jitter', 'deadline', 'config')
+
+    @property
+    def identity(self) -> Tuple[str, str]:
+        """网站的唯一标识：(网站名称, 账号)"""
+        return self.name, self.account
+
+    def __repr__(self):
+        # 不输出 config 中的密码等敏感值
+        return f"SiteRecord(name={self.name!r}, type={self.type!r}, account={self.account!r})"
+
+class CheckinConfig(_Record):
+    """编译后的完整配置：全局配置与通知配置为只读映射，网站为 SiteRecord 元组"""
+    __slots__ = ('global_config', 'notification', 'sites')
+
+def _check_section(data: Any, schema: Dict[str, Any], path: str, errors: List[str]) -> None:
+    if not isinstance(data, dict):
+        errors.append(f"{path} 应为对象")
+        return
+    for key, value in data.items():
+        expected = schema.get(key)
+        if expected is None:
+            logging.warning("未知的配置项 %s.%s，已忽略", path, key)
+        elif isinstance(expected, dict):
+            _check_section(value, expected, f"{path}.{key}", errors)
+        elif not isinstance(value, expected) or (isinstance(value, bool) and bool not in _types(expected)):
+            errors.append(f"{path}.{key} 类型错误: {value!r}")
+
+def _types(expected) -> tuple:
+    return expected if isinstance(expected, tuple) else (expected,)
+
+def _is_count(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+def _check_concurrency(concurrency: Dict[str, Any], errors: List[str]) -> None:
+    """并发上限必须是非负整数；per_type 为整数（所有类型）或 类型 -> 整数，0 表示不限制"""
+    for key in ('max', 'per_host'):
+        value = concurrency.get(key)
+        if isinstance(value, int) and not isinstance(value, bool) and value < 0:
+            errors.append(f"global.concurrency.{key} 应为非负整数: {value!r}")
+    per_type = concurrency.get('per_type')
+    if isinstance(per_type, dict):
+        for site_type, limit in per_type.items():
+            if not _is_count(limit):
+                errors.append(f"global.concurrency.per_type.{site_type} 应为非负整数（0 表示不限制）: {limit!r}")
+    elif isinstance(per_type, int) and not isinstance(per_type, bool) and per_type < 0:
+        errors.append(f"global.concurrency.per_type 应为非负整数（0 表示不限制）: {per_type!r}")
+
+def _compile_site(index: int, site: Any, registry, errors: List[str]) -> Optional[SiteRecord]:
+    path = f"sites[{index}]"
+    if not isinstance(site, dict):
+        errors.append(f"{path} 应为对象")
+        return None
+    for key in site.keys() - SITE_KEYS:
+        logging.warning("未知的配置项 %s.%s，已忽略", path, key)
+
+    site_type = site.get('type')
+    if not isinstance(site_type, str) or not registry.has(site_type):
+        errors.append(f"{path}.type 未知的网站类型: {site_type!r}")
+        return None
+    name = site.get('name', site_type)
+    config = site.get('config', {})
+    priority = site.get('priority', 0)
+    schedule = site.get('schedule')
+    jitter = site.get('jitter')
+    deadline = site.get('deadline')
+    before = len(errors)
+
+    if not isinstance(name, str) or not name:
+        errors.append(f"{path}.name 应为非空字符串")
+    if not isinstance(config, dict):
+        errors.append(f"{path}.config 应为对象")
+        config = {}
+    aliases = registry.get_config_aliases(site_type)
+    renamed = [key for key in aliases if key in config and aliases[key] not in config]
+    if renamed:
+        # 旧键名（如 pinzhi 最初的 liqingxiu / liqingxiu2003）继续可用，编译时改为网站定义中的新键名
+        config = dict(config)
+        for key in renamed:
+            config[aliases[key]] = config.pop(key)
+            logging.warning("%s.config.%s 已更名为 %s，请更新配置", path, key, aliases[key])
+    if isinstance(priority, bool) or not isinstance(priority, int):
+        errors.append(f"{path}.priority 应为整数")
+    if schedule is not None:
+        try:
+            CronSchedule(schedule)
+        except (ValueError, AttributeError) as e:
+            errors.append(f"{path}.schedule 无效: {e}")
+    if jitter is not None and (isinstance(jitter, bool) or not isinstance(jitter, NUMBER) or jitter < 0):
+        errors.append(f"{path}.jitter 应为非负数")
+    if deadline is not None and (isinstance(deadline, bool) or not isinstance(deadline, NUMBER) or deadline <= 0):
+        errors.append(f"{path}.deadline 应为正数（秒）")
+
+    base_url = config.get('base_url', '')
+    if base_url and (not isinstance(base_url, str) or not base_url.startswith(('http://', 'https://'))):
+        errors.append(f"{path}.config.base_url 应以 http:// 或 https:// 开头")
+
+    # 插件自身的配置结构：必填项必须是非空字符串
+    required, account_key = registry.get_config_schema(site_type)
+    for key in required:
+        value = config.get(key)
+        if not isinstance(value, str) or not value:
+            errors.append(f"{path}.config.{key} 是 {site_type} 插件的必填项")
+
+    if len(errors) > before:
+        return None
+    account = config.get(account_key) if account_key else (config.get('username') or config.get('email'))
+    return SiteRecord(
+        name=name,
+        type=sys.intern(site_type),
+        account=str(account or ''),
+        base_url=base_url,
+        priority=priority,
+        schedule=schedule,
+        jitter=jitter,
+        deadline=deadline,
+        config=freeze(config),
+    )
+
+def compile_config(data: Dict[str, Any], registry=None) -> CheckinConfig:
+    """校验整个配置文档并编译为只读记录，有任何问题都在发起网络请求之前抛出 ConfigError"""
+    if registry is None:
+        from plugin_registry import PluginRegistry
+        registry = PluginRegistry()
+
+    errors: List[str] = []
+    if not isinstance(data, dict):
+        raise ConfigError(["配置应为 JSON 对象"])
+    global_config = data.get('global', {})
+    notification = data.get('notification', {})
+    sites = data.get('sites', [])
+    _check_section(global_config, GLOBAL_SCHEMA, 'global', errors)
+    _check_section(notification, NOTIFICATION_SCHEMA, 'notification', errors)
+    if isinstance(global_config, dict) and 'schedule' in global_config.get('daemon', {}):
+        try:
+            CronSchedule(global_config['daemon']['schedule'])
+        except ValueError as e:
+            errors.append(f"global.daemon.schedule 无效: {e}")
+
+    if isinstance(global_config, dict):
+        logging_config = global_config.get('logging', {})
+        if isinstance(logging_config, dict) and logging_config.get('format', 'text') not in ('text', 'json'):
+            errors.append(f"global.logging.format 应为 text 或 json: {logging_config['format']!r}")
+        level = logging_config.get('level', global_config.get('log_level', 'INFO')) if isinstance(logging_config, dict) else 'INFO'
+        if isinstance(level, str) and not isinstance(logging.getLevelName(level.upper()), int):
+            errors.append(f"未知的日志级别: {level!r}")
+        deadline_config = global_config.get('deadline', {})
+        if isinstance(deadline_config, dict):
+            for key in ('run', 'site'):
+                value = deadline_config.get(key)
+                if isinstance(value, NUMBER) and not isinstance(value, bool) and value <= 0:
+                    errors.append(f"global.deadline.{key} 应为正数（秒），不限制时设为 null")
+        concurrency = global_config.get('concurrency', {})
+        if isinstance(concurrency, dict):
+            _check_concurrency(concurrency, errors)
+
+    records = []
+    if not isinstance(sites, list):
+        errors.append("sites 应为数组")
+        sites = []
+    seen = {}
+    for index, site in enumerate(sites):
+        record = _compile_site(index, site, registry, errors)
+        if record is None:
+            continue
+        if record.identity in seen:
+            errors.append(f"sites[{index}] 与 sites[{seen[record.identity]}] 的网站名称和账号重复")
+            continue
+        seen[record.identity] = index
+        records.append(record)
+
+    if errors:
+        raise ConfigError(errors)
+    return CheckinConfig(
+        global_config=freeze(global_config),
+        notification=freeze(notification),
+        sites=tuple(records),
+    )
+
+def _read_json(path: str) -> Dict[str, Any]:
+    """读取 JSON 配置文件（以 // 开头的行视为注释）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line for line in f if not line.lstrip().startswith('//')]
+    try:
+        return json.loads(''.join(lines))
+    except json.JSONDecodeError as e:
+        raise ConfigError([f"{path} 不是有效的 JSON: {e}"])
+
+def _merge(base: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    merged = dict(base)
+    for key, value in extra.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+def read_config(path: Optional[str] = None, env: str = 'CONFIG') -> Dict[str, Any]:
+    """读取原始配置：path 可以是文件或目录，未指定时读取环境变量
+
+    目录中的 *.json 按文件名顺序合并：global/notification 逐层覆盖，sites 依次拼接
+    """
+    if not path:
+        try:
+            return json.loads(os.getenv(env, '{}'))
+        except json.JSONDecodeError as e:
+            raise ConfigError([f"环境变量 {env} 不是有效的 JSON: {e}"])
+    if not os.path.isdir(path):
+        return _read_json(path)
+
+    data: Dict[str, Any] = {}
+    sites: List[Any] = []
+    for file in sorted(glob.glob(os.path.join(path, '*.json'))):
+        part = _read_json(file)
+        if not isinstance(part, dict):
+            raise ConfigError([f"{file} 应为 JSON 对象"])
+        sites.extend(part.pop('sites', []))
+        data = _merge(data, part)
+    data['sites'] = sites
+    return data
+
+def load_config(path: Optional[str] = None, env: str = 'CONFIG', registry=None) -> CheckinConfig:
+    """读取并编译配置"""
+    return compile_config(read_config(path, env), registry)
+
+def config_mtime(path: Optional[str]) -> Optional[float]:
+    """配置文件（或目录中最新的 *.json）的修改时间，用于检测配置变化"""
+    if not path:
+        return None
+    if os.path.isdir(path):
+        files = glob.glob(os.path.join(path, '*.json'))
+        # 目录本身的修改时间覆盖新增/删除文件的情况
+        return max([os.stat(path).st_mtime] + [os.stat(file).st_mtime for file in files])
+    return os.stat(path).st_mtime
@@ -0,0 +1,173 @@
+import time
+import random
+import signal
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Mapping
+
+from checkin_manager import CheckinManager
+from config_model import CheckinConfig, SiteRecord, ConfigError, config_mtime
+from result_sink import create_result_sink
+from cron import CronSchedule
+from log_setup import setup_logging
+
+class CheckinDaemon:
+    """常驻进程：保持同一个 CheckinManager（连接池、DNS 缓存、OCR 进程池、已导入插件），
+    按每个网站自己的 cron 计划加随机抖动运行，并在配置文件变化时重新加载
+    """
+
+    def __init__(self, load_config: Callable[[], CheckinConfig],
+                 report: Callable[..., Awaitable[Any]],
+                 config_path: Optional[str] = None, force: bool = False):
+        self.load_config = load_config
+        self.report = report
+        self.config_path = config_path
+        self.force = force
+        self.config: Optional[CheckinConfig] = None
+        self.config_mtime: Optional[float] = None
+        self.manager: Optional[CheckinManager] = None
+        self.sink = None
+        self.next_runs: Dict[tuple, float] = {}
+        self.stop_event: Optional[asyncio.Event] = None
+
+    @property
+    def daemon_config(self) -> Mapping[str, Any]:
+        return self.config.global_config.get('daemon', {})
+
+    @property
+    def timezone(self) -> timezone:
+        state_config = self.config.global_config.get('state', {})
+        offset = self.daemon_config.get('utc_offset', state_config.get('utc_offset', 8))
+        return timezone(timedelta(hours=offset))
+
+    def _site_schedule(self, site_config: SiteRecord) -> tuple:
+        expression = site_config.schedule or self.daemon_config.get('schedule', '0 0 * * *')
+        jitter = site_config.jitter if site_config.jitter is not None else self.daemon_config.get('jitter', 300)
+        return CronSchedule(expression), jitter
+
+    def _next_run(self, site_config: SiteRecord, after: float) -> float:
+        schedule, jitter = self._site_schedule(site_config)
+        moment = schedule.next_after(datetime.fromtimestamp(after, self.timezone))
+        return moment.timestamp() + random.uniform(0, jitter)
+
+    def _plan(self, startup: bool = False, previous_sites: Optional[Dict[tuple, SiteRecord]] = None) -> None:
+        """为每个网站计算下一次运行时间，配置未变化且已有计划的网站保持不变"""
+        now = time.time()
+        run_on_start = self.daemon_config.get('run_on_start', True)
+        state_store = self.manager.state_store
+        planned = {}
+        for site_config in self.config.sites:
+            identity = site_config.identity
+            if (not startup and identity in self.next_runs and previous_sites is not None
+                    and previous_sites.get(identity) == site_config):
+                planned[identity] = self.next_runs[identity]
+                continue
+            if startup and run_on_start and (state_store is None or not state_store.is_done(*identity)):
+                # 本周期尚未签到成功的网站在启动后（加抖动）立即补签
+                _, jitter = self._site_schedule(site_config)
+                planned[identity] = now + random.uniform(0, min(jitter, 60))
+            else:
+                planned[identity] = self._next_run(site_config, now)
+        self.next_runs = planned
+        if planned:
+            upcoming = datetime.fromtimestamp(min(planned.values()), self.timezone)
+            logging.info("已安排 %s 个网站，最早一次运行于 %s", len(planned), upcoming.strftime('%Y-%m-%d %H:%M:%S'))
+
+    @staticmethod
+    def _logging_settings(config: CheckinConfig) -> tuple:
+        return config.global_config.get('logging'), config.global_config.get('log_level')
+
+    def _config_changed(self) -> bool:
+        if not self.config_path:
+            return False
+        try:
+            mtime = config_mtime(self.config_path)
+        except OSError:
+            return False
+        return mtime != self.config_mtime
+
+    def _load(self) -> CheckinConfig:
+        self.config_mtime = config_mtime(self.config_path)
+        return self.load_config()
+
+    async def _reload(self) -> None:
+        """重新加载配置；全局配置变化时重建 CheckinManager，否则只替换网站列表"""
+        try:
+            config = self._load()
+        except (ConfigError, OSError) as e:
+            logging.error("重新加载配置失败，继续使用原配置: %s", e)
+            return
+        previous_sites = {site.identity: site for site in self.config.sites}
+        if self._logging_settings(config) != self._logging_settings(self.config):
+            setup_logging(config.global_config)
+            logging.info("日志配置已变化，已重新配置日志")
+        if config.global_config != self.config.global_config:
+            logging.info("全局配置已变化，重建签到管理器")
+            await self.manager.close()
+            self.config = config
+            self.manager = CheckinManager(config, force=self.force)
+        else:
+            self.config = config
+            self.manager.update_sites(config.sites)
+        # 删除的网站不再运行，新增或修改的网站重新安排
+        self._plan(previous_sites=previous_sites)
+        logging.info("配置已重新加载")
+
+    async def _run_due(self, due: List[SiteRecord]) -> None:
+        logging.info("开始运行 %s 个到期网站", len(due))
+        try:
+            await self.report(self.config, self.manager.iter_checkins(due),
+                              connector=self.manager.get_connector(), sink=self.sink)
+        except Exception as e:
+            logging.error("运行到期网站时发生错误: %s", e, exc_info=True)
+
+    def stop(self) -> None:
+        logging.info("收到停止信号，等待当前任务结束")
+        self.stop_event.set()
+
+    async def run(self) -> None:
+        self.stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        self.config = self._load()
+        setup_logging(self.config.global_config)
+        self.manager = CheckinManager(self.config, force=self.force)
+        self.sink = create_result_sink(self.config.global_config)
+        self._plan(startup=True)
+        reload_interval = self.daemon_config.get('reload_interval', 30)
+        try:
+            while not self.stop_event.is_set():
+                if self._config_changed():
+                    await self._reload()
+                    reload_interval = self.daemon_config.get('reload_interval', 30)
+
+                now = time.time()
+                sites = {site.identity: site for site in self.config.sites}
+                due_ids = [identity for identity, at in self.next_runs.items() if at <= now]
+                if due_ids:
+                    # 同一时间只运行一批，保证全局/主机并发上限；运行期间到期的网站在下一批执行
+                    await self._run_due([sites[identity] for identity in due_ids if identity in sites])
+                    finished = time.time()
+                    for identity in due_ids:
+                        if identity in sites:
+                            self.next_runs[identity] = self._next_run(sites[identity], finished)
+                    continue
+
+                wait = reload_interval
+                if self.next_runs:
+                    wait = min(wait, max(0.0, min(self.next_runs.values()) - now))
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self.sink is not None:
+                self.sink.close()
+            await self.manager.close()
+            logging.info("守护进程已退出")
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+
+import aiohttp
+from yarl import URL
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+class DiskDnsCache:
+    """保存在磁盘上的 DNS 解析结果，供下一次运行（或其他分片进程）直接使用
+
+    系统解析接口不提供记录的 TTL，因此每条结果按配置的 ttl 过期；过期的结果只在重新解析失败时兜底使用
+    """
+
+    def __init__(self, path: Optional[str], ttl: float = 3600):
+        self.path = path
+        self.ttl = ttl
+        self.entries: Dict[str, Dict[str, Any]] = self._read() if path else {}
+        self.dirty = False
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning("读取 DNS 缓存失败，将重新解析: %s", e)
+            return {}
+
+    @staticmethod
+    def key(host: str, port: int, family: int) -> str:
+        return f"{host}|{port}|{int(family)}"
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[List[Dict[str, Any]]]:
+        entry = self.entries.get(key)
+        if entry is None or (not allow_stale and entry['expires'] < time.time()):
+            return None
+        return entry['addrs']
+
+    def put(self, key: str, addrs: List[Dict[str, Any]]) -> None:
+        self.entries[key] = {'expires': time.time() + self.ttl, 'addrs': addrs}
+        self.dirty = True
+
+    def save(self) -> None:
+        """合并其他进程写入的结果后原子地写回磁盘"""
+        if not self.path or not self.dirty:
+            return
+        now = time.time()
+        merged = {key: entry for key, entry in self._read().items() if entry.get('expires', 0) >= now}
+        merged.update(self.entries)
+        directory = os.path.dirname(self.path)
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(merged, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            logging.warning("保存 DNS 缓存失败: %s", e)
+
+class CachingResolver(AbstractResolver):
+    """先查磁盘缓存的解析器；同一主机的并发解析合并为一次"""
+
+    def __init__(self, cache: DiskDnsCache, resolver: Optional[AbstractResolver] = None):
+        self.cache = cache
+        self.resolver = resolver or DefaultResolver()
+        self.pending: Dict[str, asyncio.Future] = {}
+
+    async def resolve(self, host: str, port: int = 0,
+                      family: socket.AddressFamily = socket.AF_INET) -> List[Dict[str, Any]]:
+        key = self.cache.key(host, port, family)
+        addrs = self.cache.get(key)
+        if addrs is not None:
+            return [dict(addr) for addr in addrs]
+        future = self.pending.get(key)
+        if future is None:
+            future = self.pending[key] = asyncio.ensure_future(self._lookup(key, host, port, family))
+            future.add_done_callback(lambda _: self.pending.pop(key, None))
+            # 所有等待者都被取消时也要取走异常，避免“未处理的异常”警告
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return [dict(addr) for addr in await asyncio.shield(future)]
+
+    async def _lookup(self, key: str, host: str, port: int, family: int) -> List[Dict[str, Any]]:
+        try:
+            addrs = [dict(addr) for addr in await self.resolver.resolve(host, port, family=family)]
+        except OSError:
+            stale = self.cache.get(key, allow_stale=True)
+            if stale is None:
+                raise
+            logging.warning("解析 %s 失败，使用过期的缓存结果", host)
+            return stale
+        self.cache.put(key, addrs)
+        return addrs
+
+    async def close(self) -> None:
+        await self.resolver.close()
+
+def site_origins(base_urls: Iterable[str]) -> List[Tuple[str, int, str]]:
+    """网站地址去重后的 (主机, 端口, 根地址)"""
+    origins = {}
+    for base_url in base_urls:
+        if not base_url:
+            continue
+        url = URL(base_url)
+        if url.host and (url.host, url.port) not in origins:
+            origins[(url.host, url.port)] = str(url.origin())
+    return [(host, port, origin) for (host, port), origin in origins.items()]
+
+async def warm_up(resolver: CachingResolver, connector: aiohttp.TCPConnector,
+                  origins: List[Tuple[str, int, str]], family: int = socket.AF_UNSPEC,
+                  preconnect: bool = False, timeout: float = 10) -> None:
+    """并发解析所有主机，可选地向每个网站发出 HEAD 请求，把建立好（含 TLS）的连接留在共享连接池中"""
+    start = time.perf_counter()
+    cache = resolver.cache
+    hits = sum(1 for host, port, _ in origins if cache.get(cache.key(host, port, family)) is not None)
+    results = await asyncio.gather(*(resolver.resolve(host, port, family=family) for host, port, _ in origins),
+                                   return_exceptions=True)
+    failed = sum(1 for result in results if isinstance(result, BaseException))
+    logging.info("DNS 预解析完成：%s 个主机（磁盘缓存命中 %s，失败 %s），耗时 %.1f ms",
+                 len(origins), hits, failed, (time.perf_counter() - start) * 1000)
+    if not preconnect:
+        return
+
+    async def connect(origin: str) -> bool:
+        try:
+            async with session.head(origin, allow_redirects=False):
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.debug("预连接 %s 失败: %s", origin, e)
+            return False
+
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector, connector_owner=False,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        connected = await asyncio.gather(*(
+            connect(origin) for (_, _, origin), result in zip(origins, results)
+            if not isinstance(result, BaseException)
+        ))
+    logging.info("预连接完成：%s/%s 个网站，耗时 %.1f ms",
+                 sum(connected), len(connected), (time.perf_counter() - start) * 1000)
@@ -0,0 +1,513 @@
+import os
+import math
+import time
+import shutil
+import logging
+import operator
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import islice
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows 下不加锁，多个进程同时写入时需自行避免
+    fcntl = None
+
+# 各阶段耗时列，与 PhaseTimings 中的阶段名称一致
+PHASES = ('dns', 'connect', 'pool_wait', 'http_wait', 'session_probe', 'login_page', 'captcha_download',
+          'ocr', 'login_submit', 'checkin_page', 'checkin_submit', 'parse')
+
+# 列名 -> array 类型码：每列一个只追加的定长文件，第 i 行由各列的第 i 个元素组成
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('time', 'I'),          # 完成时间（Unix 秒）
+    ('day', 'H'),           # 签到周期（按配置时区自 1970-01-01 起的天数）
+    ('site', 'I'),          # 网站/账号在 sites.tsv 中的编号
+    ('outcome', 'B'),       # OUTCOME_*
+    ('attempts', 'B'),      # 登录尝试次数
+    ('ocr_retries', 'B'),   # 验证码识别失败或被判定错误的次数
+    ('duration', 'f'),      # 总耗时（毫秒）
+) + tuple((phase, 'f') for phase in PHASES)  # 未出现的阶段记为 NaN
+
+# 耗时列：查询时按对数分桶统计分位数
+TIMING_COLUMNS = ('duration', *PHASES)
+
+# 整理区中各网站的列：耗时列保存为分桶编号（单字节）
+COMPACT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ('time', 'I'), ('day', 'H'), ('outcome', 'B'), ('attempts', 'B'), ('ocr_retries', 'B'),
+) + tuple((name, 'B') for name in TIMING_COLUMNS)
+
+# 每个 2 倍区间分为 8 个对数桶，分位数的相对误差约 ±4.5%；桶 0 表示缺失，桶 1 为 1 毫秒以下
+BUCKETS_PER_OCTAVE = 8
+
+# 未整理的行超过该数量时，查询前先整理
+COMPACT_ROWS = 5000
+
+OUTCOME_FAILED = 0
+OUTCOME_SUCCESS = 1
+OUTCOME_TIMED_OUT = 2
+
+class HistoryStore:
+    """按列存储的签到历史：每个结果追加一行，网站/账号通过编号字典压缩为定长整数
+
+    多个分片进程可以同时写入同一目录（通过文件锁串行追加）。查询前把新追加的行整理为：
+    - 与追加顺序对齐的耗时分桶列（<列名>.bkt），按日期统计时使用
+    - compact/ 下按 (网站, 日期) 排列的副本与各网站的起始行号，按网站统计时只需切片
+    """
+
+    def __init__(self, directory: str, utc_offset: float = 0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.utc_offset = utc_offset
+        self.site_ids: Dict[Tuple[str, str], int] = {}
+        self.sites: List[Tuple[str, str]] = []
+        self._sites_offset = 0
+        self.files = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def day_of(self, timestamp: float) -> int:
+        return int((timestamp + self.utc_offset * 3600) // 86400)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._path('.lock'), 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load_sites(self) -> None:
+        """读取其他进程新增的网站编号"""
+        path = self._path('sites.tsv')
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            f.seek(self._sites_offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            name, _, account = line.partition('\t')
+            self.site_ids[(name, account)] = len(self.sites)
+            self.sites.append((name, account))
+        self._sites_offset += end
+
+    def _site_id(self, name: str, account: str) -> int:
+        key = (name.replace('\t', ' ').replace('\n', ' '), account.replace('\t', ' ').replace('\n', ' '))
+        site_id = self.site_ids.get(key)
+        if site_id is None:
+            self._load_sites()
+            site_id = self.site_ids.get(key)
+        if site_id is None:
+            line = f"{key[0]}\t{key[1]}\n".encode('utf-8')
+            with open(self._path('sites.tsv'), 'ab') as f:
+                f.write(line)
+            site_id = self.site_ids[key] = len(self.sites)
+            self.sites.append(key)
+            self._sites_offset += len(line)
+        return site_id
+
+    def _open_columns(self) -> None:
+        if self.files is None:
+            self.files = {name: open(self._path(f"{name}.col"), 'ab') for name, _ in COLUMNS}
+
+    def _repair(self) -> None:
+        """进程在写入一行的中途退出时各列长度会不一致，截断到最短的列"""
+        sizes = {name: os.fstat(self.files[name].fileno()).st_size // array(code).itemsize
+                 for name, code in COLUMNS}
+        rows = min(sizes.values())
+        for name, code in COLUMNS:
+            if sizes[name] != rows:
+                os.ftruncate(self.files[name].fileno(), rows * array(code).itemsize)
+
+    def _row(self, result: Dict[str, Any], timestamp: float) -> Dict[str, Any]:
+        if result.get('timed_out'):
+            outcome = OUTCOME_TIMED_OUT
+        else:
+            outcome = OUTCOME_SUCCESS if result.get('success') else OUTCOME_FAILED
+        timings = result.get('timings', {})
+        values = {
+            'time': int(timestamp),
+            'day': self.day_of(timestamp),
+            'outcome': outcome,
+            'attempts': min(255, result.get('attempts', 0)),
+            'ocr_retries': min(255, result.get('ocr_retries', 0)),
+            'duration': result.get('duration', math.nan),
+        }
+        for phase in PHASES:
+            values[phase] = timings.get(phase, math.nan)
+        return values
+
+    def append(self, name: str, account: str, result: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        """追加一个签到结果"""
+        self.append_many([(name, account, result, time.time() if timestamp is None else timestamp)])
+
+    def append_many(self, entries: List[Tuple[str, str, Dict[str, Any], float]]) -> None:
+        """追加一批 (网站, 账号, 结果, 完成时间)：只加锁一次，每列一次写入"""
+        rows = [self._row(result, timestamp) for _, _, result, timestamp in entries]
+        with self._locked():
+            for row, (name, account, _, _) in zip(rows, entries):
+                row['site'] = self._site_id(name, account)
+            self._open_columns()
+            self._repair()
+            for column, code in COLUMNS:
+                self.files[column].write(array(code, [row[column] for row in rows]).tobytes())
+            for f in self.files.values():
+                f.flush()
+
+    def _read(self, path: str, code: str, start: int = 0, count: Optional[int] = None) -> array:
+        values = array(code)
+        if count is None:
+            count = os.path.getsize(path) // values.itemsize - start if os.path.exists(path) else 0
+        if count > 0:
+            with open(path, 'rb') as f:
+                f.seek(start * values.itemsize)
+                values.fromfile(f, count)
+        return values
+
+    def _rows(self) -> int:
+        """完整写入的行数（各列长度的最小值）"""
+        rows = None
+        for name, code in COLUMNS:
+            path = self._path(f"{name}.col")
+            size = os.path.getsize(path) // array(code).itemsize if os.path.exists(path) else 0
+            rows = size if rows is None else min(rows, size)
+        return rows or 0
+
+    def _read_tail(self, names: List[str], start: int, end: int) -> Dict[str, array]:
+        """读取尚未整理的行，耗时列转换为分桶编号"""
+        codes = dict(COLUMNS)
+        tail = {}
+        for name in names:
+            values = self._read(self._path(f"{name}.col"), codes[name], start, end - start)
+            tail[name] = bucketize(values) if name in TIMING_COLUMNS else values
+        return tail
+
+    def _compacted(self) -> Tuple[Optional[str], int]:
+        """当前整理区目录及其包含的行数"""
+        try:
+            with open(self._path('compact/CURRENT'), 'r', encoding='utf-8') as f:
+                rows = int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None, 0
+        return self._path(f"compact/{rows}"), rows
+
+    def _compact(self) -> Tuple[Optional[str], int]:
+        """未整理的行较多时把它们并入整理区（需持有锁），返回整理区目录及行数"""
+        directory, compacted = self._compacted()
+        total = self._rows()
+        if total - compacted <= COMPACT_ROWS:
+            return directory, compacted
+        start = time.perf_counter()
+        tail = self._read_tail([name for name, _ in COLUMNS], compacted, total)
+        for name in TIMING_COLUMNS:
+            with open(self._path(f"{name}.bkt"), 'ab') as f:
+                # 上次整理中途退出时可能多写了一部分，先截断到已整理的行数
+                f.truncate(compacted)
+                tail[name].tofile(f)
+
+        old = {name: self._read(os.path.join(directory, f"{name}.col"), code) if directory else array(code)
+               for name, code in COMPACT_COLUMNS}
+        old_offsets = self._read(os.path.join(directory, 'offsets.col'), 'Q') if directory else array('Q', [0])
+        self._load_sites()
+        # 新增的行按网站稳定排序（同一网站内保持追加顺序），之后每个网站是一段连续区间
+        order = sorted(range(total - compacted), key=tail['site'].__getitem__)
+        tail = {name: _take(values, order) for name, values in tail.items()}
+        sites = tail['site']
+
+        merged = {name: array(code) for name, code in COMPACT_COLUMNS}
+        offsets = array('Q', [0])
+        old_sites = len(old_offsets) - 1
+        days = merged['day']
+        for site_id in range(len(self.sites)):
+            begin = len(days)
+            if site_id < old_sites:
+                lo, hi = old_offsets[site_id], old_offsets[site_id + 1]
+                for name, _ in COMPACT_COLUMNS:
+                    merged[name].extend(old[name][lo:hi])
+            lo, hi = bisect_left(sites, site_id), bisect_right(sites, site_id)
+            if lo < hi:
+                for name, _ in COMPACT_COLUMNS:
+                    merged[name].extend(tail[name][lo:hi])
+                section = days[begin:]
+                if any(map(operator.gt, section, islice(section, 1, None))):
+                    # 同一网站的行跨批次乱序（很少见），按日期与时间重排该网站的区段
+                    times = merged['time']
+                    order = sorted(range(begin, len(days)), key=lambda i: (days[i], times[i]))
+                    for name, _ in COMPACT_COLUMNS:
+                        merged[name][begin:] = _take(merged[name], order)
+            offsets.append(len(days))
+
+        target = self._path(f"compact/{total}")
+        tmp = f"{target}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, values in [*merged.items(), ('offsets', offsets)]:
+            with open(os.path.join(tmp, f"{name}.col"), 'wb') as f:
+                values.tofile(f)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(tmp, target)
+        with open(self._path('compact/CURRENT.tmp'), 'w', encoding='utf-8') as f:
+            f.write(str(total))
+        os.replace(self._path('compact/CURRENT.tmp'), self._path('compact/CURRENT'))
+        if directory and directory != target:
+            shutil.rmtree(directory, ignore_errors=True)
+        logging.info("签到历史已整理：%s 行（新增 %s 行），耗时 %.0f ms",
+                     total, total - compacted, (time.perf_counter() - start) * 1000)
+        return target, total
+
+    def load(self, since_day: Optional[int] = None, columns: Optional[List[str]] = None) -> Dict[str, array]:
+        """按追加顺序读取各列（可只读取 since_day 之后的行），耗时列为分桶编号
+
+        day 列只是近似递增（多个进程的批次可能跨过零点交错写入），乱序时按日期稳定排序后返回
+        """
+        codes = dict(COLUMNS)
+        names = ['day', *(c for c in (columns or [name for name, _ in COLUMNS]) if c != 'day')]
+        with self._locked():
+            _, compacted = self._compact()
+            total = self._rows()
+            self._load_sites()
+            loaded = {}
+            for name in names:
+                if name in TIMING_COLUMNS:
+                    values = self._read(self._path(f"{name}.bkt"), 'B', 0, compacted)
+                    values.extend(self._read_tail([name], compacted, total)[name])
+                else:
+                    values = self._read(self._path(f"{name}.col"), codes[name], 0, total)
+                loaded[name] = values
+        days = loaded['day']
+        if any(map(operator.gt, days, islice(days, 1, None))):
+            order = sorted(range(total), key=days.__getitem__)
+            loaded = {name: _take(values, order) for name, values in loaded.items()}
+        start = bisect_left(loaded['day'], since_day) if since_day is not None else 0
+        return {name: values[start:] for name, values in loaded.items()} if start else loaded
+
+    def by_site(self, columns: List[str]) -> 'SiteView':
+        """读取按网站排列的各列（耗时列为分桶编号）"""
+        names = ['day', *(c for c in columns if c not in ('day', 'site'))]
+        with self._locked():
+            directory, compacted = self._compact()
+            total = self._rows()
+            self._load_sites()
+            data = {name: self._read(os.path.join(directory, f"{name}.col"), 'B' if name in TIMING_COLUMNS
+                                     else dict(COLUMNS)[name]) if directory else array(dict(COMPACT_COLUMNS)[name])
+                    for name in names}
+            offsets = self._read(os.path.join(directory, 'offsets.col'), 'Q') if directory else array('Q', [0])
+            tail = self._read_tail(['site', *names], compacted, total)
+        return SiteView(data, offsets, tail)
+
+    def close(self) -> None:
+        if self.files is not None:
+            for f in self.files.values():
+                f.close()
+            self.files = None
+
+def open_history_store(global_config: Dict[str, Any]) -> HistoryStore:
+    """打开 global.history.path 下的历史库，签到周期与运行状态库使用相同的时区"""
+    utc_offset = global_config.get('state', {}).get('utc_offset', 8)
+    return HistoryStore(global_config.get('history', {}).get('path', '.state/history'), utc_offset)
+
+def create_history_store(global_config: Dict[str, Any]) -> Optional[HistoryStore]:
+    """根据 global.history 配置创建历史库，未启用时返回 None"""
+    if not global_config.get('history', {}).get('enabled', True):
+        return None
+    try:
+        return open_history_store(global_config)
+    except OSError as e:
+        logging.error("打开签到历史目录失败，本次不记录历史: %s", e)
+        return None
+
+def _take(values: array, rows: List[int]) -> array:
+    """按行号取出各行（行号列表较长时由 itemgetter 在 C 层完成）"""
+    if len(rows) < 2:
+        return array(values.typecode, [values[row] for row in rows])
+    return array(values.typecode, operator.itemgetter(*rows)(values))
+
+class SiteView:
+    """按网站读取的历史：整理区中每个网站的行连续存放并按日期排序，之后追加的少量行按网站归组"""
+
+    def __init__(self, data: Dict[str, array], offsets: array, tail: Dict[str, array]):
+        self.data = data
+        self.offsets = offsets
+        self.tail = tail
+        self.tail_rows: Dict[int, List[int]] = defaultdict(list)
+        for row, site_id in enumerate(tail['site']):
+            self.tail_rows[site_id].append(row)
+
+    def window(self, site_id: int, since_day: Optional[int] = None) -> Dict[str, array]:
+        """某个网站在 since_day 之后的各列（按日期排序）"""
+        if site_id + 1 < len(self.offsets):
+            lo, hi = self.offsets[site_id], self.offsets[site_id + 1]
+        else:
+            lo = hi = 0
+        if since_day is not None:
+            lo = bisect_left(self.data['day'], since_day, lo, hi)
+        columns = {name: values[lo:hi] for name, values in self.data.items()}
+        rows = self.tail_rows.get(site_id)
+        if rows:
+            if since_day is not None:
+                days = self.tail['day']
+                rows = [row for row in rows if days[row] >= since_day]
+            for name, values in columns.items():
+                values.extend(map(self.tail[name].__getitem__, rows))
+            days = columns['day']
+            if any(map(operator.gt, days, islice(days, 1, None))):
+                order = sorted(range(len(days)), key=days.__getitem__)
+                columns = {name: _take(values, order) for name, values in columns.items()}
+        return columns
+
+def bucketize(values: array) -> array:
+    """耗时（毫秒）转换为对数分桶编号"""
+    log2 = math.log2
+    scale = BUCKETS_PER_OCTAVE
+    return array('B', [0 if value != value else 1 if value < 1 else min(255, 2 + int(log2(value) * scale))
+                       for value in values])
+
+def bucket_value(bucket: int) -> float:
+    """分桶的代表值（桶内的几何中点）"""
+    if bucket <= 1:
+        return 0.5
+    return 2 ** ((bucket - 1.5) / BUCKETS_PER_OCTAVE)
+
+_above_tables: Dict[int, bytes] = {}
+
+def _above(bucket: int) -> bytes:
+    """bytes.translate 的删除集合：缺失（0）与编号大于 bucket 的字节"""
+    table = _above_tables.get(bucket)
+    if table is None:
+        table = _above_tables[bucket] = bytes([0, *range(bucket + 1, 256)])
+    return table
+
+def _percentiles(buckets: bytes, pcts: Tuple[float, ...]) -> List[Optional[float]]:
+    """由分桶编号计算分位数：小分组直接排序，大分组按桶编号二分，每步在 C 层删除并计数"""
+    missing = buckets.count(0)
+    valid = len(buckets) - missing
+    if not valid:
+        return [None] * len(pcts)
+    ranks = [min(valid - 1, int(pct / 100 * valid)) for pct in pcts]
+    if len(buckets) <= 256:
+        ordered = sorted(buckets)
+        return [bucket_value(ordered[missing + rank]) for rank in ranks]
+    values = []
+    for rank in ranks:
+        lo, hi = 1, 255
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if len(buckets.translate(None, _above(mid))) > rank:
+                hi = mid
+            else:
+                lo = mid + 1
+        values.append(bucket_value(lo))
+    return values
+
+def _concat(parts: List[Dict[str, array]]) -> Dict[str, bytes]:
+    if len(parts) == 1:
+        return {name: values.tobytes() if values.typecode == 'B' else values for name, values in parts[0].items()}
+    combined = {name: array(values.typecode) for name, values in parts[0].items()}
+    for part in parts:
+        for name, values in part.items():
+            combined[name].extend(values)
+    return {name: values.tobytes() if values.typecode == 'B' else values for name, values in combined.items()}
+
+def _summarize(key: Any, parts: List[Dict[str, array]], phases: bool) -> Optional[Dict[str, Any]]:
+    """汇总一个分组（一个或多个网站/日期的列切片），计数、求和与分位数都在 C 层完成"""
+    columns = _concat(parts)
+    outcome = columns['outcome']
+    runs = len(outcome)
+    if not runs:
+        return None
+    p50, p95 = _percentiles(columns['duration'], (50, 95))
+    entry = {
+        'key': key,
+        'runs': runs,
+        'success_rate': outcome.count(OUTCOME_SUCCESS) / runs,
+        'timed_out': outcome.count(OUTCOME_TIMED_OUT),
+        'attempts': sum(columns['attempts']) / runs,
+        'ocr_retries': sum(columns['ocr_retries']) / runs,
+        'p50_ms': p50,
+        'p95_ms': p95,
+    }
+    if phases:
+        entry['phases'] = {}
+        for phase in PHASES:
+            value, = _percentiles(columns[phase], (95,))
+            if value is not None:
+                entry['phases'][phase] = value
+    return entry
+
+def _day_slices(data: Dict[str, array]) -> List[Tuple[int, Dict[str, array]]]:
+    """已按日期排序的各列切分为每天一段"""
+    days = data['day']
+    slices = []
+    start = 0
+    while start < len(days):
+        day = days[start]
+        end = bisect_right(days, day, start)
+        slices.append((day, {name: values[start:end] for name, values in data.items()}))
+        start = end
+    return slices
+
+def query_history(store: HistoryStore, days: int = 30, site: Optional[str] = None,
+                  account: Optional[str] = None, by: str = 'site', phases: bool = False) -> List[Dict[str, Any]]:
+    """按网站、网站/账号或日期汇总最近 days 天的成功率、重试次数与耗时分位数（按分桶近似）"""
+    since_day = store.day_of(time.time()) - days + 1 if days else None
+    columns = ['day', 'outcome', 'attempts', 'ocr_retries', 'duration', *(PHASES if phases else ())]
+
+    if by == 'day' and site is None and account is None:
+        # 全部网站按日期统计：按日期排序后每天的行是一段连续区间
+        groups = [(day, [part]) for day, part in _day_slices(store.load(since_day, columns))]
+    else:
+        view = store.by_site(columns)
+        ids = [i for i, (name, acc) in enumerate(store.sites)
+               if (site is None or name == site) and (account is None or acc == account)]
+        merged: Dict[Any, List[Dict[str, array]]] = defaultdict(list)
+        for site_id in ids:
+            window = view.window(site_id, since_day)
+            if by == 'day':
+                for day, part in _day_slices(window):
+                    merged[day].append(part)
+            else:
+                name, acc = store.sites[site_id]
+                merged[name if by == 'site' else f"{name} / {acc}"].append(window)
+        groups = list(merged.items())
+
+    report = []
+    for key, parts in groups:
+        entry = _summarize(time.strftime('%Y-%m-%d', time.gmtime(key * 86400)) if by == 'day' else key,
+                           parts, phases)
+        if entry is not None:
+            report.append(entry)
+    if by == 'day':
+        report.sort(key=lambda entry: entry['key'])
+    else:
+        # 成功率最低的网站排在最前，便于确定需要调整的网站
+        report.sort(key=lambda entry: (entry['success_rate'], -entry['runs']))
+    return report
+
+def format_history(report: List[Dict[str, Any]]) -> str:
+    """将汇总结果格式化为文本表格"""
+    if not report:
+        return "没有符合条件的签到历史"
+
+    def ms(value: Optional[float]) -> str:
+        return '-' if value is None else f"{value:.0f}"
+
+    header = ['', '次数', '成功率', '超时', '尝试/次', '验证码重试/次', 'p50(ms)', 'p95(ms)']
+    phase_names = sorted({phase for entry in report for phase in entry.get('phases', {})},
+                         key=PHASES.index)
+    header += [f"{phase} p95" for phase in phase_names]
+    rows = [header]
+    for entry in report:
+        rows.append([
+            str(entry['key']), str(entry['runs']), f"{entry['success_rate']:.1%}", str(entry['timed_out']),
+            f"{entry['attempts']:.2f}", f"{entry['ocr_retries']:.2f}", ms(entry['p50_ms']), ms(entry['p95_ms']),
+            *(ms(entry['phases'].get(phase)) for phase in phase_names),
+        ])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows)
@@ -0,0 +1,168 @@
+import time
+import codecs
+import logging
+from html.parser import HTMLParser, tagfind_tolerant
+from typing import Dict, Any, List, Optional, Tuple
+
+class Selector:
+    """预编译的元素选择器：标签名 + 属性条件，命中后取出指定属性"""
+
+    def __init__(self, selector: Dict[str, Any]):
+        self.tag = selector['tag'].lower()
+        self.attr = selector.get('attr', 'value')
+        self.conditions: List[Tuple[str, frozenset]] = []
+        for name, expected in selector.get('attrs', {}).items():
+            values = expected if isinstance(expected, list) else [expected]
+            self.conditions.append((name.lower(), frozenset(values)))
+
+    def matches(self, tag: str, attrs: Dict[str, str]) -> bool:
+        """判断元素是否命中（attrs 为原始属性字符串）"""
+        if tag != self.tag:
+            return False
+        for name, values in self.conditions:
+            actual = attrs.get(name)
+            if actual is None:
+                return False
+            if name == 'class':
+                if values.isdisjoint(actual.split()):
+                    return False
+            elif actual not in values:
+                return False
+        return True
+
+    def find(self, soup) -> Optional[str]:
+        """在 BeautifulSoup 树中查找，返回目标属性值"""
+        for element in soup.find_all(self.tag):
+            attrs = {
+                key: ' '.join(value) if isinstance(value, list) else value
+                for key, value in element.attrs.items()
+            }
+            if self.matches(self.tag, attrs):
+                return attrs.get(self.attr)
+        return None
+
+class TargetExtractor(HTMLParser):
+    """只关心目标元素的增量解析器，不构建文档树
+
+    每个目标对应一组按优先级排列的选择器，与逐个选择器全文查找的语义一致：
+    只有最高优先级的选择器命中后该目标才算确定，全部确定后即可停止读取。
+    """
+
+    def __init__(self, targets: Dict[str, List[Selector]]):
+        super().__init__(convert_charrefs=True)
+        self.targets = targets
+        self.tags = {selector.tag for selectors in targets.values() for selector in selectors}
+        # 需要完整解析的标签：目标标签，以及会切换到原始文本模式的 script/style 等
+        self.parsed_tags = self.tags.union(self.CDATA_CONTENT_ELEMENTS,
+                                           getattr(self, 'RCDATA_CONTENT_ELEMENTS', ()))
+        self.found: Dict[str, Tuple[int, Optional[str]]] = {}
+        self.pending = set(targets)
+
+    @property
+    def done(self) -> bool:
+        return not self.pending
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in self.tags or self.done:
+            return
+        attr_map = {name: value or '' for name, value in attrs}
+        for key in list(self.pending):
+            current = self.found.get(key)
+            limit = current[0] if current else len(self.targets[key])
+            for rank, selector in enumerate(self.targets[key][:limit]):
+                if selector.matches(tag, attr_map):
+                    self.found[key] = (rank, attr_map.get(selector.attr))
+                    if rank == 0:
+                        self.pending.discard(key)
+                    break
+
+    handle_startendtag = handle_starttag
+
+    def parse_starttag(self, i):
+        """其他标签只需定位到结束位置，不必逐个解析和反转义属性（这是整页解析的主要开销）"""
+        match = tagfind_tolerant.match(self.rawdata, i + 1)
+        if match is not None and match.group(1).lower() not in self.parsed_tags:
+            return self.check_for_whole_start_tag(i)
+        return super().parse_starttag(i)
+
+    def updatepos(self, i, j):
+        """不跟踪行号与列号（只用于 getpos，这里不需要），省去每个标签一次的换行计数"""
+        return j
+
+    def results(self) -> Dict[str, Optional[str]]:
+        return {key: self.found[key][1] if key in self.found else None for key in self.targets}
+
+def _fallback_extract(text: str, targets: Dict[str, List[Selector]]) -> Dict[str, Optional[str]]:
+    """增量解析失败时退回完整的 BeautifulSoup 解析"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, 'html.parser')
+    results = {}
+    for key, selectors in targets.items():
+        results[key] = None
+        for selector in selectors:
+            value = selector.find(soup)
+            if value:
+                results[key] = value
+                break
+    return results
+
+def extract_from_text(text: str, targets: Dict[str, List[Selector]],
+                      chunk_size: int = 8192) -> Dict[str, Optional[str]]:
+    """从已读取的 HTML 文本中提取目标元素属性"""
+    extractor = TargetExtractor(targets)
+    try:
+        for offset in range(0, len(text), chunk_size):
+            extractor.feed(text[offset:offset + chunk_size])
+            if extractor.done:
+                break
+        return extractor.results()
+    except Exception as e:
+        logging.warning("增量 HTML 解析失败，改用完整解析: %s", e)
+        return _fallback_extract(text, targets)
+
+async def extract_from_response(response, targets: Dict[str, List[Selector]],
+                                chunk_size: int = 8192, drain_limit: int = 65536,
+                                fallback_limit: int = 65536, timings=None) -> Dict[str, Optional[str]]:
+    """边接收响应体边解析，所有目标确定后立即停止读取
+
+    剩余内容不超过 drain_limit 字节时直接丢弃读取完，以便连接回到连接池复用。
+    已接收的文本只保留前 fallback_limit 个字符，供增量解析失败时改用完整解析；
+    页面更大时不再保留，解析失败则返回已确定的结果。
+    传入 timings 时，解析本身的 CPU 耗时计入 parse 阶段（不含等待网络的时间）。
+    """
+    extractor = TargetExtractor(targets)
+    decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+    received: Optional[List[str]] = []  # 仅用于解析失败时的回退，超过 fallback_limit 后置为 None
+    received_chars = 0
+    read_bytes = 0
+    async for chunk in response.content.iter_chunked(chunk_size):
+        read_bytes += len(chunk)
+        text = decoder.decode(chunk)
+        if received is not None:
+            received_chars += len(text)
+            if received_chars <= fallback_limit:
+                received.append(text)
+            else:
+                received = None
+        start = time.perf_counter()
+        try:
+            extractor.feed(text)
+        except Exception as e:
+            if received is None:
+                logging.warning("增量 HTML 解析失败，页面过大未保留原文，返回已确定的结果: %s", e)
+                return extractor.results()
+            logging.warning("增量 HTML 解析失败，改用完整解析: %s", e)
+            received.append(decoder.decode(await response.content.read(), final=True))
+            return _fallback_extract(''.join(received), targets)
+        finally:
+            if timings is not None:
+                timings.add('parse', time.perf_counter() - start)
+        if extractor.done:
+            break
+    else:
+        return extractor.results()
+
+    if response.content_length is not None and response.content_length - read_bytes <= drain_limit:
+        while await response.content.readany():
+            pass
+    return extractor.results()
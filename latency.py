@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from array import array
+from collections import deque
+from typing import Dict, Any, Optional, Mapping, Awaitable, Callable, Deque
+
+import aiohttp
+
+class LatencyHistory:
+    """按主机记录请求延迟（到收到响应头为止），用于推算自适应超时与对冲请求的等待时间"""
+
+    def __init__(self, global_config: Mapping[str, Any], state_store=None):
+        latency_config = global_config.get('latency', {})
+        self.enabled = latency_config.get('enabled', True)
+        self.history = latency_config.get('history', 200)
+        self.min_samples = latency_config.get('min_samples', 5)
+        self.multiplier = latency_config.get('timeout_multiplier', 3.0)
+        self.min_timeout = latency_config.get('min_timeout', 2.0)
+        self.max_timeout = global_config.get('timeout', 30)
+        self.hedge = latency_config.get('hedge', False)
+        self.hedge_percentile = latency_config.get('hedge_percentile', 95)
+        self.state_store = state_store
+        self.samples: Dict[str, Deque[float]] = {}
+        self._sorted: Dict[str, list] = {}
+        if self.enabled and state_store is not None:
+            for host, data in state_store.load_latency().items():
+                values = array('d')
+                values.frombytes(data)
+                self.samples[host] = deque(values, maxlen=self.history)
+
+    def record(self, host: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        samples = self.samples.get(host)
+        if samples is None:
+            samples = self.samples[host] = deque(maxlen=self.history)
+        samples.append(seconds)
+        self._sorted.pop(host, None)
+
+    def percentile(self, host: str, pct: float) -> Optional[float]:
+        """历史延迟的分位数，样本不足时返回 None"""
+        samples = self.samples.get(host)
+        if not self.enabled or samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = self._sorted.get(host)
+        if ordered is None:
+            ordered = self._sorted[host] = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def timeout_for(self, host: str) -> Optional[aiohttp.ClientTimeout]:
+        """根据 p99 推算建连与读取超时，限制在 [min_timeout, global.timeout] 之间"""
+        p99 = self.percentile(host, 99)
+        if p99 is None:
+            return None
+        adaptive = min(self.max_timeout, max(self.min_timeout, p99 * self.multiplier))
+        return aiohttp.ClientTimeout(total=self.max_timeout, sock_connect=adaptive, sock_read=adaptive)
+
+    def hedge_delay(self, host: str) -> Optional[float]:
+        """超过该时间仍未收到响应时发出对冲请求，未启用或样本不足时返回 None"""
+        if not self.hedge:
+            return None
+        return self.percentile(host, self.hedge_percentile)
+
+    def save(self) -> None:
+        if not self.enabled or self.state_store is None:
+            return
+        self.state_store.save_latency({
+            host: array('d', samples).tobytes() for host, samples in self.samples.items()
+        })
+
+async def hedged_request(send: Callable[[], Awaitable[aiohttp.ClientResponse]],
+                         delay: float) -> aiohttp.ClientResponse:
+    """先发出一个请求，若 delay 秒后仍未返回再发出第二个相同的请求，采用先成功的结果"""
+    tasks = [asyncio.ensure_future(send())]
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            logging.debug("请求超过 %.2f 秒未返回，发出对冲请求", delay)
+            tasks.append(asyncio.ensure_future(send()))
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    winner = task
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if task is not winner and not task.done():
+                task.cancel()
+        for task in tasks:
+            if task is winner:
+                continue
+            # 落选的请求（包括被取消前已经完成的）要释放连接
+            try:
+                response = await task
+            except BaseException:
+                continue
+            response.release()
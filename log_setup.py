@@ -0,0 +1,121 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from contextvars import ContextVar, Token
+from typing import Any, Mapping, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# 当前协程正在处理的网站：(网站名称, 账号, PhaseTimings)，随 asyncio 任务隔离
+log_context: ContextVar[Optional[tuple]] = ContextVar('log_context', default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def bind_site(name: str, account: str, timings=None) -> Token:
+    """将后续日志关联到某个网站/账号，timings 用于附加当前阶段"""
+    return log_context.set((name, account, timings))
+
+class ContextFilter(logging.Filter):
+    """在调用日志的线程（事件循环）中附加 site/account/phase 字段"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        if context is not None:
+            name, account, timings = context
+            if getattr(record, 'site', None) is None:
+                record.site = name
+            if getattr(record, 'account', None) is None:
+                record.account = account
+            phase = timings.current_phase if timings is not None else None
+            if phase and getattr(record, 'phase', None) is None:
+                record.phase = phase
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON，附带 site/account/phase/duration 等结构化字段"""
+
+    FIELDS = ('site', 'account', 'phase', 'duration')
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """只在调用线程中合并消息参数、展开异常，格式化和写入都交给后台线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging(global_config: Optional[Mapping[str, Any]] = None) -> None:
+    """按 global.logging 配置（重新）配置日志：根日志器只把记录放入队列，
+    由后台线程写入控制台和按大小轮转的日志文件
+    """
+    global _listener
+    global_config = global_config or {}
+    settings = global_config.get('logging', {})
+    level = settings.get('level', global_config.get('log_level', 'INFO'))
+    path = settings.get('file', 'checkin.log')
+
+    formatter = JsonFormatter() if settings.get('format', 'text') == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if path:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            path,
+            maxBytes=settings.get('max_bytes', 5 * 1024 * 1024),
+            backupCount=settings.get('backup_count', 3),
+            encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # 先停止旧的后台线程，确保已入队的日志全部写出
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers)
+    _listener.start()
+
+def stop_logging() -> None:
+    """停止后台写日志线程并关闭文件"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+atexit.register(stop_logging)
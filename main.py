@@ -1,40 +1,264 @@
-import json
+import time
 import logging
 import asyncio
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import config_model
+from config_model import ConfigError, freeze, thaw
 from checkin_manager import CheckinManager
+from notifier import Notifier
+from metrics import MetricsCollector
+from result_sink import create_result_sink
+from daemon import CheckinDaemon
+from log_setup import setup_logging
+from cassette import CassetteLibrary
+from profiler import LoopProfiler
+from history import open_history_store, query_history, format_history
+from sharding import parse_shard_spec, select_shard, shard_result_path, write_shard_results, load_shard_results
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("checkin.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("Main")
 
-async def main():
+def shard_arg(value):
+    """--shard 的类型转换：格式或编号错误时由 argparse 报错并以状态码 2 退出"""
+    try:
+        return parse_shard_spec(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="自动签到")
+    parser.add_argument('--force', action='store_true', help='忽略运行状态库，重新执行本周期已成功的网站')
+    parser.add_argument('--shard', type=shard_arg, help='只运行指定分片，格式为 i/N（按网站名称 + 账号的稳定哈希分配）')
+    parser.add_argument('--processes', type=int, default=1, help='在本机启动多少个进程并行运行各分片')
+    parser.add_argument('--results-dir', default='results', help='分片结果文件目录')
+    parser.add_argument('--config', help='从 JSON 文件或目录加载配置（默认读取环境变量 CONFIG）')
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--record', metavar='DIR', help='正常签到的同时将每个网站的 HTTP 交互与验证码识别结果录制到目录')
+    cassette_group.add_argument('--replay', metavar='DIR', help='从录制目录回放签到流程，不发起网络请求，用于离线调试与性能测试')
+    parser.add_argument('--repeat', type=int, default=1, help='回放时每个网站重复运行的次数')
+    parser.add_argument('--profile', nargs='?', const='profile', metavar='DIR',
+                        help='剖析模式：检测阻塞事件循环的慢回调并采样循环延迟，结果写入目录（默认 profile）')
+    parser.add_argument('--profile-threshold', type=float, default=50, metavar='MS',
+                        help='剖析模式下视为阻塞的最短时间（毫秒），默认 50')
+    parser.add_argument('--profile-sample', action='store_true',
+                        help='剖析模式下持续采样事件循环线程的调用栈（完整的采样剖析，而不只是阻塞时的调用栈）')
+    subparsers = parser.add_subparsers(dest='command')
+    merge_parser = subparsers.add_parser('merge', help='合并分片结果文件，统一输出、导出指标并发送通知')
+    merge_parser.add_argument('paths', nargs='+', help='分片结果文件或所在目录')
+    subparsers.add_parser('check', help='只校验配置，不执行签到')
+    history_parser = subparsers.add_parser('history', help='查询签到历史：各网站的成功率、重试次数与耗时分位数')
+    history_parser.add_argument('--days', type=int, default=30, help='统计最近多少天，0 表示全部历史')
+    history_parser.add_argument('--site', help='只统计指定网站')
+    history_parser.add_argument('--account', help='只统计指定账号')
+    history_parser.add_argument('--by', choices=('site', 'account', 'day'), default='site',
+                                help='按网站、网站+账号或日期分组')
+    history_parser.add_argument('--phases', action='store_true', help='同时输出各阶段耗时的 p95')
+    subparsers.add_parser('daemon', help='常驻运行，按每个网站的 cron 计划签到，配置文件变化时自动重新加载')
+    return parser.parse_args(argv)
+
+def load_config(path=None):
+    """从配置文件、配置目录或环境变量加载配置，并在启动时完成校验"""
+    config = config_model.load_config(path)
+    logger.info("成功从 %s 加载配置，共 %s 个网站", path or '环境变量 CONFIG', len(config.sites))
+    return config
+
+def log_result(result):
+    status = "✅" if result.get("success") else "❌"
+    logger.info("%s %s: %s", status, result.get('site', '未知站点'), result.get('message', '无消息'),
+                extra={'site': result.get('site'), 'duration': result.get('duration')})
+
+async def consume_results(results, notifier, metrics, sink=None):
+    """逐个处理结果（可以是列表或按完成顺序产出的异步迭代器）：输出日志、写入结果文件、累积通知内容与指标"""
+    def handle(result):
+        log_result(result)
+        if sink is not None:
+            sink.write(result)
+        notifier.add_result(result)
+        metrics.add_result(result)
+
+    if hasattr(results, '__aiter__'):
+        async for result in results:
+            handle(result)
+    else:
+        for result in results:
+            handle(result)
+
+async def report(config, results, connector=None, sink=None):
+    """输出结果、导出指标并发送通知（通知与指标导出并行进行）"""
+    notifier = Notifier(config, connector=connector)
+    metrics = MetricsCollector(config.global_config)
+    await consume_results(results, notifier, metrics, sink)
+    notify_task = asyncio.ensure_future(notifier.flush())
+    try:
+        metrics.export()
+    finally:
+        await notify_task
+
+def run_shard_process(config, force, index, total):
+    """在子进程中用独立的事件循环与 CheckinManager 运行一个分片"""
+    # 日志文件由主进程写入，子进程只输出到控制台，避免多个进程同时轮转同一个文件
+    logging_settings = {**config.global_config.get('logging', {}), 'file': None}
+    setup_logging({**config.global_config, 'logging': logging_settings})
+
+    async def run():
+        checkin_manager = CheckinManager(select_shard(config, index, total), force=force)
+        try:
+            return await checkin_manager.run_all_checkins()
+        finally:
+            await checkin_manager.close()
+    return asyncio.run(run())
+
+async def run_local_shards(config, args):
+    """将全部网站分成 N 个分片，分发到本机进程池并合并结果"""
+    total = args.processes
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=total, mp_context=get_context('spawn')) as executor:
+        shard_results = await asyncio.gather(*(
+            loop.run_in_executor(executor, run_shard_process, config, args.force, index, total)
+            for index in range(total)
+        ))
+    results = []
+    for index, shard in enumerate(shard_results):
+        write_shard_results(shard_result_path(args.results_dir, index, total), shard, index, total)
+        results.extend(shard)
+    sink = create_result_sink(config.global_config)
+    try:
+        await report(config, results, sink=sink)
+    finally:
+        if sink is not None:
+            sink.close()
+
+def cassette_config(config, replay: bool, repeat: int = 1):
+    """录制/回放时使用的配置：不读写会话存储、运行状态库与延迟历史，保证每次都走完整的登录流程
+
+    回放时还会放开并发限制（不再访问真实网站）、去掉重试等待，并按 repeat 复制网站列表
+    """
+    global_config = thaw(config.global_config)
+    for section in ('session_store', 'state', 'latency', 'history'):
+        global_config[section] = {**global_config.get(section, {}), 'enabled': False}
+    sites = config.sites
+    if replay:
+        global_config['concurrency'] = {'max': 1000, 'per_host': 1000, 'per_type': {}}
+        global_config['retry'] = {**global_config.get('retry', {}), 'base_delay': 0, 'max_delay': 0}
+        sites = sites * max(1, repeat)
+    return config.replace(global_config=freeze(global_config), sites=sites)
+
+async def run_cassettes(config, args):
+    """录制或回放全部网站，只输出结果日志与吞吐量，不发送通知、不导出指标"""
+    replay = bool(args.replay)
+    library = CassetteLibrary('replay' if replay else 'record', args.replay or args.record)
+    config = cassette_config(config, replay, args.repeat)
+    checkin_manager = CheckinManager(config, force=True, cassettes=library)
+    succeeded = failed = 0
+    start = time.perf_counter()
+    try:
+        async for result in checkin_manager.iter_checkins():
+            if result.get('success'):
+                succeeded += 1
+            else:
+                failed += 1
+            if not replay or not result.get('success'):
+                log_result(result)
+    finally:
+        await checkin_manager.close()
+    elapsed = time.perf_counter() - start
+    logger.info("%s完成：%s 次运行（成功 %s，失败 %s），耗时 %.2f 秒，%.1f 站/秒",
+                '回放' if replay else '录制', succeeded + failed, succeeded, failed,
+                elapsed, (succeeded + failed) / elapsed if elapsed else 0.0)
+
+def show_history(config, args):
+    """输出签到历史的汇总表"""
+    start = time.perf_counter()
+    report = query_history(open_history_store(config.global_config), days=args.days, site=args.site,
+                           account=args.account, by=args.by, phases=args.phases)
+    print(format_history(report))
+    logger.info("统计了%s的 %s 次签到，耗时 %.1f ms", f"最近 {args.days} 天" if args.days else "全部历史",
+                sum(entry['runs'] for entry in report), (time.perf_counter() - start) * 1000)
+
+async def main(args):
     """主函数"""
+    checkin_manager = None
+    sink = None
+    profiler = None
+    if args.profile:
+        profiler = LoopProfiler(args.profile, slow_threshold=args.profile_threshold / 1000,
+                                sample_all=args.profile_sample).start()
+
+    def load():
+        config = load_config(args.config)
+        if profiler is not None:
+            profiler.site_types.update((site.name, site.type) for site in config.sites)
+        return config
+
     try:
-        # 从环境变量加载配置
-        config_json = __import__('os').getenv('CONFIG', '{}')
-        config = json.loads(config_json)
-        logger.info("成功从环境变量加载配置")
-        
+        if args.command == 'daemon':
+            daemon = CheckinDaemon(load, report, config_path=args.config, force=args.force)
+            await daemon.run()
+            return
+
+        config = load()
+        setup_logging(config.global_config)
+
+        if args.command == 'check':
+            return
+
+        if args.command == 'history':
+            show_history(config, args)
+            return
+
+        if args.command == 'merge':
+            await report(config, load_shard_results(args.paths))
+            return
+
+        if args.record or args.replay:
+            await run_cassettes(config, args)
+            return
+
+        if args.processes > 1:
+            await run_local_shards(config, args)
+            return
+
+        shard = args.shard
+        if shard is not None:
+            config_to_run = select_shard(config, *shard)
+            logger.info("运行分片 %s/%s，共 %s 个网站", shard[0], shard[1], len(config_to_run.sites))
+        else:
+            config_to_run = config
+
         # 初始化签到管理器
-        checkin_manager = CheckinManager(config)
-        
-        # 执行所有签到任务
-        results = await checkin_manager.run_all_checkins()
-        
-        # 输出结果
-        for result in results:
-            status = "✅" if result.get("success") else "❌"
-            logger.info(f"{status} {result.get('site', '未知站点')}: {result.get('message', '无消息')}")
-            
+        checkin_manager = CheckinManager(config_to_run, force=args.force)
+        sink = create_result_sink(config.global_config)
+
+        if shard is not None:
+            # 分片模式只写出结果文件，由 merge 步骤统一导出指标和通知
+            results = []
+            async for result in checkin_manager.iter_checkins():
+                log_result(result)
+                if sink is not None:
+                    sink.write(result)
+                results.append(result)
+            path = shard_result_path(args.results_dir, *shard)
+            write_shard_results(path, results, *shard)
+            logger.info("分片结果已写入 %s", path)
+        else:
+            # 按完成顺序逐个处理签到结果
+            await report(config, checkin_manager.iter_checkins(),
+                         connector=checkin_manager.get_connector(), sink=sink)
+
+    except ConfigError as e:
+        logger.error(str(e))
+        raise SystemExit(2)
     except Exception as e:
-        logger.error(f"执行签到任务时发生错误: {str(e)}", exc_info=True)
+        logger.error("执行签到任务时发生错误: %s", e, exc_info=True)
+    finally:
+        if sink is not None:
+            sink.close()
+        if checkin_manager is not None:
+            await checkin_manager.close()
+        if profiler is not None:
+            profiler.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    setup_logging()
+    asyncio.run(main(parse_args()))
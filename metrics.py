@@ -0,0 +1,223 @@
+import os
+import json
+import math
+import time
+import heapq
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiohttp
+
+class PhaseTimings:
+    """记录单个网站签到过程中各阶段的累计耗时"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = defaultdict(float)
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.current_phase: Optional[str] = None
+        self.started = time.perf_counter()
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] += seconds
+        self.counts[phase] += 1
+
+    @contextmanager
+    def span(self, phase: str):
+        """显式计时的阶段，如 OCR、页面解析、登录提交"""
+        previous = self.current_phase
+        self.current_phase = phase
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+            self.current_phase = previous
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict[str, float]:
+        """各阶段耗时（毫秒）"""
+        return {phase: round(seconds * 1000, 2) for phase, seconds in self.phases.items()}
+
+def create_trace_config(timings: PhaseTimings) -> aiohttp.TraceConfig:
+    """将 aiohttp 的 DNS、建连（含 TLS）、连接池等待和等待响应头的时间计入 timings"""
+    trace_config = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace())
+
+    def start_hook(key):
+        async def on_start(session, ctx, params):
+            setattr(ctx, key, time.perf_counter())
+        return on_start
+
+    def end_hook(key, phase):
+        async def on_end(session, ctx, params):
+            start = getattr(ctx, key, None)
+            if start is not None:
+                timings.add(phase, time.perf_counter() - start)
+        return on_end
+
+    trace_config.on_dns_resolvehost_start.append(start_hook('dns'))
+    trace_config.on_dns_resolvehost_end.append(end_hook('dns', 'dns'))
+    trace_config.on_connection_queued_start.append(start_hook('queued'))
+    trace_config.on_connection_queued_end.append(end_hook('queued', 'pool_wait'))
+    trace_config.on_connection_create_start.append(start_hook('connect'))
+    trace_config.on_connection_create_end.append(end_hook('connect', 'connect'))
+    # http_wait 从请求头发出开始计时，不与连接池等待、DNS 和建连重叠；重定向的每一跳分别计入
+    trace_config.on_request_headers_sent.append(start_hook('sent'))
+    trace_config.on_request_redirect.append(end_hook('sent', 'http_wait'))
+    trace_config.on_request_end.append(end_hook('sent', 'http_wait'))
+    return trace_config
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class LogHistogram:
+    """对数分桶的直方图：每个 2 倍区间分 8 个桶，分位数的相对误差约 9%，占用内存只与取值范围有关"""
+
+    BUCKETS_PER_OCTAVE = 8
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if value > 0:
+            self.buckets[math.floor(math.log2(value) * self.BUCKETS_PER_OCTAVE)] += 1
+        else:
+            self.zeros += 1
+
+    def percentile(self, p: float) -> float:
+        """第 p 百分位的近似值：所在桶的上界，不超过最大值"""
+        if not self.count:
+            return 0.0
+        rank = min(self.count - 1, int(p / 100 * self.count))
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if rank < seen:
+                return min(self.max, 2 ** ((bucket + 1) / self.BUCKETS_PER_OCTAVE))
+        return self.max
+
+class MetricsCollector:
+    """逐个累积结果的指标，占用内存与结果数量无关：各网站/账号最近一次的指标值、
+    各阶段耗时的直方图、计数与最慢的网站（每个网站的完整结果由 results.jsonl_path 逐行写出）
+    """
+
+    def __init__(self, global_config: Dict[str, Any], top: int = 10):
+        metrics_config = global_config.get('metrics', {})
+        self.enabled = metrics_config.get('enabled', True)
+        self.prometheus_path = metrics_config.get('prometheus_path', 'metrics/checkin.prom')
+        self.json_path = metrics_config.get('json_path', 'metrics/summary.json')
+        self.top = top
+        self.sites = 0
+        self.success = 0
+        self.timed_out = 0
+        # Prometheus 各指标按标签保存最近一次的值：同一网站/账号重复运行时覆盖而不是追加
+        self.success_series: Dict[str, int] = {}
+        self.timed_out_series: Dict[str, int] = {}
+        self.duration_series: Dict[str, float] = {}
+        self.phase_series: Dict[Tuple[str, str], float] = {}
+        self.per_phase: Dict[str, LogHistogram] = defaultdict(LogHistogram)
+        # 耗时最长的 top 个网站：(耗时, 序号, 条目) 的小顶堆
+        self.slowest: List[tuple] = []
+
+    def add_result(self, result: Dict[str, Any]) -> None:
+        """累积单个签到结果"""
+        if not self.enabled:
+            return
+        self.sites += 1
+        self.success += bool(result.get('success'))
+        self.timed_out += bool(result.get('timed_out'))
+        # 同一网站的多个账号各自是一条时间序列，标签必须包含账号，否则 node_exporter 会拒绝重复的序列
+        labels = f'site="{_escape_label(result.get("site", ""))}",account="{_escape_label(result.get("account", ""))}"'
+        timings = result.get('timings', {})
+        self.success_series[labels] = 1 if result.get('success') else 0
+        self.timed_out_series[labels] = 1 if result.get('timed_out') else 0
+        if 'duration' in result:
+            self.duration_series[labels] = result['duration'] / 1000
+            entry = (result['duration'], -self.sites,
+                     {'site': result.get('site'), 'account': result.get('account', ''),
+                      'duration_ms': result['duration'], 'timings': timings})
+            if len(self.slowest) < self.top:
+                heapq.heappush(self.slowest, entry)
+            elif entry[:2] > self.slowest[0][:2]:
+                heapq.heapreplace(self.slowest, entry)
+        for phase, ms in timings.items():
+            self.phase_series[(labels, phase)] = ms / 1000
+            self.per_phase[phase].add(ms)
+
+    def prometheus(self) -> str:
+        """node_exporter textfile 格式的指标"""
+        lines = [
+            "# HELP checkin_success Whether the last check-in of the site succeeded.",
+            "# TYPE checkin_success gauge",
+            *(f'checkin_success{{{labels}}} {value}' for labels, value in self.success_series.items()),
+            "# HELP checkin_timed_out Whether the last check-in of the site was cut off by a deadline.",
+            "# TYPE checkin_timed_out gauge",
+            *(f'checkin_timed_out{{{labels}}} {value}' for labels, value in self.timed_out_series.items()),
+            "# HELP checkin_duration_seconds Total wall-clock time of the check-in.",
+            "# TYPE checkin_duration_seconds gauge",
+            *(f'checkin_duration_seconds{{{labels}}} {value:.6f}' for labels, value in self.duration_series.items()),
+            "# HELP checkin_phase_seconds Time spent per phase of the check-in.",
+            "# TYPE checkin_phase_seconds gauge",
+            *(f'checkin_phase_seconds{{{labels},phase="{_escape_label(phase)}"}} {value:.6f}'
+              for (labels, phase), value in self.phase_series.items()),
+            "# HELP checkin_last_run_timestamp_seconds Time the metrics were written.",
+            "# TYPE checkin_last_run_timestamp_seconds gauge",
+            f"checkin_last_run_timestamp_seconds {time.time():.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总各阶段的总耗时与（近似）分位数，以及最慢的网站"""
+        phases = {}
+        for phase, histogram in self.per_phase.items():
+            phases[phase] = {
+                'total_ms': round(histogram.total, 2),
+                'p50_ms': round(histogram.percentile(50), 2),
+                'p95_ms': round(histogram.percentile(95), 2),
+                'max_ms': histogram.max,
+                'sites': histogram.count,
+            }
+        return {
+            'generated_at': time.time(),
+            'sites': self.sites,
+            'success': self.success,
+            'timed_out': self.timed_out,
+            'phases': dict(sorted(phases.items(), key=lambda item: item[1]['total_ms'], reverse=True)),
+            'slowest': [entry for _, _, entry in sorted(self.slowest, reverse=True)],
+        }
+
+    def export(self) -> None:
+        """按 global.metrics 配置导出 Prometheus 文本文件与 JSON 汇总"""
+        if not self.enabled:
+            return
+        try:
+            if self.prometheus_path:
+                _atomic_write(self.prometheus_path, self.prometheus())
+            if self.json_path:
+                _atomic_write(self.json_path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+            logging.info("已导出签到指标: %s, %s", self.prometheus_path, self.json_path)
+        except OSError as e:
+            logging.error("导出签到指标失败: %s", e)
+
+def _atomic_write(path: str, content: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
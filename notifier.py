@@ -1,44 +1,81 @@
+import os
 import logging
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import aiohttp
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+# Telegram 单条消息的最大长度
+TELEGRAM_MAX_LENGTH = 4096
 
 class Notifier:
-    def __init__(self, config):
+    def __init__(self, config, connector: Optional[aiohttp.BaseConnector] = None):
         self.config = config
-        self.notification_config = config.get('notification', {})
-    
+        self.notification_config = config.notification
+        # 复用 CheckinManager 的共享连接池
+        self.connector = connector
+        # 逐个累积的结果摘要，只保留通知需要的文本行与计数
+        self.success_count = 0
+        self.failed_count = 0
+        self.changed = False
+        self.lines: List[str] = []
+
+    def add_result(self, result: Dict) -> None:
+        """累积单个签到结果"""
+        if result.get('success'):
+            self.success_count += 1
+            status = "✅"
+        else:
+            self.failed_count += 1
+            status = "❌"
+        self.changed = self.changed or bool(result.get('changed'))
+        self.lines.append(f"{status} {result.get('site', '未知网站')}: {result.get('message', '无信息')}")
+
+    def build_content(self) -> str:
+        """根据已累积的结果生成通知内容"""
+        lines = [
+            "### 自动签到结果汇总",
+            "",
+            f"✅ 成功: {self.success_count} 个",
+            f"❌ 失败: {self.failed_count} 个",
+            "",
+        ]
+        return "\n".join(lines + self.lines) + "\n"
+
     async def send_notification(self, results: List[Dict]):
-        """发送通知"""
-        if not results:
+        """一次性通知一组结果"""
+        for result in results:
+            self.add_result(result)
+        await self.flush()
+
+    async def flush(self):
+        """发送已累积结果的通知（各渠道并发发送）"""
+        if not self.lines:
             logging.info("没有签到结果需要通知")
             return
-        
-        # 准备通知内容
-        success_count = sum(1 for r in results if r.get('success'))
-        failed_count = len(results) - success_count
-        
-        content = "### 自动签到结果汇总\n\n"
-        content += f"✅ 成功: {success_count} 个\n"
-        content += f"❌ 失败: {failed_count} 个\n\n"
-        
-        for result in results:
-            status = "✅" if result.get('success') else "❌"
-            content += f"{status} {result.get('site', '未知网站')}: {result.get('message', '无信息')}\n"
-        
+
+        if self.notification_config.get('only_on_change', False) and not self.changed:
+            logging.info("签到状态与上次相同，跳过通知")
+            return
+
+        content = self.build_content()
+
+        sends = []
         # 发送邮件通知
         if self.notification_config.get('email_enabled', False):
-            await self._send_email(content)
-        
+            sends.append(self._send_email(content))
+
         # 发送Telegram通知
         if self.notification_config.get('telegram_enabled', False):
-            await self._send_telegram(content)
-    
+            sends.append(self._send_telegram(content))
+
+        if sends:
+            await asyncio.gather(*sends)
+
     async def _send_email(self, content: str):
-        """发送邮件通知"""
+        """发送邮件通知（SMTP 在线程池中执行，不阻塞事件循环）"""
         try:
             # 获取配置
             email_config = self.notification_config.get('email', {})
@@ -47,30 +84,58 @@ class Notifier:
             user = email_config.get('user', os.getenv('EMAIL_USER'))
             password = email_config.get('password', os.getenv('EMAIL_PASSWORD'))
             recipients = email_config.get('recipients', os.getenv('EMAIL_RECIPIENTS', '')).split(',')
-            
+
             if not all([host, port, user, password, recipients]):
                 logging.error("邮件通知配置不完整")
                 return
-            
+
             # 创建邮件
             msg = MIMEMultipart()
             msg['From'] = user
             msg['To'] = ', '.join(recipients)
             msg['Subject'] = "自动签到结果通知"
-            
+
             # 添加内容
             msg.attach(MIMEText(content, 'plain', 'utf-8'))
-            
+
             # 发送邮件
-            with smtplib.SMTP(host, port) as server:
-                server.starttls()
-                server.login(user, password)
-                server.send_message(msg)
-            
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._smtp_send, host, port, user, password, msg)
+
             logging.info("邮件通知发送成功")
         except Exception as e:
-            logging.error(f"邮件通知发送失败: {str(e)}")
-    
+            logging.error("邮件通知发送失败: %s", e)
+
+    @staticmethod
+    def _smtp_send(host: str, port: int, user: str, password: str, msg: MIMEMultipart):
+        with smtplib.SMTP(host, port) as server:
+            server.starttls()
+            server.login(user, password)
+            server.send_message(msg)
+
+    @staticmethod
+    def split_message(content: str, limit: int = TELEGRAM_MAX_LENGTH) -> List[str]:
+        """按行将内容切分为不超过 limit 个字符的若干段"""
+        chunks = []
+        current = []
+        length = 0
+        for line in content.splitlines(keepends=True):
+            while len(line) > limit:
+                # 单行超长时强制截断
+                if current:
+                    chunks.append(''.join(current))
+                    current, length = [], 0
+                chunks.append(line[:limit])
+                line = line[limit:]
+            if length + len(line) > limit:
+                chunks.append(''.join(current))
+                current, length = [], 0
+            current.append(line)
+            length += len(line)
+        if current:
+            chunks.append(''.join(current))
+        return chunks
+
     async def _send_telegram(self, content: str):
         """发送Telegram通知"""
         try:
@@ -78,24 +143,25 @@ class Notifier:
             telegram_config = self.notification_config.get('telegram', {})
             bot_token = telegram_config.get('bot_token', os.getenv('TELEGRAM_BOT_TOKEN'))
             chat_id = telegram_config.get('chat_id', os.getenv('TELEGRAM_CHAT_ID'))
-            
+
             if not bot_token or not chat_id:
                 logging.error("Telegram通知配置不完整")
                 return
-            
+
             # 发送消息
             url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-            data = {
-                'chat_id': chat_id,
-                'text': content,
-                'parse_mode': 'Markdown'
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, data=data) as response:
-                    if response.status == 200:
-                        logging.info("Telegram通知发送成功")
-                    else:
-                        logging.error(f"Telegram通知发送失败，状态码: {response.status}")
+            async with aiohttp.ClientSession(connector=self.connector,
+                                             connector_owner=self.connector is None) as session:
+                for chunk in self.split_message(content):
+                    data = {
+                        'chat_id': chat_id,
+                        'text': chunk,
+                        'parse_mode': 'Markdown'
+                    }
+                    async with session.post(url, data=data) as response:
+                        if response.status != 200:
+                            logging.error("Telegram通知发送失败，状态码: %s", response.status)
+                            return
+            logging.info("Telegram通知发送成功")
         except Exception as e:
-            logging.error(f"Telegram通知发送失败: {str(e)}")    
+            logging.error("Telegram通知发送失败: %s", e)
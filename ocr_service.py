@@ -0,0 +1,173 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from io import BytesIO
+from collections import deque
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Tuple
+
+# 以下变量只在 OCR 子进程中使用
+_tesserocr_apis: Dict[str, Any] = {}
+_use_tesserocr = False
+_threshold_luts: Dict[int, list] = {}
+
+def _init_worker() -> None:
+    """子进程初始化：提前导入依赖，避免每次识别时重复加载"""
+    global _use_tesserocr
+    import PIL.Image  # noqa: F401
+    import PIL.ImageFilter  # noqa: F401
+    try:
+        import tesserocr  # noqa: F401
+        _use_tesserocr = True
+    except ImportError:
+        import pytesseract  # noqa: F401
+        _use_tesserocr = False
+
+def _warm_up() -> int:
+    return os.getpid()
+
+def _threshold_lut(threshold: int) -> list:
+    """二值化查找表，由 PIL 在 C 层按数组一次性映射所有像素"""
+    lut = _threshold_luts.get(threshold)
+    if lut is None:
+        lut = [255 if p > threshold else 0 for p in range(256)]
+        _threshold_luts[threshold] = lut
+    return lut
+
+def _tesserocr_api(lang: str, config: str):
+    """每个子进程按语言和参数缓存一个常驻的 Tesseract 实例"""
+    cache_key = f"{lang}|{config}"
+    api = _tesserocr_apis.get(cache_key)
+    if api is None:
+        import tesserocr
+        api = tesserocr.PyTessBaseAPI(lang=lang)
+        psm = re.search(r'--psm\s+(\d+)', config)
+        if psm:
+            api.SetPageSegMode(int(psm.group(1)))
+        for name, value in re.findall(r'-c\s+(\w+)=(\S+)', config):
+            api.SetVariable(name, value)
+        _tesserocr_apis[cache_key] = api
+    return api
+
+def _recognize(image_bytes: bytes, lang: str, config: str, threshold: int,
+               keep_image: bool) -> Tuple[str, Optional[bytes]]:
+    """在子进程中完成预处理和识别，返回识别文本和（可选的）处理后图片"""
+    from PIL import Image, ImageFilter
+
+    img = Image.open(BytesIO(image_bytes))
+    img = img.convert('L')  # 灰度化
+    img = img.point(_threshold_lut(threshold))  # 高阈值去噪
+    img = img.filter(ImageFilter.SHARPEN)  # 锐化
+
+    if _use_tesserocr:
+        api = _tesserocr_api(lang, config)
+        api.SetImage(img)
+        text = api.GetUTF8Text()
+    else:
+        import pytesseract
+        text = pytesseract.image_to_string(img, lang=lang, config=config)
+
+    processed = None
+    if keep_image:
+        buffer = BytesIO()
+        img.save(buffer, format='PNG')
+        processed = buffer.getvalue()
+    return text, processed
+
+class OCRService:
+    """共享的验证码识别服务，在常驻进程池中执行预处理与 OCR"""
+
+    def __init__(self, ocr_config: Optional[Dict[str, Any]] = None):
+        ocr_config = ocr_config or {}
+        self.workers = ocr_config.get('workers') or min(4, os.cpu_count() or 1)
+        self.threshold = ocr_config.get('threshold', 180)
+        # 单次识别的最长等待时间，超时后按识别失败处理
+        self.timeout = ocr_config.get('timeout', 30)
+        self.debug_dir = ocr_config.get('debug_dir')
+        # 调试图片只保存在内存环形缓冲区中，需要时再统一写出
+        debug_buffer = ocr_config.get('debug_buffer', 0)
+        self.debug_images = deque(maxlen=debug_buffer) if debug_buffer else None
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """第一次识别时才创建进程池；此时 DNS 解析、日志等线程已在运行，
+        因此不直接 fork 当前进程，而是由 forkserver（不支持时用 spawn）创建子进程
+        """
+        if self.executor is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                mp_context=multiprocessing.get_context(method))
+            logging.info("已启动 OCR 进程池，进程数: %s", self.workers)
+        return self.executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        """丢弃已损坏的进程池，下次识别时重新创建"""
+        if self.executor is executor:
+            self.executor = None
+        executor.shutdown(wait=False)
+
+    async def warm_up(self) -> None:
+        """预先启动全部子进程；不调用时进程池在第一次识别时启动"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, _warm_up) for _ in range(self.workers)))
+
+    async def recognize(self, image_bytes: bytes, lang: str = 'eng', config: str = '') -> str:
+        """识别验证码图片，返回原始识别文本"""
+        loop = asyncio.get_running_loop()
+        keep_image = self.debug_images is not None
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                text, processed = await asyncio.wait_for(loop.run_in_executor(
+                    executor, _recognize, image_bytes, lang, config, self.threshold, keep_image
+                ), self.timeout)
+                break
+            except asyncio.TimeoutError:
+                # 已在子进程中运行的识别无法中断，只是不再等待其结果
+                raise TimeoutError(f"验证码识别超过 {self.timeout} 秒")
+            except BrokenProcessPool:
+                # 子进程意外退出（如被 OOM 终止）后整个进程池不可再用：重建后重试一次
+                logging.warning("OCR 进程池已损坏，重新创建")
+                self._discard_executor(executor)
+                if attempt:
+                    raise
+        if keep_image and processed:
+            self.debug_images.append((time.time(), processed))
+        return text
+
+    def dump_debug_images(self, directory: Optional[str] = None) -> int:
+        """将缓冲区中的调试图片写入目录，返回写出的数量"""
+        directory = directory or self.debug_dir
+        if not directory or not self.debug_images:
+            return 0
+        os.makedirs(directory, exist_ok=True)
+        count = 0
+        for index, (timestamp, data) in enumerate(self.debug_images):
+            with open(os.path.join(directory, f"captcha_{int(timestamp)}_{index}.png"), 'wb') as f:
+                f.write(data)
+            count += 1
+        self.debug_images.clear()
+        return count
+
+    def shutdown(self) -> None:
+        """关闭进程池（等待子进程退出），并按配置写出调试图片"""
+        if self.debug_dir:
+            self.dump_debug_images()
+        if self.executor is not None:
+            # 等待子进程退出，避免遗留的子进程在解释器退出后访问已释放的信号量
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+_default_service: Optional[OCRService] = None
+
+def default_ocr_service() -> OCRService:
+    """未由 CheckinManager 注入时使用的进程级共享实例"""
+    global _default_service
+    if _default_service is None:
+        _default_service = OCRService()
+    return _default_service
@@ -0,0 +1,162 @@
+import os
+import ast
+import json
+import time
+import logging
+import importlib
+from typing import Dict, Any, Optional, Tuple
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins')
+SITES_DIR = os.path.join(PLUGIN_DIR, 'sites')
+MANIFEST_PATH = os.path.join(PLUGIN_DIR, 'manifest.json')
+
+def _scan_plugin_file(path: str) -> Optional[Dict[str, Any]]:
+    """静态分析插件文件（不导入），提取注册的类名、base_url 与必填配置项"""
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    class_name = None
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'register_plugin':
+            for child in ast.walk(node):
+                if isinstance(child, ast.Return) and isinstance(child.value, ast.Name):
+                    class_name = child.value.id
+    if class_name is None:
+        return None
+
+    base_url = ""
+    required_config = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == class_name:
+            for item in node.body:
+                if not isinstance(item, ast.Assign):
+                    continue
+                names = {t.id for t in item.targets if isinstance(t, ast.Name)}
+                if 'base_url' in names and isinstance(item.value, ast.Constant):
+                    base_url = item.value.value
+                elif 'required_config' in names:
+                    required_config = list(ast.literal_eval(item.value))
+    return {'class': class_name, 'base_url': base_url, 'required_config': required_config}
+
+def generate_manifest(plugin_dir: str = PLUGIN_DIR) -> Dict[str, Dict[str, Any]]:
+    """扫描插件目录生成清单：类型 -> 模块/网站定义文件、类名、base_url"""
+    manifest = {}
+    for filename in sorted(os.listdir(plugin_dir)):
+        if not filename.endswith('.py') or filename.startswith('__'):
+            continue
+        info = _scan_plugin_file(os.path.join(plugin_dir, filename))
+        if info is None:
+            continue
+        plugin_type = filename[:-3]
+        manifest[plugin_type] = {'module': f'plugins.{plugin_type}', **info}
+
+    # 声明式网站定义，全部由 plugins/form_site.py 中的通用引擎执行
+    sites_dir = os.path.join(plugin_dir, 'sites')
+    if os.path.isdir(sites_dir):
+        for filename in sorted(os.listdir(sites_dir)):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(sites_dir, filename), 'r', encoding='utf-8') as f:
+                spec = json.load(f)
+            manifest[spec['type']] = {
+                'spec': f'sites/{filename}',
+                'base_url': spec.get('base_url', ''),
+                'credentials': spec.get('credentials', {'username': 'username', 'password': 'password'}),
+            }
+            if spec.get('credential_aliases'):
+                manifest[spec['type']]['credential_aliases'] = spec['credential_aliases']
+    return manifest
+
+class PluginRegistry:
+    """基于清单的插件注册表，只在首次使用某个类型时才导入对应模块"""
+
+    def __init__(self, manifest_path: str = MANIFEST_PATH):
+        self.manifest_path = manifest_path
+        self.manifest = self._load_manifest()
+        self.classes: Dict[str, Any] = {}
+        self.import_times: Dict[str, float] = {}
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            logging.warning("未找到插件清单，改为扫描插件目录生成")
+            return generate_manifest()
+
+    def _entry(self, plugin_type: str) -> Optional[Dict[str, Any]]:
+        entry = self.manifest.get(plugin_type)
+        if entry is None and plugin_type:
+            # 新增的插件尚未写入清单时，仍可按文件名约定加载
+            if os.path.exists(os.path.join(PLUGIN_DIR, f'{plugin_type}.py')):
+                entry = {'module': f'plugins.{plugin_type}', 'base_url': ''}
+            elif os.path.exists(os.path.join(SITES_DIR, f'{plugin_type}.json')):
+                entry = {'spec': f'sites/{plugin_type}.json', 'base_url': ''}
+            if entry is not None:
+                logging.warning("插件 %s 不在清单中，请运行 python plugin_registry.py 重新生成", plugin_type)
+                self.manifest[plugin_type] = entry
+        return entry
+
+    def has(self, plugin_type: str) -> bool:
+        """是否存在该类型的插件"""
+        return self._entry(plugin_type) is not None
+
+    def get_base_url(self, plugin_type: str) -> str:
+        """不导入模块即可获取插件的默认网站地址"""
+        entry = self._entry(plugin_type)
+        return entry.get('base_url', '') if entry else ''
+
+    def get_config_schema(self, plugin_type: str) -> Tuple[Tuple[str, ...], Optional[str]]:
+        """不导入模块即可获取插件的必填配置项与账号所在的配置项"""
+        entry = self._entry(plugin_type) or {}
+        if 'credentials' in entry:
+            credentials = entry['credentials']
+            return tuple(credentials.values()), credentials.get('username')
+        if 'spec' in entry:
+            # 清单未记录时按通用引擎的默认键名
+            return ('username', 'password'), 'username'
+        return tuple(entry.get('required_config', ())), None
+
+    def get_config_aliases(self, plugin_type: str) -> Dict[str, str]:
+        """仍然接受的旧配置键名：旧键名 -> 新键名"""
+        entry = self._entry(plugin_type) or {}
+        return entry.get('credential_aliases', {})
+
+    def load(self, plugin_type: str):
+        """导入并返回插件类，失败时返回 None"""
+        if plugin_type in self.classes:
+            return self.classes[plugin_type]
+
+        entry = self._entry(plugin_type)
+        if entry is None:
+            return None
+
+        start = time.perf_counter()
+        try:
+            if 'spec' in entry:
+                from plugins.form_site import load_site_plugin
+                plugin_class = load_site_plugin(os.path.join(PLUGIN_DIR, entry['spec']))
+            else:
+                plugin_module = importlib.import_module(entry['module'])
+                plugin_class = plugin_module.register_plugin()
+        except Exception as e:
+            logging.error("加载插件 %s 失败: %s", plugin_type, e)
+            plugin_class = None
+        elapsed = time.perf_counter() - start
+
+        self.import_times[plugin_type] = elapsed
+        self.classes[plugin_type] = plugin_class
+        if plugin_class is not None:
+            logging.info("成功加载插件: %s，耗时 %.1f ms", plugin_type, elapsed * 1000)
+        return plugin_class
+
+    def report(self) -> Dict[str, float]:
+        """返回各插件的导入耗时（毫秒）"""
+        return {plugin_type: round(elapsed * 1000, 1) for plugin_type, elapsed in self.import_times.items()}
+
+if __name__ == '__main__':
+    manifest = generate_manifest()
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+        f.write('\n')
+    print(f"已生成插件清单: {MANIFEST_PATH}，共 {len(manifest)} 个插件")
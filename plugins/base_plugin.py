@@ -1,16 +1,58 @@
 from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+import time
+import asyncio
 import aiohttp
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Mapping
+from yarl import URL
+from retry import RetryPolicy, CircuitBreakerRegistry, CircuitOpenError, RetryableError
+from session_store import SessionStore, dump_cookies, restore_cookies
+from ocr_service import OCRService, default_ocr_service
+from metrics import PhaseTimings, create_trace_config
+from config_model import SiteRecord
+from log_setup import bind_site, log_context
+from latency import LatencyHistory, hedged_request
+from cassette import CassetteOCR
 
 class BasePlugin(ABC):
-    def __init__(self, global_config: Dict[str, Any], site_config: Dict[str, Any]):
+    # 网站根地址，可在站点配置的 config.base_url 中覆盖
+    base_url = ""
+    # 站点配置 config 中的必填项，启动时由 config_model 统一校验（需为字面量，插件清单通过静态分析读取）
+    required_config: tuple = ()
+    
+    def __init__(self, global_config: Mapping[str, Any], site_config: SiteRecord,
+                 connector: Optional[aiohttp.BaseConnector] = None,
+                 session_store: Optional[SessionStore] = None,
+                 ocr_service: Optional[OCRService] = None,
+                 breakers: Optional[CircuitBreakerRegistry] = None,
+                 latency: Optional[LatencyHistory] = None,
+                 cassette=None):
         self.global_config = global_config
         self.site_config = site_config
-        self.name = site_config.get('name', site_config.get('type', 'UnknownSite'))
+        self.name = site_config.name
+        self.base_url = site_config.base_url or self.base_url
+        self.session_store = session_store
+        self.ocr_service = ocr_service or default_ocr_service()
+        self.retry_policy = RetryPolicy.from_config(global_config)
+        self.breakers = breakers or CircuitBreakerRegistry(global_config)
+        self.latency = latency
+        # 录制/回放模式下所有请求与验证码识别都经过磁带
+        self.cassette = cassette
+        if cassette is not None:
+            self.ocr_service = CassetteOCR(self.ocr_service, cassette)
+        self.timings = PhaseTimings()
+        # 登录尝试次数与验证码重试次数，记录到签到历史中
+        self.login_attempts = 0
+        self.ocr_retries = 0
+        # 共享连接池由 CheckinManager 持有，这里的会话只负责独立的 Cookie 与请求头
         self.session = aiohttp.ClientSession(
+            connector=connector,
+            connector_owner=connector is None,
+            cookie_jar=aiohttp.CookieJar(),
             headers=self.get_headers(),
-            timeout=aiohttp.ClientTimeout(total=global_config.get('timeout', 30))
+            timeout=aiohttp.ClientTimeout(total=global_config.get('timeout', 30)),
+            trace_configs=[create_trace_config(self.timings)]
         )
     
     def get_headers(self) -> Dict[str, str]:
@@ -22,6 +64,133 @@ class BasePlugin(ABC):
             'Connection': 'keep-alive',
         }
     
+    @asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        """带重试与熔断的请求，用法与 session.get/post 的 async with 相同
+
+        hedge=True 表示该请求可以安全地重复发送（不会改变会话状态），幂等请求在启用对冲时适用
+        """
+        response = await self._send(method, url, **kwargs)
+        try:
+            yield response
+        finally:
+            response.release()
+    
+    async def _request_once(self, method: str, url: str, hedge: bool, **kwargs) -> aiohttp.ClientResponse:
+        """发出一次请求；录制模式下记录完整的交互，回放模式下直接从磁带返回"""
+        if self.cassette is not None:
+            return await self.cassette.request(
+                method, url, lambda: self._network_request(method, url, hedge, **kwargs)
+            )
+        return await self._network_request(method, url, hedge, **kwargs)
+    
+    async def _network_request(self, method: str, url: str, hedge: bool, **kwargs) -> aiohttp.ClientResponse:
+        """发出一次网络请求：超时按该主机的历史延迟推算，可选在超过 p95 后发出对冲请求"""
+        host = URL(url).host or ''
+        if self.latency is not None and 'timeout' not in kwargs:
+            timeout = self.latency.timeout_for(host)
+            if timeout is not None:
+                kwargs['timeout'] = timeout
+
+        async def send() -> aiohttp.ClientResponse:
+            start = time.perf_counter()
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except asyncio.TimeoutError:
+                # 超时按已等待的时间计入历史，使后续超时随之放宽
+                if self.latency is not None:
+                    self.latency.record(host, time.perf_counter() - start)
+                raise
+            if self.latency is not None and response.status < 500:
+                self.latency.record(host, time.perf_counter() - start)
+            return response
+
+        delay = self.latency.hedge_delay(host) if hedge and self.latency is not None else None
+        if delay is None:
+            return await send()
+        return await hedged_request(send, delay)
+    
+    async def _send(self, method: str, url: str, hedge: bool = False, **kwargs) -> aiohttp.ClientResponse:
+        breaker = self.breakers.get(URL(url).host or '')
+        idempotent = method.upper() in ('GET', 'HEAD', 'OPTIONS')
+        retries = self.retry_policy.retries
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"主机 {breaker.host} 处于熔断状态")
+            probe = breaker.half_open
+            try:
+                response = await self._request_once(method, url, hedge and idempotent, **kwargs)
+                if response.status < 500:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt >= retries or not idempotent:
+                    return response
+                response.release()
+                error = RetryableError(f"状态码 {response.status}")
+            except Exception as e:
+                if not self.retry_policy.is_retryable(e, idempotent):
+                    # 不可重试的连接错误同样说明主机异常；试探请求出错时必须重新打开熔断
+                    if probe or self.retry_policy.is_host_failure(e):
+                        breaker.record_failure()
+                    raise
+                breaker.record_failure()
+                if attempt >= retries:
+                    raise
+                error = e
+            except BaseException:
+                # 试探请求被取消（网站期限、对冲或调用方关闭）时没有结果，按失败处理，避免熔断器停留在半开状态
+                if probe:
+                    breaker.record_failure()
+                raise
+            delay = self.retry_policy.delay(attempt)
+            logging.warning("%s 请求 %s 失败（%s），%.1f 秒后第%s次重试",
+                            self.name, url, str(error) or type(error).__name__, delay, attempt + 1)
+            await asyncio.sleep(delay)
+    
+    @staticmethod
+    def parse_html(text: str):
+        """解析 HTML（延迟导入 BeautifulSoup，未使用的插件不会加载它）"""
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(text, 'html.parser')
+    
+    def get_account(self) -> str:
+        """获取当前账号标识，用于区分同一网站的多个账号"""
+        return getattr(self, 'username', '') or ''
+    
+    async def is_session_valid(self) -> bool:
+        """检查恢复的会话是否仍处于登录状态，插件可覆盖为轻量探测"""
+        return False
+    
+    def _session_key(self) -> str:
+        return SessionStore.make_key(self.name, self.get_account())
+    
+    async def _restore_session(self) -> bool:
+        """从会话存储恢复 Cookie 并探测是否仍然有效"""
+        if self.session_store is None:
+            return False
+        cookies = self.session_store.load(self._session_key())
+        if not cookies:
+            return False
+        restore_cookies(self.session.cookie_jar, cookies)
+        with self.timings.span('session_probe'):
+            valid = await self.is_session_valid()
+        if valid:
+            logging.info("%s 已恢复上次的登录状态，跳过登录", self.name)
+            return True
+        logging.info("%s 保存的登录状态已失效，重新登录", self.name)
+        self.session.cookie_jar.clear()
+        return False
+    
+    def _save_session(self) -> None:
+        """登录成功后保存 Cookie"""
+        if self.session_store is None:
+            return
+        try:
+            self.session_store.save(self._session_key(), dump_cookies(self.session.cookie_jar))
+        except Exception as e:
+            logging.warning("%s 保存登录状态失败: %s", self.name, e)
+    
     @abstractmethod
     async def login(self) -> bool:
         """执行登录操作，返回登录是否成功"""
@@ -33,17 +202,34 @@ class BasePlugin(ABC):
         pass
     
     async def run(self) -> Dict[str, Any]:
-        """运行完整的签到流程"""
+        """运行完整的签到流程，结果中附带各阶段耗时"""
+        token = bind_site(self.site_config.name, self.site_config.account, self.timings)
+        try:
+            result = await self._run()
+        finally:
+            log_context.reset(token)
+        result['site'] = self.name
+        result['account'] = self.site_config.account
+        result['duration'] = round(self.timings.elapsed() * 1000, 2)
+        result['timings'] = self.timings.as_dict()
+        result['attempts'] = self.login_attempts
+        result['ocr_retries'] = self.ocr_retries
+        return result
+    
+    async def _run(self) -> Dict[str, Any]:
         try:
-            logging.info(f"开始 {self.name} 签到任务")
-            success = await self.login()
+            logging.info("开始 %s 签到任务", self.name)
+            success = await self._restore_session() or await self.login()
             if success:
-                result = await self.checkin()
-                result['site'] = self.name
-                return result
-            return {"success": False, "message": "登录失败", "site": self.name}
+                self._save_session()
+                return await self.checkin()
+            if self.session_store is not None:
+                self.session_store.delete(self._session_key())
+            return {"success": False, "message": "登录失败"}
         except Exception as e:
-            logging.error(f"{self.name} 签到过程中发生异常: {str(e)}")
-            return {"success": False, "message": f"发生异常: {str(e)}", "site": self.name}
+            logging.error("%s 签到过程中发生异常: %s", self.name, e)
+            return {"success": False, "message": f"发生异常: {str(e)}"}
         finally:
             await self.session.close()
+            if self.cassette is not None:
+                self.cassette.close()
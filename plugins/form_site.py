@@ -0,0 +1,224 @@
+import re
+import json
+import logging
+from typing import Dict, Any, List
+from html_extract import Selector, extract_from_response
+from retry import CircuitOpenError
+from plugins.base_plugin import BasePlugin
+
+class Markers:
+    """预编译的页面标记匹配器"""
+
+    def __init__(self, markers: List[str]):
+        self.pattern = re.compile('|'.join(re.escape(m) for m in markers)) if markers else None
+
+    def search(self, text: str) -> bool:
+        return bool(self.pattern and self.pattern.search(text))
+
+class SiteSpec:
+    """编译后的网站定义，同一网站的所有账号共享一份"""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.type = spec['type']
+        self.name = spec.get('name', self.type)
+        self.base_url = spec['base_url']
+        self.credentials = spec.get('credentials', {'username': 'username', 'password': 'password'})
+
+        probe = spec.get('session_probe')
+        self.probe_url = probe['url'] if probe else None
+        self.probe_markers = Markers(probe.get('success_markers', [])) if probe else None
+
+        login = spec['login']
+        self.login_url = login['url']
+        self.login_fields = login.get('fields', {})
+        self.login_extra_fields = login.get('extra_fields', {})
+        self.login_success = Markers(login.get('success_markers', []))
+        self.login_retry = Markers(login.get('retry_markers', []))
+
+        self.csrf_selectors = [Selector(s) for s in spec.get('csrf_selectors', [])]
+        self.captcha_selectors = [Selector(s) for s in spec.get('captcha_selectors', [])]
+        # 登录页与签到页只需要提取这几个元素
+        self.login_targets = {'csrf': self.csrf_selectors, 'captcha': self.captcha_selectors}
+        self.checkin_targets = {'captcha': self.captcha_selectors}
+
+        captcha = spec.get('captcha', {})
+        self.captcha_attempts = captcha.get('attempts', 3)
+        self.ocr_lang = captcha.get('lang', 'eng')
+        self.ocr_config = captcha.get('config', '')
+        self.captcha_min_length = captcha.get('min_length', 4)
+
+        checkin = spec['checkin']
+        self.checkin_url = checkin['url']
+        self.checkin_captcha_field = checkin.get('captcha_field')
+        self.checkin_success_field = checkin.get('success_field', 'ret')
+        self.checkin_success_value = checkin.get('success_value', 1)
+        self.checkin_message_field = checkin.get('message_field', 'msg')
+
+        # 允许对冲的 GET 请求：默认只包括已登录后的只读页面。登录页与验证码可能会
+        # 生成新的会话或验证码，只有确认不会改变服务端状态的网站才应加入
+        self.hedge = frozenset(spec.get('hedge', ['session_probe', 'checkin_page']))
+
+class FormSitePlugin(BasePlugin):
+    """通用的表单登录 + 签到插件，行为完全由 SiteSpec 决定"""
+    spec: SiteSpec
+
+    def __init__(self, global_config, site_config, **kwargs):
+        super().__init__(global_config, site_config, **kwargs)
+        config = site_config.config
+        self.username = config.get(self.spec.credentials['username'], '')
+        self.password = config.get(self.spec.credentials['password'], '')
+
+    def _url(self, path: str) -> str:
+        return path if path.startswith('http') else f"{self.base_url}{path}"
+
+    async def is_session_valid(self) -> bool:
+        """访问探测页面，检查保存的 Cookie 是否仍处于登录状态"""
+        if not self.spec.probe_url:
+            return False
+        try:
+            async with self.request('GET', self._url(self.spec.probe_url), allow_redirects=False,
+                                    hedge='session_probe' in self.spec.hedge) as response:
+                if response.status != 200:
+                    return False
+                text = await response.text()
+            with self.timings.span('parse'):
+                return self.spec.probe_markers.search(text)
+        except Exception as e:
+            logging.warning("%s 会话有效性检查失败: %s", self.name, e)
+            return False
+
+    async def login(self) -> bool:
+        """带验证码的登录实现（含重试机制）"""
+        spec = self.spec
+        fields = spec.login_fields
+        login_url = self._url(spec.login_url)
+        for attempt in range(spec.captcha_attempts):
+            self.login_attempts += 1
+            try:
+                # 获取登录页面
+                with self.timings.span('login_page'):
+                    async with self.request('GET', login_url, hedge='login_page' in spec.hedge) as response:
+                        if response.status != 200:
+                            raise Exception(f"获取登录页面失败，状态码: {response.status}")
+                        found = await extract_from_response(response, spec.login_targets, timings=self.timings)
+                csrf_token = found['csrf'] or ""
+                captcha_url = self._url(found['captcha']) if found['captcha'] else ""
+                if not captcha_url:
+                    logging.info("未检测到验证码，尝试无验证码登录")
+                    captcha_text = ""
+                else:
+                    captcha_text = await self._recognize_captcha(captcha_url)
+                    if not captcha_text:
+                        self.ocr_retries += 1
+                        logging.warning("第%s次验证码识别失败，重试中...", attempt+1)
+                        continue
+
+                # 准备登录数据
+                login_data = {
+                    fields.get('username', 'username'): self.username,
+                    fields.get('password', 'password'): self.password,
+                    **spec.login_extra_fields
+                }
+                if captcha_text and fields.get('captcha'):
+                    login_data[fields['captcha']] = captcha_text
+                if csrf_token and fields.get('csrf'):
+                    login_data[fields['csrf']] = csrf_token
+
+                logging.info("%s 提交登录表单，字段: %s", self.name, list(login_data.keys()))
+
+                # 提交登录请求
+                with self.timings.span('login_submit'):
+                    async with self.request('POST', login_url, data=login_data) as response:
+                        if response.status != 200:
+                            raise Exception(f"登录请求失败，状态码: {response.status}")
+                        response_text = await response.text()
+
+                if spec.login_success.search(response_text):
+                    logging.info("%s 登录成功（尝试%s次）", self.name, attempt+1)
+                    return True
+                elif spec.login_retry.search(response_text):
+                    self.ocr_retries += 1
+                    logging.warning("第%s次验证码错误，重试中...", attempt+1)
+                else:
+                    logging.error("登录失败: %s", response_text[:200])
+                    return False
+
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                logging.error("登录尝试%s异常: %s", attempt+1, e)
+
+        logging.error("%s 登录失败（%s次验证码尝试均失败）", self.name, spec.captcha_attempts)
+        return False
+
+    async def _recognize_captcha(self, captcha_url: str) -> str:
+        """下载并识别验证码"""
+        try:
+            with self.timings.span('captcha_download'):
+                async with self.request('GET', captcha_url, hedge='captcha' in self.spec.hedge) as response:
+                    if response.status != 200:
+                        raise Exception(f"获取验证码图片失败，状态码: {response.status}")
+                    captcha_bytes = await response.read()
+
+            # 预处理与识别在共享的 OCR 进程池中执行，不阻塞事件循环
+            with self.timings.span('ocr'):
+                text = await self.ocr_service.recognize(captcha_bytes, lang=self.spec.ocr_lang, config=self.spec.ocr_config)
+            text = text.strip().upper()  # 标准化处理
+
+            logging.info("识别的验证码: %s", text)
+            return text if len(text) >= self.spec.captcha_min_length else ""
+
+        except Exception as e:
+            logging.error("验证码识别异常: %s", e)
+            return ""
+
+    async def checkin(self) -> Dict[str, Any]:
+        """执行签到（含验证码处理）"""
+        spec = self.spec
+        try:
+            checkin_url = self._url(spec.checkin_url)
+            with self.timings.span('checkin_page'):
+                async with self.request('GET', checkin_url, hedge='checkin_page' in self.spec.hedge) as response:
+                    if response.status != 200:
+                        raise Exception(f"获取签到页面失败，状态码: {response.status}")
+                    found = await extract_from_response(response, spec.checkin_targets, timings=self.timings)
+
+            # 检查是否需要验证码
+            captcha_url = self._url(found['captcha']) if found['captcha'] else ""
+            captcha_text = await self._recognize_captcha(captcha_url) if captcha_url else ""
+
+            checkin_data = {}
+            if captcha_text and spec.checkin_captcha_field:
+                checkin_data[spec.checkin_captcha_field] = captcha_text
+
+            with self.timings.span('checkin_submit'):
+                async with self.request('POST', checkin_url, data=checkin_data) as response:
+                    if response.status != 200:
+                        raise Exception(f"签到请求失败，状态码: {response.status}")
+                    result = await response.json(content_type=None)
+
+            message = result.get(spec.checkin_message_field)
+            if result.get(spec.checkin_success_field) == spec.checkin_success_value:
+                logging.info("%s 签到成功: %s", self.name, message)
+                return {"success": True, "message": message}
+            logging.error("%s 签到失败: %s", self.name, message)
+            return {"success": False, "message": message}
+
+        except Exception as e:
+            logging.error("%s 签到异常: %s", self.name, e)
+            return {"success": False, "message": f"签到异常: {str(e)}"}
+
+_spec_classes: Dict[str, type] = {}
+
+def load_site_plugin(spec_path: str) -> type:
+    """读取并编译网站定义，返回绑定该定义的插件类（每个定义只编译一次）"""
+    plugin_class = _spec_classes.get(spec_path)
+    if plugin_class is None:
+        with open(spec_path, 'r', encoding='utf-8') as f:
+            spec = SiteSpec(json.load(f))
+        class_name = f"{spec.type.capitalize()}Plugin"
+        plugin_class = type(class_name, (FormSitePlugin,), {
+            '__module__': __name__, 'spec': spec, 'base_url': spec.base_url
+        })
+        _spec_classes[spec_path] = plugin_class
+    return plugin_class
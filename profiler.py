@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from log_setup import log_context
+from metrics import LogHistogram
+
+# 判断“本项目代码”的根目录，阻塞位置优先归到项目内最深的一帧
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+def _is_project_file(filename: str) -> bool:
+    return filename.startswith(PROJECT_ROOT) and 'site-packages' not in filename
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+def _callback_name(handle: asyncio.Handle) -> str:
+    """回调的可读名称：任务的一步显示为其协程名"""
+    callback = handle._callback
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, asyncio.Future) and hasattr(owner, 'get_coro'):
+        coro = owner.get_coro()
+        return f"Task {getattr(coro, '__qualname__', repr(coro))}"
+    return getattr(callback, '__qualname__', repr(callback))
+
+class LoopProfiler:
+    """剖析模式：找出阻塞事件循环的代码
+
+    - 慢回调：事件循环中单次执行超过阈值的回调（等同于 asyncio 调试模式的慢回调检测），
+      按当时所在的网站与阶段归类
+    - 循环延迟：心跳协程按固定间隔更新时间戳，后台线程发现心跳停滞时采样事件循环线程的调用栈，
+      得到阻塞的具体调用位置；开启 sample_all 时持续采样，得到完整的采样剖析
+    - 输出 flamegraph.pl / speedscope 可读的折叠调用栈，以及按网站/插件排序的阻塞报告
+    """
+
+    def __init__(self, output_dir: str = 'profile', slow_threshold: float = 0.05,
+                 interval: float = 0.005, sample_all: bool = False):
+        self.output_dir = output_dir
+        self.slow_threshold = slow_threshold
+        self.interval = interval
+        self.sample_all = sample_all
+        # 网站名称 -> 插件类型，加载配置后由调用方填入
+        self.site_types: Dict[str, str] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.current_context = None
+        self.last_beat = 0.0
+        # 循环延迟只保留直方图与超过阈值的次数，长时间剖析时内存不随采样次数增长
+        self.lags = LogHistogram()
+        self.slow_lags = 0
+        self.stacks: Dict[str, int] = defaultdict(int)
+        # (网站, 阶段, 回调) -> [次数, 总耗时, 最长耗时]
+        self.slow_callbacks: Dict[Tuple[str, str, str], List[float]] = {}
+        # (网站, 阶段, 调用位置) -> 采样得到的阻塞时间
+        self.blocking: Dict[Tuple[str, str, str], float] = defaultdict(float)
+        self._original_run = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _attribution(self, context) -> Tuple[str, str]:
+        """从回调所在的 contextvars.Context 取出网站与当前阶段"""
+        bound = context.get(log_context) if context is not None else None
+        if bound is None:
+            return '(主流程)', '-'
+        name, _, timings = bound
+        phase = timings.current_phase if timings is not None else None
+        return name, phase or '-'
+
+    def start(self) -> 'LoopProfiler':
+        """在事件循环中调用：替换 Handle._run 以测量每个回调，并启动心跳与采样线程"""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        profiler = self
+        original_run = self._original_run = asyncio.Handle._run
+
+        def _run(handle):
+            context = handle._context
+            profiler.current_context = context
+            start = time.perf_counter()
+            try:
+                return original_run(handle)
+            finally:
+                profiler.current_context = None
+                elapsed = time.perf_counter() - start
+                if elapsed >= profiler.slow_threshold:
+                    profiler._record_slow(handle, context, elapsed)
+
+        asyncio.Handle._run = _run
+        self.last_beat = time.perf_counter()
+        self._heartbeat = asyncio.ensure_future(self._beat())
+        self._thread = threading.Thread(target=self._watch, name='loop-profiler', daemon=True)
+        self._thread.start()
+        logging.info("已开启剖析模式：慢回调阈值 %.0f ms，采样间隔 %.0f ms%s",
+                     self.slow_threshold * 1000, self.interval * 1000, '，持续采样' if self.sample_all else '')
+        return self
+
+    def _record_slow(self, handle: asyncio.Handle, context, elapsed: float) -> None:
+        site, phase = self._attribution(context)
+        key = (site, phase, _callback_name(handle))
+        entry = self.slow_callbacks.setdefault(key, [0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+
+    async def _beat(self) -> None:
+        while True:
+            self.last_beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        """后台线程：记录循环延迟，心跳停滞（或持续采样）时采集事件循环线程的调用栈"""
+        while not self._stop.wait(self.interval):
+            lag = max(0.0, time.perf_counter() - self.last_beat - self.interval)
+            self.lags.add(lag)
+            blocked = lag >= self.slow_threshold
+            self.slow_lags += blocked
+            if not (blocked or self.sample_all):
+                continue
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            stack = []
+            call_site = None
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                if call_site is None and _is_project_file(frame.f_code.co_filename):
+                    call_site = stack[-1]
+                frame = frame.f_back
+            site, phase = self._attribution(self.current_context)
+            self.stacks[';'.join(reversed(stack))] += 1
+            if blocked:
+                self.blocking[(site, phase, call_site or stack[0])] += self.interval
+
+    def stop(self) -> None:
+        """停止采样，恢复 Handle._run 并写出报告"""
+        if self._original_run is None:
+            return
+        asyncio.Handle._run = self._original_run
+        self._original_run = None
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.write()
+        except OSError as e:
+            logging.error("写出剖析结果失败: %s", e)
+
+    def _plugin(self, site: str) -> str:
+        plugin = self.site_types.get(site)
+        return f"{site} [{plugin}]" if plugin else site
+
+    def report(self, top: int = 20) -> str:
+        """按阻塞时间排序的文本报告"""
+        lines = []
+        if self.lags.count:
+            def pct(p: float) -> float:
+                return self.lags.percentile(p) * 1000
+            lines += [
+                "## 事件循环延迟",
+                f"采样 {self.lags.count} 次：p50 {pct(50):.1f} ms，p95 {pct(95):.1f} ms，p99 {pct(99):.1f} ms，"
+                f"最大 {self.lags.max * 1000:.1f} ms，超过 {self.slow_threshold * 1000:.0f} ms 的采样 "
+                f"{self.slow_lags} 次",
+                "",
+            ]
+
+        lines.append(f"## 阻塞调用位置（心跳停滞时采样，按网站/插件与阶段归类，前 {top} 项）")
+        per_site: Dict[str, float] = defaultdict(float)
+        for (site, _, _), seconds in self.blocking.items():
+            per_site[site] += seconds
+        for (site, phase, call_site), seconds in sorted(self.blocking.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"{seconds * 1000:9.0f} ms  {self._plugin(site)}  阶段={phase}  {call_site}")
+        if not self.blocking:
+            lines.append("（无）")
+        lines.append("")
+
+        lines.append("## 各网站/插件的阻塞总时间")
+        for site, seconds in sorted(per_site.items(), key=lambda item: -item[1])[:top]:
+            lines.append(f"{seconds * 1000:9.0f} ms  {self._plugin(site)}")
+        if not per_site:
+            lines.append("（无）")
+        lines.append("")
+
+        lines.append(f"## 慢回调（单次超过 {self.slow_threshold * 1000:.0f} ms，前 {top} 项）")
+        ranked = sorted(self.slow_callbacks.items(), key=lambda item: -item[1][1])[:top]
+        for (site, phase, callback), (count, total, longest) in ranked:
+            lines.append(f"{total * 1000:9.0f} ms  {int(count)} 次，最长 {longest * 1000:.0f} ms  "
+                         f"{self._plugin(site)}  阶段={phase}  {callback}")
+        if not ranked:
+            lines.append("（无）")
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stacks_path = os.path.join(self.output_dir, 'stacks.folded')
+        with open(stacks_path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        report_path = os.path.join(self.output_dir, 'report.txt')
+        report = self.report()
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(report)
+        logging.info("剖析结果已写入 %s（折叠调用栈，可用 flamegraph.pl 或 speedscope 查看）与 %s\n%s",
+                     stacks_path, report_path, report)
@@ -0,0 +1,35 @@
+import os
+import json
+import time
+import logging
+from typing import Dict, Any, Optional
+
+class JsonlResultSink:
+    """将签到结果逐行追加到 JSON Lines 文件，每个结果完成后立即落盘"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def write(self, result: Dict[str, Any]) -> None:
+        record = {'time': round(time.time(), 3), **result}
+        self.file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+def create_result_sink(global_config: Dict[str, Any]) -> Optional[JsonlResultSink]:
+    """根据 global.results 配置创建结果文件，未启用时返回 None"""
+    results_config = global_config.get('results', {})
+    path = results_config.get('jsonl_path', 'results/checkin.jsonl')
+    if not results_config.get('enabled', True) or not path:
+        return None
+    try:
+        return JsonlResultSink(path)
+    except OSError as e:
+        logging.error("打开结果文件失败，本次不写出结果: %s", e)
+        return None
@@ -0,0 +1,107 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Dict, Any
+
+import aiohttp
+
+class RetryableError(Exception):
+    """可重试的失败（如 5xx 响应）"""
+    pass
+
+class CircuitOpenError(Exception):
+    """主机熔断中，直接失败而不再发起请求"""
+    pass
+
+class RetryPolicy:
+    """指数退避 + 随机抖动的重试策略，次数来自 global.retry_times"""
+
+    def __init__(self, retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.retries = max(0, retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, global_config: Dict[str, Any]) -> 'RetryPolicy':
+        retry_config = global_config.get('retry', {})
+        return cls(
+            retries=global_config.get('retry_times', 3),
+            base_delay=retry_config.get('base_delay', 1.0),
+            max_delay=retry_config.get('max_delay', 30.0)
+        )
+
+    def delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的等待时间（full jitter）"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+        """判断异常是否值得重试；非幂等请求只在连接尚未建立时重试"""
+        if isinstance(error, aiohttp.ClientConnectorError):
+            return True
+        if not idempotent:
+            return False
+        return isinstance(error, (RetryableError, aiohttp.ClientConnectionError,
+                                  aiohttp.ServerTimeoutError, asyncio.TimeoutError))
+
+    @staticmethod
+    def is_host_failure(error: BaseException) -> bool:
+        """判断异常是否说明主机不可用（计入熔断），与请求能否重试无关"""
+        return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+class CircuitBreaker:
+    """单个主机的熔断器：连续失败达到阈值后打开，冷却后放行一次试探请求
+
+    试探请求若既未成功也未失败（如被取消后没有上报），超过 reset_timeout 后视为丢失并放行新的试探
+    """
+
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.half_open = False
+        self.probe_at = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        since = self.probe_at if self.half_open else self.opened_at
+        if now - since >= self.reset_timeout:
+            self.half_open = True  # 只放行一个试探请求
+            self.probe_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logging.info("主机 %s 已恢复，关闭熔断", self.host)
+        self.failures = 0
+        self.opened_at = None
+        self.half_open = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.half_open or (self.opened_at is None and self.failures >= self.failure_threshold):
+            logging.warning("主机 %s 连续失败 %s 次，熔断 %s 秒", self.host, self.failures, self.reset_timeout)
+            self.opened_at = time.monotonic()
+            self.half_open = False
+
+class CircuitBreakerRegistry:
+    """按主机共享的熔断器集合，由 CheckinManager 持有"""
+
+    def __init__(self, global_config: Dict[str, Any]):
+        retry_config = global_config.get('retry', {})
+        self.failure_threshold = retry_config.get('breaker_threshold', 5)
+        self.reset_timeout = retry_config.get('breaker_reset', 60.0)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, host: str) -> CircuitBreaker:
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+            self.breakers[host] = breaker
+        return breaker
@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+from email.utils import formatdate
+from http.cookies import Morsel
+from typing import Dict, List, Any, Optional
+
+from yarl import URL
+
+class SessionStore(ABC):
+    """会话存储基类，按网站名称和账号保存登录后的 Cookie"""
+
+    @staticmethod
+    def make_key(site_name: str, account: str) -> str:
+        """生成存储键（不在文件名中暴露账号）"""
+        return hashlib.sha256(f"{site_name}\0{account}".encode('utf-8')).hexdigest()
+
+    @abstractmethod
+    def load(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """读取已保存的 Cookie，不存在或无法解密时返回 None"""
+        pass
+
+    @abstractmethod
+    def save(self, key: str, cookies: List[Dict[str, Any]]) -> None:
+        """保存 Cookie"""
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """删除已保存的 Cookie"""
+        pass
+
+class EncryptedFileSessionStore(SessionStore):
+    """使用 Fernet 加密、每个账号一个文件的本地会话存储"""
+
+    def __init__(self, directory: str, secret: str):
+        from cryptography.fernet import Fernet
+        self.directory = directory
+        key = base64.urlsafe_b64encode(hashlib.sha256(secret.encode('utf-8')).digest())
+        self.fernet = Fernet(key)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.session")
+
+    def load(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        from cryptography.fernet import InvalidToken
+        try:
+            with open(self._path(key), 'rb') as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except FileNotFoundError:
+            return None
+        except (InvalidToken, ValueError) as e:
+            logging.warning("会话文件无法解密，已忽略: %s", str(e) or type(e).__name__)
+            return None
+
+    def save(self, key: str, cookies: List[Dict[str, Any]]) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(self.fernet.encrypt(json.dumps(cookies).encode('utf-8')))
+        os.replace(tmp_path, path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+SESSION_STORE_BACKENDS = {
+    'file': EncryptedFileSessionStore,
+}
+
+def create_session_store(global_config: Dict[str, Any]) -> Optional[SessionStore]:
+    """根据 global.session_store 配置创建会话存储，未启用时返回 None"""
+    store_config = global_config.get('session_store', {})
+    if not store_config.get('enabled', False):
+        return None
+
+    secret = store_config.get('secret') or os.getenv(store_config.get('secret_env', 'SESSION_STORE_SECRET'))
+    if not secret:
+        logging.warning("会话存储已启用但未配置密钥，将不保存登录状态")
+        return None
+
+    backend = store_config.get('backend', 'file')
+    store_class = SESSION_STORE_BACKENDS.get(backend)
+    if store_class is None:
+        logging.error("未知的会话存储类型: %s", backend)
+        return None
+
+    try:
+        return store_class(store_config.get('path', '.sessions'), secret)
+    except ImportError:
+        logging.error("会话存储需要安装 cryptography 库")
+        return None
+
+def _expires_of(morsel: Morsel) -> str:
+    """Cookie 的过期时间；只有 Max-Age 时换算为绝对时间，恢复后仍按时过期"""
+    if morsel['expires'] or not morsel['max-age']:
+        return morsel['expires']
+    try:
+        return formatdate(time.time() + int(morsel['max-age']), usegmt=True)
+    except ValueError:
+        return ''
+
+def dump_cookies(cookie_jar) -> List[Dict[str, Any]]:
+    """将 Cookie 容器导出为可序列化的列表"""
+    return [
+        {
+            'name': morsel.key,
+            'value': morsel.value,
+            'domain': morsel['domain'],
+            'path': morsel['path'] or '/',
+            'expires': _expires_of(morsel),
+        }
+        for morsel in cookie_jar
+    ]
+
+def restore_cookies(cookie_jar, cookies: List[Dict[str, Any]]) -> None:
+    """将导出的 Cookie 写回 Cookie 容器"""
+    for cookie in cookies:
+        domain = cookie.get('domain', '').lstrip('.')
+        if not domain:
+            continue
+        morsel = Morsel()
+        morsel.set(cookie['name'], cookie['value'], cookie['value'])
+        # 显式写入 domain，否则会被当作仅限该主机的 Cookie，子域名（如 www.）请求不再携带
+        morsel['domain'] = domain
+        morsel['path'] = cookie.get('path') or '/'
+        if cookie.get('expires'):
+            morsel['expires'] = cookie['expires']
+        cookie_jar.update_cookies({cookie['name']: morsel}, URL(f"https://{domain}/"))
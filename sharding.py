@@ -0,0 +1,65 @@
+import os
+import json
+import glob
+import hashlib
+import logging
+from typing import Dict, Any, List, Tuple
+
+from config_model import CheckinConfig, SiteRecord
+
+def parse_shard_spec(spec: str) -> Tuple[int, int]:
+    """解析分片参数，如 "0/4" 表示 4 个分片中的第 0 个"""
+    try:
+        index, total = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"分片参数格式应为 i/N: {spec}")
+    if total < 1 or not 0 <= index < total:
+        raise ValueError(f"分片编号超出范围: {spec}")
+    return index, total
+
+def shard_of(site_config: SiteRecord, total: int) -> int:
+    """按网站名称 + 账号的稳定哈希分配分片（与配置顺序、进程无关）"""
+    name, account = site_config.identity
+    digest = hashlib.sha1(f"{name}\0{account}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % total
+
+def select_shard(config: CheckinConfig, index: int, total: int) -> CheckinConfig:
+    """返回只包含指定分片网站的配置"""
+    return config.replace(sites=tuple(site for site in config.sites if shard_of(site, total) == index))
+
+def shard_result_path(results_dir: str, index: int, total: int) -> str:
+    return os.path.join(results_dir, f"shard-{index}-of-{total}.json")
+
+def write_shard_results(path: str, results: List[Dict[str, Any]], index: int, total: int) -> None:
+    """写出单个分片的结果文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'shard': index, 'total': total, 'results': results}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_shard_results(paths: List[str]) -> List[Dict[str, Any]]:
+    """读取并合并多个分片结果文件（参数可以是文件或目录）"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, 'shard-*.json'))))
+        else:
+            files.append(path)
+
+    shards = {}
+    results = []
+    for file in files:
+        with open(file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        shards.setdefault(data.get('total'), set()).add(data.get('shard'))
+        results.extend(data.get('results', []))
+
+    for total, seen in shards.items():
+        if total and len(seen) != total:
+            missing = sorted(set(range(total)) - seen)
+            logging.warning("分片结果不完整，缺少分片: %s（共 %s 个）", missing, total)
+    logging.info("已合并 %s 个分片结果，共 %s 个网站", len(files), len(results))
+    return results
@@ -0,0 +1,114 @@
+import os
+import time
+import sqlite3
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional
+
+class StateStore:
+    """记录每个网站/账号最近一次运行状态的 SQLite 数据库，用于增量、可恢复的运行"""
+
+    def __init__(self, path: str, utc_offset: float = 0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.timezone = timezone(timedelta(hours=utc_offset))
+        # 多个分片进程可能同时写入同一个库，等待锁而不是立即失败
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS site_state (
+                site TEXT NOT NULL,
+                account TEXT NOT NULL,
+                last_attempt REAL,
+                last_success REAL,
+                success_period TEXT,
+                outcome TEXT,
+                message TEXT,
+                duration REAL,
+                PRIMARY KEY (site, account)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS host_latency (
+                host TEXT PRIMARY KEY,
+                samples BLOB NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def current_period(self, timestamp: Optional[float] = None) -> str:
+        """当前签到周期（按配置时区的自然日）"""
+        moment = datetime.fromtimestamp(timestamp if timestamp is not None else time.time(), self.timezone)
+        return moment.strftime('%Y-%m-%d')
+
+    def get(self, site: str, account: str) -> Optional[Dict[str, Any]]:
+        """读取某个网站/账号的状态"""
+        cursor = self.conn.execute(
+            "SELECT last_attempt, last_success, success_period, outcome, message, duration "
+            "FROM site_state WHERE site = ? AND account = ?", (site, account)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        keys = ('last_attempt', 'last_success', 'success_period', 'outcome', 'message', 'duration')
+        return dict(zip(keys, row))
+
+    def is_done(self, site: str, account: str) -> bool:
+        """本周期内是否已经签到成功"""
+        state = self.get(site, account)
+        return bool(state and state['success_period'] == self.current_period())
+
+    def mark_started(self, site: str, account: str) -> None:
+        """记录开始执行，进程中断后该记录保持 running 状态，下次运行会重新执行"""
+        self.conn.execute(
+            "INSERT INTO site_state (site, account, last_attempt, outcome) VALUES (?, ?, ?, 'running') "
+            "ON CONFLICT(site, account) DO UPDATE SET last_attempt = excluded.last_attempt, outcome = 'running'",
+            (site, account, time.time())
+        )
+        self.conn.commit()
+
+    def record_result(self, site: str, account: str, result: Dict[str, Any], duration: float) -> None:
+        """记录执行结果"""
+        now = time.time()
+        success = bool(result.get('success'))
+        self.conn.execute(
+            "INSERT INTO site_state (site, account, last_attempt, last_success, success_period, outcome, message, duration) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(site, account) DO UPDATE SET "
+            "last_success = COALESCE(excluded.last_success, last_success), "
+            "success_period = COALESCE(excluded.success_period, success_period), "
+            "outcome = excluded.outcome, message = excluded.message, duration = excluded.duration",
+            (site, account, now - duration, now if success else None,
+             self.current_period(now) if success else None,
+             'success' if success else 'failed', str(result.get('message', '')), duration)
+        )
+        self.conn.commit()
+
+    def load_latency(self) -> Dict[str, bytes]:
+        """读取各主机最近的请求延迟样本（float64 数组的字节）"""
+        return dict(self.conn.execute("SELECT host, samples FROM host_latency"))
+
+    def save_latency(self, samples: Dict[str, bytes]) -> None:
+        self.conn.executemany(
+            "INSERT INTO host_latency (host, samples) VALUES (?, ?) "
+            "ON CONFLICT(host) DO UPDATE SET samples = excluded.samples",
+            samples.items()
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+def create_state_store(global_config: Dict[str, Any]) -> Optional[StateStore]:
+    """根据 global.state 配置创建运行状态库，未启用时返回 None"""
+    state_config = global_config.get('state', {})
+    if not state_config.get('enabled', True):
+        return None
+    try:
+        return StateStore(state_config.get('path', '.state/checkin_state.db'), state_config.get('utc_offset', 8))
+    except sqlite3.Error as e:
+        logging.error("打开运行状态库失败，本次将执行全部网站: %s", e)
+        return None
@@ -0,0 +1,95 @@
+import time
+import asyncio
+
+from config_model import CheckinConfig, SiteRecord, freeze
+from checkin_manager import CheckinManager
+from cassette import CassetteLibrary, CassetteRecorder, KIND_HTTP, cassette_path
+from plugins.base_plugin import BasePlugin
+from main import cassette_config
+
+URL = 'http://replay.test/checkin'
+
+class _Plugin(BasePlugin):
+    async def login(self) -> bool:
+        return True
+
+    async def checkin(self):
+        async with self.request('GET', URL) as response:
+            return {"success": response.status == 200, "message": f"状态码 {response.status}"}
+
+class _Registry:
+    import_times = {}
+
+    def load(self, site_type):
+        return _Plugin
+
+    def get_base_url(self, site_type):
+        return 'http://replay.test'
+
+def _record(directory: str, name: str) -> None:
+    """录制一次先连续三次 503、第四次成功的签到"""
+    recorder = CassetteRecorder(cassette_path(directory, name, ''))
+    for status in (503, 503, 503, 200):
+        recorder._add(KIND_HTTP, {'m': 'GET', 'u': URL, 's': status, 'r': '', 'h': [], 'f': URL}, b'ok')
+    recorder.close()
+
+def test_replay_with_5xx_is_deterministic(tmp_path):
+    names = [f"站点{i}" for i in range(4)]
+    for name in names:
+        _record(str(tmp_path), name)
+    sites = tuple(SiteRecord(name=name, type='replay', account='', base_url=None, priority=0,
+                             schedule=None, jitter=0, deadline=None, config=freeze({})) for name in names)
+    global_config = {'retry_times': 3, 'retry': {'base_delay': 1.0, 'breaker_threshold': 4},
+                     'pool': {'warm_up': False, 'dns_cache_path': None}}
+    config = cassette_config(CheckinConfig(global_config=freeze(global_config), notification=freeze({}),
+                                           sites=sites), replay=True, repeat=30)
+
+    async def replay():
+        manager = CheckinManager(config, force=True, registry=_Registry(),
+                                 cassettes=CassetteLibrary('replay', str(tmp_path)))
+        try:
+            return await manager.run_all_checkins()
+        finally:
+            await manager.close()
+
+    for _ in range(3):
+        start = time.perf_counter()
+        results = asyncio.run(replay())
+        assert len(results) == len(names) * 30
+        assert all(result['success'] for result in results), [r['message'] for r in results if not r['success']]
+        # 回放时重试不等待退避时间
+        assert time.perf_counter() - start < 5
+
+class _Response:
+    status = 200
+    reason = 'OK'
+    url = URL
+    headers = {'Content-Type': 'text/html', 'Set-Cookie': 'bbs_token=secret; Path=/', 'Authorization': 'Bearer t'}
+
+    async def read(self):
+        return b'<html></html>'
+
+    def release(self):
+        pass
+
+def test_recording_redacts_cookies_and_credentials(tmp_path):
+    path = cassette_path(str(tmp_path), '站点', '')
+    recorder = CassetteRecorder(path)
+
+    async def send():
+        return _Response()
+
+    response = asyncio.run(recorder.request('GET', URL, send))
+    # 录制时插件仍然拿到真实的响应头
+    assert response.headers['Set-Cookie'] == 'bbs_token=secret; Path=/'
+    recorder.close()
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert b'secret' not in data and b'Bearer' not in data
+
+    library = CassetteLibrary('replay', str(tmp_path))
+    replayed = asyncio.run(library.for_site('站点', '').request('GET', URL))
+    assert replayed.headers['Set-Cookie'] == 'bbs_token=<redacted>'
+    assert replayed.headers['Authorization'] == '<redacted>'
+    assert replayed.headers['Content-Type'] == 'text/html'
+    library.close()
@@ -0,0 +1,81 @@
+import json
+import pickle
+
+import pytest
+
+from config_model import ConfigError, compile_config, read_config, thaw
+
+def _site(**overrides):
+    site = {'type': 'lixianla', 'config': {'username': 'alice@example.com', 'password': 'secret'}}
+    site.update(overrides)
+    return site
+
+def _errors(data) -> str:
+    with pytest.raises(ConfigError) as info:
+        compile_config(data)
+    return '\n'.join(info.value.errors)
+
+def test_valid_config_compiles_to_read_only_records():
+    config = compile_config({'global': {'timeout': 10, 'concurrency': {'max': 5, 'per_type': {'lixianla': 2}}},
+                             'sites': [_site(name='A', priority=3)]})
+    site, = config.sites
+    assert site.identity == ('A', 'alice@example.com')
+    assert site.priority == 3
+    with pytest.raises(AttributeError):
+        site.priority = 1
+    with pytest.raises(TypeError):
+        config.global_config['timeout'] = 1
+    # 传给分片子进程时可以序列化
+    assert pickle.loads(pickle.dumps(config)) == config
+    assert thaw(config.global_config)['concurrency']['per_type'] == {'lixianla': 2}
+
+@pytest.mark.parametrize('concurrency, message', [
+    ({'per_type': {'lixianla': '2'}}, 'global.concurrency.per_type.lixianla'),
+    ({'per_type': {'lixianla': -1}}, 'global.concurrency.per_type.lixianla'),
+    ({'per_type': {'lixianla': 1.5}}, 'global.concurrency.per_type.lixianla'),
+    ({'per_type': {'lixianla': True}}, 'global.concurrency.per_type.lixianla'),
+    ({'per_type': -1}, 'global.concurrency.per_type'),
+    ({'per_type': '2'}, 'global.concurrency.per_type'),
+    ({'max': -3}, 'global.concurrency.max'),
+    ({'per_host': -1}, 'global.concurrency.per_host'),
+])
+def test_invalid_concurrency_limits_are_rejected(concurrency, message):
+    assert message in _errors({'global': {'concurrency': concurrency}, 'sites': [_site()]})
+
+@pytest.mark.parametrize('per_type', [0, 4, {}, {'lixianla': 0, 'pinzhi': 3}])
+def test_valid_concurrency_limits_are_accepted(per_type):
+    compile_config({'global': {'concurrency': {'per_type': per_type}}, 'sites': [_site()]})
+
+@pytest.mark.parametrize('data, message', [
+    ({'global': {'timeout': 'soon'}}, 'global.timeout 类型错误'),
+    ({'global': {'retry_times': True}}, 'global.retry_times 类型错误'),
+    ({'global': {'deadline': {'run': 0}}}, 'global.deadline.run 应为正数'),
+    ({'global': {'logging': {'format': 'xml'}}}, 'global.logging.format'),
+    ({'global': {'log_level': 'LOUD'}}, '未知的日志级别'),
+    ({'global': {'daemon': {'schedule': '61 * * * *'}}}, 'global.daemon.schedule 无效'),
+    ({'sites': [_site(type='nope')]}, 'sites[0].type 未知的网站类型'),
+    ({'sites': [_site(config={'username': 'a'})]}, 'sites[0].config.password'),
+    ({'sites': [_site(priority='high')]}, 'sites[0].priority 应为整数'),
+    ({'sites': [_site(jitter=-1)]}, 'sites[0].jitter 应为非负数'),
+    ({'sites': [_site(deadline=0)]}, 'sites[0].deadline 应为正数'),
+    ({'sites': [_site(schedule='* * *')]}, 'sites[0].schedule 无效'),
+    ({'sites': [_site(config={'username': 'a', 'password': 'b', 'base_url': 'ftp://x'})]}, 'base_url'),
+    ({'sites': [_site(), _site()]}, 'sites[1] 与 sites[0] 的网站名称和账号重复'),
+    ({'sites': {}}, 'sites 应为数组'),
+])
+def test_invalid_config_is_rejected(data, message):
+    assert message in _errors(data)
+
+def test_all_problems_are_reported_together():
+    errors = _errors({'global': {'timeout': 'x', 'concurrency': {'per_type': {'lixianla': -1}}},
+                      'sites': [_site(priority='high'), _site(type='nope')]})
+    assert errors.count('\n') == 3
+
+def test_config_directory_merges_files_in_order(tmp_path):
+    (tmp_path / '00-global.json').write_text(json.dumps({'global': {'timeout': 10, 'retry': {'base_delay': 1}}}))
+    (tmp_path / '10-a.json').write_text('// 注释行\n' + json.dumps({'global': {'retry': {'max_delay': 5}},
+                                                                 'sites': [_site(name='A')]}))
+    (tmp_path / '20-b.json').write_text(json.dumps({'sites': [_site(name='B')]}))
+    data = read_config(str(tmp_path))
+    assert data['global'] == {'timeout': 10, 'retry': {'base_delay': 1, 'max_delay': 5}}
+    assert [site.name for site in compile_config(data).sites] == ['A', 'B']
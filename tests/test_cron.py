@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import daemon
+from config_model import CheckinConfig, SiteRecord, freeze
+from cron import CronSchedule
+from daemon import CheckinDaemon
+
+CST = timezone(timedelta(hours=8))
+
+@pytest.mark.parametrize('expression, field, expected', [
+    ('*/15 * * * *', 'minutes', {0, 15, 30, 45}),
+    ('10-50/20 * * * *', 'minutes', {10, 30, 50}),
+    ('5/20 * * * *', 'minutes', {5, 25, 45}),
+    ('1,3,5-7 * * * *', 'minutes', {1, 3, 5, 6, 7}),
+    ('0 */6 * * *', 'hours', {0, 6, 12, 18}),
+    ('0 0 1,15 * *', 'days', {1, 15}),
+    ('0 0 * 1-12/3 *', 'months', {1, 4, 7, 10}),
+    ('0 0 * * 1-5', 'weekdays', {1, 2, 3, 4, 5}),
+    ('0 0 * * 5-7', 'weekdays', {5, 6, 0}),
+    ('0 0 * * 0,7', 'weekdays', {0}),
+])
+def test_fields_expand_to_values(expression, field, expected):
+    assert getattr(CronSchedule(expression), field) == expected
+
+@pytest.mark.parametrize('expression', [
+    '60 * * * *', '* 24 * * *', '* * 0 * *', '* * 32 * *', '* * * 13 *', '* * * * 8',
+    '5-1 * * * *', '*/0 * * * *', '* * * *', '* * * * * *', 'a * * * *',
+])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+@pytest.mark.parametrize('expression, after, expected', [
+    # 严格晚于给定时间，秒数被舍去
+    ('0 0 * * *', datetime(2026, 1, 1, 0, 0), datetime(2026, 1, 2, 0, 0)),
+    ('*/20 * * * *', datetime(2026, 1, 1, 10, 59, 30), datetime(2026, 1, 1, 11, 0)),
+    # 跨月、跨年
+    ('0 0 * * *', datetime(2026, 1, 31, 23, 59), datetime(2026, 2, 1, 0, 0)),
+    ('0 0 1 1 *', datetime(2026, 12, 31, 23, 59), datetime(2027, 1, 1, 0, 0)),
+    ('59 23 31 12 *', datetime(2026, 12, 31, 23, 59), datetime(2027, 12, 31, 23, 59)),
+    ('0 0 * 2 *', datetime(2026, 3, 1), datetime(2027, 2, 1, 0, 0)),
+    # 没有 31 日的月份被跳过，2 月 29 日只在闰年出现
+    ('30 8 31 * *', datetime(2026, 4, 1), datetime(2026, 5, 31, 8, 30)),
+    ('0 12 29 2 *', datetime(2026, 1, 1), datetime(2028, 2, 29, 12, 0)),
+    # 周字段：2026-10-16 是周五
+    ('0 9 * * 1-5', datetime(2026, 10, 16, 10, 0), datetime(2026, 10, 19, 9, 0)),
+    ('0 0 * * 7', datetime(2026, 10, 18, 0, 0), datetime(2026, 10, 25, 0, 0)),
+    # 日与周都被限制时满足其一即可
+    ('0 0 1 * 0', datetime(2026, 10, 2), datetime(2026, 10, 4, 0, 0)),
+    ('0 0 13 * 5', datetime(2026, 10, 1), datetime(2026, 10, 2, 0, 0)),
+    # 日被限制、周为 * 时只看日
+    ('0 0 13 * *', datetime(2026, 10, 1), datetime(2026, 10, 13, 0, 0)),
+])
+def test_next_after(expression, after, expected):
+    assert CronSchedule(expression).next_after(after) == expected
+
+def test_next_after_keeps_timezone():
+    moment = CronSchedule('0 0 * * *').next_after(datetime(2026, 10, 18, 23, 30, tzinfo=CST))
+    assert moment == datetime(2026, 10, 19, 0, 0, tzinfo=CST)
+    assert moment.utcoffset() == timedelta(hours=8)
+
+def test_impossible_date_raises():
+    with pytest.raises(ValueError):
+        CronSchedule('0 0 30 2 *').next_after(datetime(2026, 1, 1))
+
+NOW = datetime(2026, 10, 18, 12, 0, 30, tzinfo=CST).timestamp()
+
+def _site(name, schedule=None, jitter=None):
+    return SiteRecord(name=name, type='lixianla', account='', base_url=None, priority=0, schedule=schedule,
+                      jitter=jitter, deadline=None, config=freeze({}))
+
+def _daemon(sites, daemon_config=None, state_store=None, utc_offset=8):
+    config = CheckinConfig(global_config=freeze({'daemon': daemon_config or {}, 'state': {'utc_offset': utc_offset}}),
+                           notification=freeze({}), sites=tuple(sites))
+    checkin_daemon = CheckinDaemon(load_config=lambda: config, report=None)
+    checkin_daemon.config = config
+    checkin_daemon.manager = SimpleNamespace(state_store=state_store)
+    return checkin_daemon
+
+@pytest.fixture
+def max_jitter(monkeypatch):
+    """抖动取上限，便于断言边界"""
+    monkeypatch.setattr(daemon.time, 'time', lambda: NOW)
+    monkeypatch.setattr(daemon.random, 'uniform', lambda low, high: high)
+
+@pytest.mark.parametrize('site, daemon_config, expected', [
+    # 默认每天 0 点，抖动 300 秒
+    (_site('A'), {}, datetime(2026, 10, 19, 0, 0, tzinfo=CST).timestamp() + 300),
+    # 网站自己的计划与抖动优先于 daemon 的默认值
+    (_site('A', schedule='15 13 * * *', jitter=0), {'schedule': '0 6 * * *', 'jitter': 600},
+     datetime(2026, 10, 18, 13, 15, tzinfo=CST).timestamp()),
+    (_site('A'), {'schedule': '0 6 * * *', 'jitter': 600}, datetime(2026, 10, 19, 6, 0, tzinfo=CST).timestamp() + 600),
+    # daemon.utc_offset 优先于 state.utc_offset
+    (_site('A', jitter=0), {'utc_offset': 0}, datetime(2026, 10, 19, 0, 0, tzinfo=timezone.utc).timestamp()),
+])
+def test_next_run_adds_jitter_after_schedule(max_jitter, site, daemon_config, expected):
+    assert _daemon([site], daemon_config)._next_run(site, NOW) == expected
+
+def test_next_run_jitter_stays_within_bounds():
+    site = _site('A', jitter=120)
+    checkin_daemon = _daemon([site])
+    scheduled = datetime(2026, 10, 19, 0, 0, tzinfo=CST).timestamp()
+    runs = [checkin_daemon._next_run(site, NOW) for _ in range(200)]
+    assert all(scheduled <= run <= scheduled + 120 for run in runs)
+    assert len(set(runs)) > 1
+
+def test_fixed_offset_ignores_daylight_saving_dates():
+    # 时区为固定偏移：即使在其他地区的夏令时切换日（2026-03-08 美国、2026-03-29 欧洲）前后也是每 24 小时一次
+    site = _site('A', schedule='30 2 * * *', jitter=0)
+    checkin_daemon = _daemon([site], {'utc_offset': -5})
+    run = datetime(2026, 3, 6, tzinfo=timezone(timedelta(hours=-5))).timestamp()
+    runs = []
+    for _ in range(30):
+        run = checkin_daemon._next_run(site, run)
+        runs.append(run)
+    assert {later - earlier for earlier, later in zip(runs, runs[1:])} == {86400}
+
+class _StateStore:
+    def __init__(self, done):
+        self.done = done
+
+    def is_done(self, site, account):
+        return site in self.done
+
+def test_startup_plan_catches_up_sites_not_done(max_jitter):
+    sites = [_site('未完成', jitter=600), _site('已完成', jitter=600), _site('小抖动', jitter=10)]
+    checkin_daemon = _daemon(sites, state_store=_StateStore({'已完成'}))
+    checkin_daemon._plan(startup=True)
+    plan = {identity[0]: run for identity, run in checkin_daemon.next_runs.items()}
+    # 启动补签的抖动不超过 60 秒
+    assert plan['未完成'] == NOW + 60
+    assert plan['小抖动'] == NOW + 10
+    assert plan['已完成'] == datetime(2026, 10, 19, 0, 0, tzinfo=CST).timestamp() + 600
+
+def test_startup_without_run_on_start_waits_for_schedule(max_jitter):
+    site = _site('A', jitter=0)
+    checkin_daemon = _daemon([site], {'run_on_start': False})
+    checkin_daemon._plan(startup=True)
+    assert checkin_daemon.next_runs == {site.identity: datetime(2026, 10, 19, 0, 0, tzinfo=CST).timestamp()}
+
+def test_replan_keeps_unchanged_sites(max_jitter):
+    unchanged, changed = _site('A', jitter=0), _site('B', jitter=0)
+    checkin_daemon = _daemon([unchanged, changed])
+    checkin_daemon.next_runs = {unchanged.identity: 1.0, changed.identity: 2.0}
+    previous = {unchanged.identity: unchanged, changed.identity: _site('B', schedule='0 6 * * *', jitter=0)}
+    checkin_daemon._plan(previous_sites=previous)
+    assert checkin_daemon.next_runs[unchanged.identity] == 1.0
+    assert checkin_daemon.next_runs[changed.identity] == datetime(2026, 10, 19, 0, 0, tzinfo=CST).timestamp()
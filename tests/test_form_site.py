@@ -0,0 +1,84 @@
+import os
+import sys
+import asyncio
+
+from aiohttp import web
+
+from config_model import compile_config
+from plugin_registry import SITES_DIR
+from plugins.form_site import FormSitePlugin, load_site_plugin
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+from mock_site import MockSite  # noqa: E402
+
+SPEC_PATH = os.path.join(SITES_DIR, 'pinzhi.json')
+
+class _OCR:
+    def __init__(self):
+        self.calls = 0
+
+    async def recognize(self, image_bytes: bytes, lang: str = 'eng', config: str = '') -> str:
+        self.calls += 1
+        return 'ab12'
+
+def _site_config(port: int, config=None):
+    """按正式配置的流程编译网站记录（包括旧键名的兼容）"""
+    config = config or {'username': 'alice@example.com', 'password': 'secret'}
+    data = {'sites': [{'type': 'pinzhi', 'config': {**config, 'base_url': f'http://localhost:{port}'}}]}
+    return compile_config(data).sites[0]
+
+async def _run_against(mock: MockSite, config=None):
+    """在本进程中启动模拟网站，运行一次签到，返回 (结果, 插件)"""
+    runner = web.AppRunner(mock.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        plugin_class = load_site_plugin(SPEC_PATH)
+        plugin = plugin_class({'timeout': 10, 'retry_times': 0}, _site_config(port, config), ocr_service=_OCR())
+        return await plugin.run(), plugin
+    finally:
+        await runner.cleanup()
+
+def test_site_definition_is_compiled_once():
+    plugin_class = load_site_plugin(SPEC_PATH)
+    assert load_site_plugin(SPEC_PATH) is plugin_class
+    assert issubclass(plugin_class, FormSitePlugin)
+    assert plugin_class.__name__ == 'PinzhiPlugin'
+    assert plugin_class.base_url == 'https://www.pinzhi.org'
+
+def test_login_and_checkin_without_captcha():
+    mock = MockSite(captcha_rate=0)
+    result, plugin = asyncio.run(_run_against(mock))
+    assert result['success'], result['message']
+    assert result['message'] == '签到成功'
+    assert result['account'] == 'alice@example.com'
+    assert (result['attempts'], result['ocr_retries']) == (1, 0)
+    assert plugin.ocr_service.calls == 0
+    assert mock.stats['logins'] == mock.stats['checkins'] == 1
+    assert {'login_page', 'login_submit', 'checkin_page', 'checkin_submit'} <= result['timings'].keys()
+
+def test_captcha_is_recognized_and_submitted():
+    mock = MockSite(captcha_rate=1)
+    result, plugin = asyncio.run(_run_against(mock))
+    assert result['success'], result['message']
+    assert plugin.ocr_service.calls == 1
+    assert {'captcha_download', 'ocr'} <= result['timings'].keys()
+
+def test_rejected_captcha_is_retried_then_gives_up():
+    mock = MockSite(captcha_rate=1, captcha_error_rate=1)
+    result, plugin = asyncio.run(_run_against(mock))
+    assert not result['success']
+    assert result['message'] == '登录失败'
+    assert (result['attempts'], result['ocr_retries']) == (3, 3)
+    assert plugin.ocr_service.calls == 3
+    assert mock.stats['checkins'] == 0
+
+def test_legacy_credential_keys_are_accepted():
+    mock = MockSite(captcha_rate=0)
+    result, plugin = asyncio.run(_run_against(mock, {'liqingxiu': 'old@example.com', 'liqingxiu2003': 'secret'}))
+    assert result['success'], result['message']
+    assert result['account'] == 'old@example.com'
+    # 模拟网站把登录邮箱写入 Cookie，说明旧键名的值被提交为用户名
+    assert {cookie.key: cookie.value for cookie in plugin.session.cookie_jar}['bbs_token'] == 'old@example.com'
@@ -0,0 +1,131 @@
+import os
+import time
+import random
+from array import array
+from collections import defaultdict
+
+import pytest
+
+import history
+from history import HistoryStore, bucketize, bucket_value, query_history
+
+NOW = 1_760_000_000.0
+SITES = [(name, account) for name in ('论坛A', '论坛B', '论坛C') for account in ('alice', 'bob')]
+
+def _entries(rng, count):
+    """随机的签到结果：时间分布在最近 10 天内，批次之间乱序"""
+    entries = []
+    for _ in range(count):
+        name, account = rng.choice(SITES)
+        outcome = rng.random()
+        result = {'success': outcome < 0.8, 'timed_out': outcome > 0.95, 'attempts': rng.randint(1, 3),
+                  'ocr_retries': rng.randint(0, 2), 'duration': rng.lognormvariate(7, 1),
+                  'timings': {'dns': rng.uniform(0.5, 20)}}
+        entries.append((name, account, result, NOW - rng.uniform(0, 10 * 86400)))
+    return entries
+
+def _expected(store, entries, by, since_day=None):
+    """不经过列存储，直接由原始结果计算的汇总"""
+    groups = defaultdict(list)
+    for name, account, result, timestamp in entries:
+        day = store.day_of(timestamp)
+        if since_day is not None and day < since_day:
+            continue
+        key = {'site': name, 'account': f"{name} / {account}",
+               'day': time.strftime('%Y-%m-%d', time.gmtime(day * 86400))}[by]
+        groups[key].append(result)
+    expected = {}
+    for key, results in groups.items():
+        runs = len(results)
+        durations = sorted(bucketize(array('f', [result['duration'] for result in results])))
+        expected[key] = {
+            'runs': runs,
+            'success_rate': sum(1 for r in results if r['success'] and not r.get('timed_out')) / runs,
+            'timed_out': sum(1 for r in results if r.get('timed_out')),
+            'attempts': sum(r.get('attempts', 0) for r in results) / runs,
+            'ocr_retries': sum(r.get('ocr_retries', 0) for r in results) / runs,
+            'p50_ms': bucket_value(durations[min(runs - 1, int(0.5 * runs))]),
+            'p95_ms': bucket_value(durations[min(runs - 1, int(0.95 * runs))]),
+        }
+    return expected
+
+def _actual(report):
+    return {entry.pop('key'): entry for entry in report}
+
+def _assert_matches(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, entry in expected.items():
+        got = actual[key]
+        for field in ('runs', 'timed_out', 'p50_ms', 'p95_ms'):
+            assert got[field] == entry[field], (key, field)
+        for field in ('success_rate', 'attempts', 'ocr_retries'):
+            assert got[field] == pytest.approx(entry[field]), (key, field)
+
+@pytest.fixture
+def now(monkeypatch):
+    monkeypatch.setattr(history.time, 'time', lambda: NOW)
+    return NOW
+
+def test_append_compact_query_round_trip(tmp_path, monkeypatch, now):
+    monkeypatch.setattr(history, 'COMPACT_ROWS', 100)
+    rng = random.Random(1)
+    store = HistoryStore(str(tmp_path), utc_offset=8)
+    entries = []
+    # 每批之后查询一次：前几批超过 COMPACT_ROWS 触发整理，最后一批留在未整理的尾部
+    for count in (300, 700, 500, 60):
+        batch = _entries(rng, count)
+        store.append_many(batch)
+        entries += batch
+        for by in ('site', 'account', 'day'):
+            _assert_matches(_actual(query_history(store, days=0, by=by)), _expected(store, entries, by))
+    store.close()
+    with open(tmp_path / 'compact' / 'CURRENT') as f:
+        assert int(f.read()) == 1500
+    assert sorted(os.listdir(tmp_path / 'compact')) == ['1500', 'CURRENT']
+
+    # 另一个进程重新打开同一目录，结果一致
+    reopened = HistoryStore(str(tmp_path), utc_offset=8)
+    _assert_matches(_actual(query_history(reopened, days=0, by='account')), _expected(reopened, entries, 'account'))
+
+def test_group_by_account_and_day_with_filters(tmp_path, now):
+    store = HistoryStore(str(tmp_path), utc_offset=8)
+    entries = _entries(random.Random(2), 400)
+    store.append_many(entries)
+
+    report = _actual(query_history(store, days=0, site='论坛B', by='account'))
+    assert set(report) == {'论坛B / alice', '论坛B / bob'}
+    expected = _expected(store, [e for e in entries if e[0] == '论坛B'], 'account')
+    _assert_matches(report, expected)
+
+    report = query_history(store, days=0, account='bob', by='day')
+    assert [entry['key'] for entry in report] == sorted(entry['key'] for entry in report)
+    _assert_matches(_actual(report), _expected(store, [e for e in entries if e[1] == 'bob'], 'day'))
+
+    # 成功率最低的网站排在最前
+    rates = [entry['success_rate'] for entry in query_history(store, days=0, by='site')]
+    assert rates == sorted(rates)
+
+def test_days_cutoff_uses_configured_timezone(tmp_path, now):
+    store = HistoryStore(str(tmp_path), utc_offset=8)
+    entries = _entries(random.Random(3), 500)
+    # 本地时间今天零点前后各一条，确认按配置时区而不是 UTC 划分日期
+    midnight = (store.day_of(NOW) * 86400) - 8 * 3600
+    entries += [('论坛A', 'alice', {'success': True, 'duration': 100.0}, midnight - 1),
+                ('论坛A', 'alice', {'success': True, 'duration': 200.0}, midnight + 1)]
+    store.append_many(entries)
+
+    for days in (1, 3, 7):
+        since_day = store.day_of(NOW) - days + 1
+        for by in ('site', 'day'):
+            _assert_matches(_actual(query_history(store, days=days, by=by)),
+                            _expected(store, entries, by, since_day))
+    today = _actual(query_history(store, days=1, site='论坛A', account='alice', by='day'))
+    assert list(today) == [time.strftime('%Y-%m-%d', time.gmtime(store.day_of(NOW) * 86400))]
+
+def test_phase_percentiles_skip_missing_phases(tmp_path, now):
+    store = HistoryStore(str(tmp_path), utc_offset=8)
+    entries = _entries(random.Random(4), 300)
+    store.append_many(entries)
+    for entry in query_history(store, days=0, by='site', phases=True):
+        dns = sorted(bucketize(array('f', [e[2]['timings']['dns'] for e in entries if e[0] == entry['key']])))
+        assert entry['phases'] == {'dns': bucket_value(dns[int(0.95 * len(dns))])}
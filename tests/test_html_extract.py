@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+import html_extract
+from html_extract import Selector, TargetExtractor, extract_from_response, extract_from_text
+
+TARGETS = {
+    'csrf': [Selector({'tag': 'input', 'attrs': {'name': ['_token', 'csrf_token']}, 'attr': 'value'})],
+    'captcha': [Selector({'tag': 'img', 'attrs': {'id': 'captcha-img'}, 'attr': 'src'}),
+                Selector({'tag': 'img', 'attrs': {'class': 'captcha-image'}, 'attr': 'src'}),
+                Selector({'tag': 'img', 'attrs': {'alt': '验证码'}, 'attr': 'src'})],
+}
+FORM = '<form><input type="hidden" name="_token" value="t&amp;1"><img id="captcha-img" src="/vcode.htm"></form>'
+FILLER = ''.join(f'<li class="thread"><img class="avatar" src="/a/{i}.png"><a href="/t-{i}">帖子 {i}</a></li>'
+                 for i in range(2000))
+
+class _Content:
+    """按块产出响应体并记录读取了多少字节"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    async def iter_chunked(self, size: int):
+        while self.offset < len(self.data):
+            chunk = self.data[self.offset:self.offset + size]
+            self.offset += len(chunk)
+            yield chunk
+
+    async def readany(self) -> bytes:
+        chunk = self.data[self.offset:self.offset + 4096]
+        self.offset += len(chunk)
+        return chunk
+
+    async def read(self) -> bytes:
+        rest = self.data[self.offset:]
+        self.offset = len(self.data)
+        return rest
+
+class _Response:
+    charset = 'utf-8'
+
+    def __init__(self, html: str):
+        data = html.encode('utf-8')
+        self.content = _Content(data)
+        self.content_length = len(data)
+
+def _extract(html: str, **kwargs):
+    response = _Response(html)
+    return asyncio.run(extract_from_response(response, TARGETS, **kwargs)), response.content
+
+def _failing_feed(monkeypatch, fail_on: int):
+    """第 fail_on 次 feed 时抛出异常，模拟增量解析失败"""
+    calls = []
+    original = TargetExtractor.feed
+
+    def feed(self, data):
+        calls.append(data)
+        if len(calls) == fail_on:
+            raise ValueError('模拟的解析错误')
+        return original(self, data)
+
+    monkeypatch.setattr(TargetExtractor, 'feed', feed)
+    return calls
+
+def test_rank_zero_match_stops_reading():
+    html = '<html><body>' + FORM + FILLER + '</body></html>'
+    found, content = _extract(html, chunk_size=1024, drain_limit=0)
+    assert found == {'csrf': 't&1', 'captcha': '/vcode.htm'}
+    assert content.offset < 2048 < len(content.data)
+
+def test_small_remainder_is_drained_for_connection_reuse():
+    html = FORM + FILLER[:4000]
+    found, content = _extract(html, chunk_size=1024)
+    assert found['captcha'] == '/vcode.htm'
+    assert content.offset == len(content.data)
+
+def test_page_without_captcha_is_parsed_to_the_end():
+    html = '<form><input name="csrf_token" value="abc"></form>' + FILLER
+    found, content = _extract(html, chunk_size=1024)
+    assert found == {'csrf': 'abc', 'captcha': None}
+    assert content.offset == len(content.data)
+
+def test_lower_priority_match_keeps_reading_for_a_better_one():
+    html = FORM.replace('id="captcha-img"', 'alt="验证码"') + FILLER + '<img class="x captcha-image" src="/better">'
+    found, content = _extract(html, chunk_size=7)
+    # 与逐个选择器全文查找的结果一致：第二优先级的选择器胜过先出现的第三优先级
+    assert found['captcha'] == '/better'
+    assert found == html_extract._fallback_extract(html, TARGETS)
+    assert content.offset == len(content.data)
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 64, 8192])
+def test_chunk_boundaries_do_not_change_results(chunk_size):
+    html = '<!-- <img id="captcha-img" src="/comment"> --><script>var s = "<img id=captcha-img src=/js>";</script>' + FORM
+    assert _extract(html, chunk_size=chunk_size)[0] == {'csrf': 't&1', 'captcha': '/vcode.htm'}
+    assert extract_from_text(html, TARGETS, chunk_size=chunk_size) == {'csrf': 't&1', 'captcha': '/vcode.htm'}
+
+def test_parse_error_falls_back_to_beautifulsoup(monkeypatch):
+    html = FILLER[:3000] + FORM + FILLER[:3000]
+    _failing_feed(monkeypatch, fail_on=2)
+    found, content = _extract(html, chunk_size=1024)
+    assert found == {'csrf': 't&1', 'captcha': '/vcode.htm'}
+    # 回退时读取剩余内容，用完整文本解析
+    assert content.offset == len(content.data)
+
+def test_fallback_buffer_is_capped(monkeypatch):
+    html = FORM.replace('id="captcha-img"', 'alt="验证码"') + FILLER
+    calls = _failing_feed(monkeypatch, fail_on=4)
+    found, content = _extract(html, chunk_size=1024, fallback_limit=2048)
+    # 已接收的内容超过 fallback_limit 后不再保留：返回解析失败前已确定的结果，不再读取剩余内容
+    assert found == {'csrf': 't&1', 'captcha': '/vcode.htm'}
+    assert len(calls) == 4
+    assert content.offset == 4096
+
+def test_extract_from_text_falls_back_on_parse_error(monkeypatch):
+    _failing_feed(monkeypatch, fail_on=1)
+    assert extract_from_text(FORM, TARGETS) == {'csrf': 't&1', 'captcha': '/vcode.htm'}
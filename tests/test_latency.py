@@ -0,0 +1,124 @@
+import random
+import asyncio
+
+import pytest
+
+from latency import LatencyHistory, hedged_request
+
+class _Response:
+    def __init__(self, name):
+        self.name = name
+        self.released = False
+
+    def release(self):
+        self.released = True
+
+class _Sender:
+    """依次按给定的行为处理每次发送：(耗时, 名称或异常)，记录被取消的请求"""
+
+    def __init__(self, *behaviors, gate=None):
+        self.behaviors = list(behaviors)
+        self.gate = gate
+        self.sent = 0
+        self.cancelled = []
+        self.responses = []
+
+    async def __call__(self):
+        delay, outcome = self.behaviors[self.sent]
+        self.sent += 1
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(outcome)
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        response = _Response(outcome)
+        self.responses.append(response)
+        return response
+
+def test_fast_response_is_not_hedged():
+    send = _Sender((0, 'first'), (0, 'second'))
+    response = asyncio.run(hedged_request(send, delay=0.5))
+    assert response.name == 'first'
+    assert send.sent == 1
+
+def test_slow_request_is_hedged_and_loser_cancelled():
+    send = _Sender((5, 'slow'), (0.01, 'hedge'))
+    response = asyncio.run(hedged_request(send, delay=0.02))
+    assert response.name == 'hedge' and not response.released
+    assert send.sent == 2
+    assert send.cancelled == ['slow']
+
+def test_loser_that_already_finished_is_released():
+    async def run():
+        gate = asyncio.Event()
+        send = _Sender((0, 'first'), (0, 'second'), gate=gate)
+        task = asyncio.ensure_future(hedged_request(send, delay=0.01))
+        await asyncio.sleep(0.05)
+        # 两个请求在同一轮事件循环中完成，只有一个被采用
+        gate.set()
+        return await task, send
+
+    response, send = asyncio.run(run())
+    assert not response.released
+    assert [r.released for r in send.responses if r is not response] == [True]
+    assert send.cancelled == []
+
+def test_failed_request_waits_for_the_other():
+    send = _Sender((0.05, ConnectionError('reset')), (0.1, 'hedge'))
+    assert asyncio.run(hedged_request(send, delay=0.01)).name == 'hedge'
+
+def test_both_failing_raises():
+    send = _Sender((0.03, ConnectionError('first')), (0.01, TimeoutError('second')))
+    with pytest.raises((ConnectionError, TimeoutError)):
+        asyncio.run(hedged_request(send, delay=0.01))
+
+def test_cancelling_the_caller_cancels_both_requests():
+    async def run():
+        send = _Sender((5, 'first'), (5, 'second'))
+        task = asyncio.ensure_future(hedged_request(send, delay=0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return send
+
+    send = asyncio.run(run())
+    assert sorted(send.cancelled) == ['first', 'second']
+
+def _history(samples, **latency_config):
+    history = LatencyHistory({'timeout': 30, 'latency': {'min_timeout': 2.0, 'timeout_multiplier': 3.0,
+                                                         **latency_config}})
+    for seconds in samples:
+        history.record('example.test', seconds)
+    return history
+
+@pytest.mark.parametrize('samples, expected', [
+    ([0.001] * 10, 2.0),    # 很快的网站不低于 min_timeout
+    ([1.0] * 10, 3.0),      # p99 x timeout_multiplier
+    ([100.0] * 10, 30),     # 不超过 global.timeout
+])
+def test_timeout_for_is_clamped(samples, expected):
+    timeout = _history(samples).timeout_for('example.test')
+    assert timeout.sock_connect == timeout.sock_read == expected
+    assert timeout.total == 30
+
+def test_timeout_for_stays_within_bounds_for_any_samples():
+    rng = random.Random(5)
+    for _ in range(200):
+        samples = [rng.lognormvariate(rng.uniform(-6, 4), rng.uniform(0.1, 2)) for _ in range(rng.randint(5, 50))]
+        timeout = _history(samples, history=20).timeout_for('example.test')
+        assert 2.0 <= timeout.sock_read <= 30
+        assert timeout.sock_connect == timeout.sock_read
+
+def test_timeout_for_needs_enough_samples():
+    assert _history([1.0] * 4).timeout_for('example.test') is None
+    assert _history([1.0] * 10).timeout_for('other.test') is None
+    assert _history([1.0] * 10, enabled=False).timeout_for('example.test') is None
+
+def test_recent_samples_replace_old_ones():
+    history = _history([0.001] * 50 + [5.0] * 20, history=20)
+    assert history.timeout_for('example.test').sock_read == 15.0
@@ -0,0 +1,66 @@
+import asyncio
+from collections import Counter
+
+from config_model import SiteRecord
+from metrics import MetricsCollector
+from plugins.base_plugin import BasePlugin
+
+class _Plugin(BasePlugin):
+    async def login(self) -> bool:
+        return True
+
+    async def checkin(self):
+        return {"success": True, "message": "ok"}
+
+def _site(account: str) -> SiteRecord:
+    return SiteRecord(name='论坛', type='test', account=account, base_url='http://example.test', priority=0,
+                      schedule=None, jitter=0, deadline=None, config={})
+
+def _series(text: str) -> Counter:
+    """textfile 中各时间序列（指标名 + 标签）出现的次数"""
+    return Counter(line.rsplit(' ', 1)[0] for line in text.splitlines() if line and not line.startswith('#'))
+
+def test_run_result_carries_account():
+    async def run():
+        return await _Plugin({}, _site('alice')).run()
+
+    result = asyncio.run(run())
+    assert result['site'] == '论坛'
+    assert result['account'] == 'alice'
+
+def test_two_accounts_on_one_site_have_distinct_series():
+    collector = MetricsCollector({})
+    for account in ('alice', 'bob'):
+        collector.add_result({'site': '论坛', 'account': account, 'success': True, 'duration': 120.0,
+                              'timings': {'dns': 1.5, 'login_page': 30.0}})
+    text = collector.prometheus()
+    series = _series(text)
+    assert series and max(series.values()) == 1, [key for key, count in series.items() if count > 1]
+    assert 'checkin_success{site="论坛",account="alice"}' in series
+    assert 'checkin_phase_seconds{site="论坛",account="bob",phase="dns"}' in series
+
+def test_repeated_runs_keep_one_series_per_site_and_account():
+    collector = MetricsCollector({})
+    for index in range(1000):
+        collector.add_result({'site': '论坛', 'account': 'alice', 'success': index % 2 == 0,
+                              'duration': float(index), 'timings': {'dns': 1.0}})
+    series = _series(collector.prometheus())
+    assert series['checkin_success{site="论坛",account="alice"}'] == 1
+    assert len(series) == 5
+    # 以最近一次的结果为准
+    assert 'checkin_success{site="论坛",account="alice"} 0' in collector.prometheus()
+
+def test_summary_percentiles_are_approximate_and_bounded():
+    collector = MetricsCollector({})
+    for ms in range(1, 10001):
+        collector.add_result({'site': f'站点{ms}', 'success': True, 'duration': float(ms),
+                              'timings': {'login_page': float(ms)}})
+    summary = collector.summary()
+    assert 'results' not in summary
+    phase = summary['phases']['login_page']
+    assert phase['sites'] == 10000 and phase['max_ms'] == 10000.0
+    assert phase['total_ms'] == 50005000.0
+    assert abs(phase['p50_ms'] - 5000) / 5000 < 0.1
+    assert abs(phase['p95_ms'] - 9500) / 9500 < 0.1
+    assert len(collector.per_phase['login_page'].buckets) < 120
+    assert [entry['duration_ms'] for entry in summary['slowest'][:2]] == [10000.0, 9999.0]
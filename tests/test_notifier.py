@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from notifier import TELEGRAM_MAX_LENGTH, Notifier
+
+split_message = Notifier.split_message
+
+def _notifier(**notification):
+    return Notifier(SimpleNamespace(notification=notification))
+
+@pytest.mark.parametrize('content, expected', [
+    ('', []),
+    ('短消息\n', ['短消息\n']),
+    ('a' * 10, ['a' * 10]),
+    # 正好达到上限的内容不切分
+    ('a' * 9 + '\n', ['a' * 9 + '\n']),
+    # 按行切分，不把一行拆到两段
+    ('aaaa\nbbbb\ncc\n', ['aaaa\nbbbb\n', 'cc\n']),
+    # 单行超长时强制截断，之前累积的行单独成段
+    ('ab\n' + 'x' * 23 + '\ncd', ['ab\n', 'x' * 10, 'x' * 10, 'xxx\ncd']),
+])
+def test_split_message(content, expected):
+    assert split_message(content, limit=10) == expected
+
+def test_real_summary_is_split_at_telegram_limit():
+    notifier = _notifier()
+    for i in range(600):
+        notifier.add_result({'success': i % 7 != 0, 'site': f'网站{i:03d}', 'message': '签到成功，获得 10 积分'})
+    content = notifier.build_content()
+    assert len(content) > 3 * TELEGRAM_MAX_LENGTH
+
+    chunks = split_message(content)
+    assert ''.join(chunks) == content
+    assert all(0 < len(chunk) <= TELEGRAM_MAX_LENGTH for chunk in chunks)
+    assert all(chunk.endswith('\n') for chunk in chunks)
+    # 每段都尽量填满：加上下一段的第一行就会超过上限
+    for chunk, following in zip(chunks, chunks[1:]):
+        assert len(chunk) + len(following.splitlines(keepends=True)[0]) > TELEGRAM_MAX_LENGTH
+
+def test_summary_counts_results():
+    notifier = _notifier()
+    notifier.add_result({'success': True, 'site': 'A', 'message': '签到成功'})
+    notifier.add_result({'success': False, 'site': 'B'})
+    assert notifier.build_content() == ("### 自动签到结果汇总\n\n✅ 成功: 1 个\n❌ 失败: 1 个\n\n"
+                                        "✅ A: 签到成功\n❌ B: 无信息\n")
+
+def _recording(notifier, monkeypatch):
+    """替换发送渠道，记录发送内容与并发情况"""
+    sent = []
+    running = []
+
+    async def send(channel, content):
+        running.append(channel)
+        await asyncio.sleep(0.01)
+        sent.append((channel, len(running), content))
+
+    monkeypatch.setattr(notifier, '_send_email', lambda content: send('email', content))
+    monkeypatch.setattr(notifier, '_send_telegram', lambda content: send('telegram', content))
+    return sent
+
+def test_channels_are_sent_concurrently(monkeypatch):
+    notifier = _notifier(email_enabled=True, telegram_enabled=True)
+    sent = _recording(notifier, monkeypatch)
+    asyncio.run(notifier.send_notification([{'success': True, 'site': 'A', 'message': '签到成功'}]))
+    # 两个渠道都已开始后才有一个完成
+    assert sorted(channel for channel, _, _ in sent) == ['email', 'telegram']
+    assert {running for _, running, _ in sent} == {2}
+    assert all('✅ A: 签到成功' in content for _, _, content in sent)
+
+@pytest.mark.parametrize('results, notification, expected', [
+    ([], {'telegram_enabled': True}, []),
+    ([{'success': True, 'site': 'A'}], {'telegram_enabled': True, 'only_on_change': True}, []),
+    ([{'success': True, 'site': 'A', 'changed': True}], {'telegram_enabled': True, 'only_on_change': True},
+     ['telegram']),
+    ([{'success': True, 'site': 'A'}], {'email_enabled': True}, ['email']),
+])
+def test_flush_skips_when_nothing_to_report(monkeypatch, results, notification, expected):
+    notifier = _notifier(**notification)
+    sent = _recording(notifier, monkeypatch)
+    asyncio.run(notifier.send_notification(results))
+    assert [channel for channel, _, _ in sent] == expected
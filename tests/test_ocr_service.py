@@ -0,0 +1,41 @@
+import asyncio
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import ocr_service
+from ocr_service import OCRService
+
+class _Executor:
+    created = []
+
+    def __init__(self, max_workers, initializer, mp_context):
+        self.start_method = mp_context.get_start_method()
+        self.broken = not self.created
+        self.shutdown_calls = []
+        self.created.append(self)
+
+    def submit(self, fn, *args):
+        if self.broken:
+            raise BrokenProcessPool('worker died')
+        future = Future()
+        future.set_result(('AB12', None))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdown_calls.append(wait)
+
+def test_broken_pool_is_recreated(monkeypatch):
+    monkeypatch.setattr(ocr_service, 'ProcessPoolExecutor', _Executor)
+    _Executor.created = []
+    service = OCRService({'workers': 1})
+    assert service.executor is None  # 第一次识别前不创建进程池
+
+    assert asyncio.run(service.recognize(b'png')) == 'AB12'
+    broken, fresh = _Executor.created
+    assert broken.shutdown_calls == [False]
+    assert service.executor is fresh
+    assert fresh.start_method in ('forkserver', 'spawn')
+
+    service.shutdown()
+    assert fresh.shutdown_calls == [True]
+    assert service.executor is None
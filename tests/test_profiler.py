@@ -0,0 +1,13 @@
+from profiler import LoopProfiler
+
+def test_lag_report_uses_bounded_histogram():
+    profiler = LoopProfiler(slow_threshold=0.05)
+    for index in range(100000):
+        lag = 0.2 if index % 1000 == 0 else 0.001
+        profiler.lags.add(lag)
+        profiler.slow_lags += lag >= profiler.slow_threshold
+    report = profiler.report()
+    assert "采样 100000 次" in report
+    assert "最大 200.0 ms" in report
+    assert "超过 50 ms 的采样 100 次" in report
+    assert len(profiler.lags.buckets) == 2
@@ -0,0 +1,88 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from config_model import SiteRecord
+from plugins.base_plugin import BasePlugin
+from retry import CircuitBreakerRegistry, CircuitOpenError
+
+class _Plugin(BasePlugin):
+    async def login(self) -> bool:
+        return True
+
+    async def checkin(self):
+        return {"success": True}
+
+def _site() -> SiteRecord:
+    return SiteRecord(name='测试', type='test', account='', base_url='http://example.test', priority=0,
+                      schedule=None, jitter=0, deadline=None, config={})
+
+def _open_breaker(plugin: BasePlugin):
+    """让熔断器进入“冷却已结束、下一次请求即为试探”的状态"""
+    breaker = plugin.breakers.get('example.test')
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at -= breaker.reset_timeout
+    return breaker
+
+async def _plugin(request_once) -> BasePlugin:
+    plugin = _Plugin({'retry_times': 0}, _site(), breakers=CircuitBreakerRegistry({'retry': {'breaker_reset': 60}}))
+    plugin._request_once = request_once
+    return plugin
+
+def test_cancelled_probe_reopens_breaker():
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(3600)
+
+    async def run():
+        plugin = await _plugin(hang)
+        breaker = _open_breaker(plugin)
+        task = asyncio.ensure_future(plugin._send('GET', 'http://example.test/'))
+        await asyncio.sleep(0)
+        assert breaker.half_open
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not breaker.half_open
+        # 重新打开后冷却结束即可再次试探，而不是永久拒绝
+        assert not breaker.allow()
+        breaker.opened_at -= breaker.reset_timeout
+        assert breaker.allow()
+        await plugin.session.close()
+
+    asyncio.run(run())
+
+def test_non_retryable_error_counts_as_failure():
+    async def disconnect(*args, **kwargs):
+        raise aiohttp.ServerDisconnectedError()
+
+    async def run():
+        plugin = await _plugin(disconnect)
+        breaker = _open_breaker(plugin)
+        with pytest.raises(aiohttp.ServerDisconnectedError):
+            await plugin._send('POST', 'http://example.test/login')
+        assert not breaker.half_open
+        with pytest.raises(CircuitOpenError):
+            await plugin._send('POST', 'http://example.test/login')
+
+        # 已关闭的熔断器同样把不可重试的连接错误计入连续失败
+        breaker.record_success()
+        for _ in range(breaker.failure_threshold):
+            with pytest.raises(aiohttp.ServerDisconnectedError):
+                await plugin._send('POST', 'http://example.test/login')
+        assert breaker.opened_at is not None
+        await plugin.session.close()
+
+    asyncio.run(run())
+
+def test_lost_probe_expires():
+    breaker = CircuitBreakerRegistry({}).get('example.test')
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at -= breaker.reset_timeout
+    assert breaker.allow()
+    assert not breaker.allow()
+    # 试探请求既未成功也未失败，超过 reset_timeout 后放行新的试探
+    breaker.probe_at -= breaker.reset_timeout
+    assert breaker.allow()
@@ -0,0 +1,104 @@
+import sys
+import heapq
+import random
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from config_model import CheckinConfig, SiteRecord, freeze
+from checkin_manager import CheckinManager, _DispatchQueue
+
+class _Site:
+    def __init__(self, priority: int):
+        self.priority = priority
+
+def _reference_pick(groups, host_running, type_running, per_host, limits):
+    """原先的逐组扫描：未达到主机/类型上限的分组中队首最优的一个"""
+    best = None
+    for key, queue in groups.items():
+        host, site_type = key
+        if host_running[host] >= per_host or type_running[site_type] >= limits[site_type]:
+            continue
+        if best is None or queue[0][:2] < groups[best][0][:2]:
+            best = key
+    return best
+
+def test_dispatch_order_matches_full_scan():
+    for seed in range(300):
+        rnd = random.Random(seed)
+        per_host = rnd.randint(1, 3)
+        limits = {f"t{i}": rnd.choice([1, 2, sys.maxsize]) for i in range(rnd.randint(1, 4))}
+        max_running = rnd.randint(1, 8)
+        sites = [(f"h{rnd.randrange(5)}", rnd.choice(list(limits)), _Site(rnd.randint(0, 2)))
+                 for _ in range(rnd.randint(1, 50))]
+
+        groups = defaultdict(list)
+        queue = _DispatchQueue(per_host, limits.__getitem__)
+        for index, (host, site_type, site) in enumerate(sites):
+            heapq.heappush(groups[(host, site_type)], (-site.priority, index, site))
+            queue.add(host, site_type, index, site)
+        queue.start()
+
+        host_running, type_running = defaultdict(int), defaultdict(int)
+        expected, actual = [], []
+        while groups or expected:
+            while groups and len(expected) < max_running:
+                key = _reference_pick(groups, host_running, type_running, per_host, limits)
+                if key is None:
+                    break
+                _, index, _ = heapq.heappop(groups[key])
+                if not groups[key]:
+                    del groups[key]
+                host_running[key[0]] += 1
+                type_running[key[1]] += 1
+                expected.append((index, *key))
+            while len(actual) < max_running:
+                picked = queue.pop()
+                if picked is None:
+                    break
+                actual.append(picked[:3])
+            assert actual == expected
+            # 随机完成一个正在运行的网站
+            index, host, site_type = expected.pop(rnd.randrange(len(expected)))
+            actual.remove((index, host, site_type))
+            host_running[host] -= 1
+            type_running[site_type] -= 1
+            queue.finish(host, site_type)
+        assert queue.size == 0
+
+class _Registry:
+    import_times = {}
+
+    def load(self, site_type):
+        return None
+
+    def get_base_url(self, site_type):
+        return 'http://scheduler.test'
+
+def _manager(concurrency):
+    sites = tuple(SiteRecord(name=f"站点{i}", type='t', account='', base_url=None, priority=0, schedule=None,
+                             jitter=0, deadline=None, config=freeze({})) for i in range(3))
+    global_config = {'concurrency': concurrency, 'pool': {'warm_up': False, 'dns_cache_path': None},
+                     'state': {'enabled': False}, 'history': {'enabled': False}, 'session_store': {'enabled': False}}
+    config = CheckinConfig(global_config=freeze(global_config), notification=freeze({}), sites=sites)
+    return CheckinManager(config, registry=_Registry())
+
+def _run(manager):
+    async def run():
+        try:
+            return await manager.run_all_checkins()
+        finally:
+            await manager.close()
+    return asyncio.run(run())
+
+def test_negative_type_limits_are_clamped():
+    for per_type in (-1, {'t': -1}):
+        results = _run(_manager({'per_type': per_type}))
+        assert [result['message'] for result in results] == ['插件加载失败'] * 3
+
+def test_undispatchable_queue_fails_fast():
+    manager = _manager({})
+    manager._type_limit = lambda site_type: 0
+    with pytest.raises(RuntimeError, match='3 个网站排队'):
+        _run(manager)
@@ -0,0 +1,167 @@
+import time
+import asyncio
+from email.utils import parsedate_to_datetime
+from http.cookies import SimpleCookie
+
+import aiohttp
+import pytest
+from yarl import URL
+
+from config_model import SiteRecord
+from plugins.base_plugin import BasePlugin
+from session_store import SessionStore, create_session_store, dump_cookies, restore_cookies
+
+SITE = URL('https://www.example.test/')
+
+class _MemoryStore(SessionStore):
+    def __init__(self):
+        self.data = {}
+
+    def load(self, key):
+        return self.data.get(key)
+
+    def save(self, key, cookies):
+        self.data[key] = cookies
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+class _Plugin(BasePlugin):
+    def __init__(self, *args, valid=False, login_ok=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.username = 'alice'
+        self.valid = valid
+        self.login_ok = login_ok
+        self.logins = 0
+
+    async def is_session_valid(self) -> bool:
+        return self.valid
+
+    async def login(self) -> bool:
+        self.logins += 1
+        if self.login_ok:
+            self.session.cookie_jar.update_cookies({'token': 'fresh'}, SITE)
+        return self.login_ok
+
+    async def checkin(self):
+        return {"success": True, "message": "签到成功",
+                "cookies": {m.key: m.value for m in self.session.cookie_jar.filter_cookies(SITE).values()}}
+
+def _site() -> SiteRecord:
+    return SiteRecord(name='测试', type='test', account='alice', base_url=str(SITE), priority=0,
+                      schedule=None, jitter=0, deadline=None, config={})
+
+def _set_cookies(jar, *headers):
+    for header in headers:
+        cookie = SimpleCookie()
+        cookie.load(header)
+        jar.update_cookies(cookie, SITE)
+
+def _round_trip(*headers):
+    """写入 Set-Cookie 后导出再恢复到新的 Cookie 容器"""
+    async def run():
+        jar = aiohttp.CookieJar()
+        _set_cookies(jar, *headers)
+        cookies = dump_cookies(jar)
+        restored = aiohttp.CookieJar()
+        restore_cookies(restored, cookies)
+        return cookies, restored
+
+    return asyncio.run(run())
+
+def _sent(jar, url):
+    return {morsel.key: morsel.value for morsel in jar.filter_cookies(URL(url)).values()}
+
+def test_cookies_round_trip_keep_domain_and_path():
+    _, jar = _round_trip('sid=1; Path=/',
+                         'remember=2; Domain=example.test; Path=/; Expires=Fri, 01 Jan 2100 00:00:00 GMT',
+                         'forum=3; Domain=example.test; Path=/forum')
+    assert _sent(jar, 'https://www.example.test/') == {'sid': '1', 'remember': '2'}
+    assert _sent(jar, 'https://www.example.test/forum/1') == {'sid': '1', 'remember': '2', 'forum': '3'}
+    # 整个域名下的 Cookie 在其他子域名上同样有效
+    assert _sent(jar, 'https://bbs.example.test/forum/') == {'remember': '2', 'forum': '3'}
+
+def test_max_age_is_saved_as_absolute_expiry():
+    cookies, jar = _round_trip('sid=1; Path=/; Max-Age=3600')
+    expires = parsedate_to_datetime(cookies[0]['expires']).timestamp()
+    assert time.time() + 3590 < expires <= time.time() + 3600
+    assert _sent(jar, str(SITE)) == {'sid': '1'}
+
+def test_expired_cookies_are_not_restored():
+    async def run():
+        jar = aiohttp.CookieJar()
+        restore_cookies(jar, [
+            {'name': 'old', 'value': '1', 'domain': 'www.example.test', 'path': '/',
+             'expires': 'Thu, 01 Jan 2015 00:00:00 GMT'},
+            {'name': 'session', 'value': '2', 'domain': 'www.example.test', 'path': '/', 'expires': ''},
+            {'name': 'no_domain', 'value': '3', 'domain': '', 'path': '/', 'expires': ''},
+        ])
+        return _sent(jar, str(SITE))
+
+    assert asyncio.run(run()) == {'session': '2'}
+
+def _run_plugin(store, **kwargs):
+    async def run():
+        plugin = _Plugin({'retry_times': 0}, _site(), session_store=store, **kwargs)
+        return await plugin.run(), plugin
+
+    return asyncio.run(run())
+
+def _saved(store, value):
+    key = SessionStore.make_key('测试', 'alice')
+    store.save(key, [{'name': 'token', 'value': value, 'domain': 'www.example.test', 'path': '/', 'expires': ''}])
+    return key
+
+def test_valid_session_skips_login():
+    store = _MemoryStore()
+    _saved(store, 'saved')
+    result, plugin = _run_plugin(store, valid=True)
+    assert result['success'] and result['cookies'] == {'token': 'saved'}
+    assert plugin.logins == 0
+    assert 'session_probe' in result['timings']
+
+def test_invalid_session_logs_in_again_and_replaces_saved_cookies():
+    store = _MemoryStore()
+    key = _saved(store, 'stale')
+    result, plugin = _run_plugin(store, valid=False)
+    assert plugin.logins == 1
+    assert result['cookies'] == {'token': 'fresh'}
+    assert [cookie['value'] for cookie in store.load(key)] == ['fresh']
+
+def test_failed_login_deletes_saved_session():
+    store = _MemoryStore()
+    key = _saved(store, 'stale')
+    result, plugin = _run_plugin(store, valid=False, login_ok=False)
+    assert (result['success'], result['message']) == (False, '登录失败')
+    assert store.load(key) is None
+
+@pytest.mark.parametrize('store_config', [
+    {},
+    {'enabled': False, 'secret': 'x'},
+    {'enabled': True, 'secret_env': 'CHECKIN_TEST_UNSET_SECRET'},
+    {'enabled': True, 'secret': 'x', 'backend': 'redis'},
+])
+def test_store_is_disabled_without_usable_config(store_config):
+    assert create_session_store({'session_store': store_config}) is None
+
+def test_key_does_not_expose_account():
+    key = SessionStore.make_key('测试', 'alice@example.com')
+    assert 'alice' not in key and len(key) == 64
+    assert key != SessionStore.make_key('测试', 'bob@example.com')
+
+def test_encrypted_file_round_trip(tmp_path):
+    pytest.importorskip('cryptography')
+    from session_store import EncryptedFileSessionStore
+
+    store = create_session_store({'session_store': {'enabled': True, 'secret': 'correct', 'path': str(tmp_path)}})
+    assert isinstance(store, EncryptedFileSessionStore)
+    key = SessionStore.make_key('测试', 'alice')
+    cookies = [{'name': 'token', 'value': 'secret-token', 'domain': 'www.example.test', 'path': '/', 'expires': ''}]
+    store.save(key, cookies)
+    assert store.load(key) == cookies
+    # 文件内容已加密，换一个密钥无法读取
+    assert b'secret-token' not in (tmp_path / f'{key}.session').read_bytes()
+    assert EncryptedFileSessionStore(str(tmp_path), 'wrong').load(key) is None
+    store.delete(key)
+    assert store.load(key) is None
+    store.delete(key)
@@ -0,0 +1,14 @@
+import pytest
+
+from main import parse_args
+
+@pytest.mark.parametrize('spec', ['5/4', '4/4', '-1/4', '0/0', '1', 'a/b'])
+def test_invalid_shard_exits_with_usage_error(spec, capsys):
+    with pytest.raises(SystemExit) as info:
+        parse_args(['--shard', spec])
+    assert info.value.code == 2
+    assert '--shard' in capsys.readouterr().err
+
+def test_valid_shard_is_parsed():
+    assert parse_args(['--shard', '3/4']).shard == (3, 4)
+    assert parse_args([]).shard is None